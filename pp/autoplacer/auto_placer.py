@@ -6,7 +6,9 @@ import pyqtree
 
 import pp.autoplacer.functions as ap
 from pp.autoplacer.cell_list import CellList
+from pp.autoplacer.helpers import import_cell
 from pp.autoplacer.library import Library
+from pp.autoplacer.max_rects import MaxRects
 
 
 class AutoPlacer(pya.Layout):
@@ -16,6 +18,7 @@ class AutoPlacer(pya.Layout):
         name: name of the container
         max_width: 1e8 (nm)
         max_height: 1e8 (nm)
+        brute_force: use the brute-force search instead of the free rectangles
 
     `AutoPlacer` is the class which knows how to automatically pack and position cells. You feed it cells that are loaded and padded using `library`.
 
@@ -27,9 +30,11 @@ class AutoPlacer(pya.Layout):
     - `AutoPlacer.pack_manual(cell, x, y, origin)` allows you to manually place a device at an absolute location.
     - `AutoPlacer.pack_many` behaves like `AutoPlacer.pack_auto` but accepts a list of devices.
 
+    Free space is tracked incrementally as maximal free rectangles (`MaxRects`), so `pack_auto` finds a position in a single pass over the free rectangles.
+
     """
 
-    def __init__(self, name, max_width=1e8, max_height=1e8):
+    def __init__(self, name, max_width=1e8, max_height=1e8, brute_force=False):
         """ constructor """
         # Construct
         super(AutoPlacer, self).__init__()
@@ -51,6 +56,8 @@ class AutoPlacer(pya.Layout):
         # Create the quadtree which will enable efficient queries
         bbox = (0, 0, self.max_width, self.max_height)
         self.quadtree = pyqtree.Index(bbox=bbox)
+        self.free_space = MaxRects(self.max_width, self.max_height)
+        self.brute_force = brute_force
 
         # Make a topcell
         self.create_cell(self.name)
@@ -67,27 +74,8 @@ class AutoPlacer(pya.Layout):
             return max(w for (w, s, e, n) in collisions) - ap.GRID - bbox.width()
 
     def import_cell(self, cell):
-        """ Imports a cell from another Layout """
-        # If the cell is already in the library, skip loading
-        if self.cell(cell.name):
-            return self.cell(cell.name)
-
-        # Create a holder cell and copy in the shapes
-        new_cell = self.create_cell(cell.name)
-        new_cell.copy_shapes(cell)
-
-        # Import all the child cells
-        for child_index in cell.each_child_cell():
-            self.import_cell(cell.layout().cell(child_index))
-
-        # Import all of the instances, doing the mapping from Layout to Layout
-        for instance in cell.each_inst():
-            cell_index = self.cell(instance.cell.name).cell_index()
-            # new_instance = pya.CellInstArray(cell_index, instance.trans)
-            new_instance = instance.cell_inst.dup()
-            new_instance.cell_index = cell_index
-            new_cell.insert(new_instance)
-        return new_cell
+        """ Imports a cell from another Layout, deduplicated by geometry """
+        return import_cell(self, cell)
 
     def inside(self, bbox):
         """ Check that something is inside the mask """
@@ -113,7 +101,12 @@ class AutoPlacer(pya.Layout):
             return [self.max_width - w, self.max_height - h]
 
     def find_space(self, cell, origin=ap.SOUTH_WEST, direction=ap.VERTICAL):
-        """ Find space for a cell by brute-force search """
+        """ Find space for a cell """
+        if not self.brute_force:
+            bbox = cell.bbox()
+            return self.free_space.find_position(
+                bbox.width(), bbox.height(), origin=origin, direction=direction
+            )
         if direction == ap.VERTICAL:
             return self.find_space_vertical(cell, origin)
         elif direction == ap.HORIZONTAL:
@@ -204,6 +197,7 @@ class AutoPlacer(pya.Layout):
 
         for tbox in tboxes:
             self.quadtree.insert(tbox, tbox)
+            self.free_space.insert(tbox)
 
         new_cell = self.import_cell(cell)
 
@@ -212,6 +206,38 @@ class AutoPlacer(pya.Layout):
         new_instance = pya.CellInstArray(new_cell.cell_index(), transform)
         self.cell(self.name).insert(new_instance)
 
+    def pack_array(self, cell, x, y, cols, rows, dx, dy):
+        """
+        Pack cols x rows copies of a cell on a (dx, dy) pitch as one instance array,
+        with the south west copy at (x, y)
+        """
+        box = cell.bbox()
+        x, y, dx, dy = int(x), int(y), int(dx), int(dy)
+
+        for row, col in itertools.product(range(rows), range(cols)):
+            tbox = (
+                x + col * dx,
+                y + row * dy,
+                x + col * dx + box.width(),
+                y + row * dy + box.height(),
+            )
+            self.quadtree.insert(tbox, tbox)
+            self.free_space.insert(tbox)
+
+        new_cell = self.import_cell(cell)
+
+        # Make an instance array
+        transform = pya.Trans(x - box.left, y - box.bottom)
+        new_instance = pya.CellInstArray(
+            new_cell.cell_index(),
+            transform,
+            pya.Vector(dx, 0),
+            pya.Vector(0, dy),
+            cols,
+            rows,
+        )
+        self.cell(self.name).insert(new_instance)
+
     def pack_auto(self, cell, origin=ap.SOUTH_WEST, direction=ap.VERTICAL):
         """
         Pack a cell automatically
@@ -0,0 +1,56 @@
+""" Compares AutoPlacer packing with free rectangles against the brute-force search
+
+.. code::
+
+    python pp/autoplacer/benchmark_auto_placer.py
+
+"""
+
+import time
+
+import klayout.db as pya
+import numpy as np
+
+import pp.autoplacer.functions as ap
+from pp.autoplacer.auto_placer import AutoPlacer
+
+
+def random_cells(n, seed=0, size_min=50000, size_max=500000):
+    """ Returns n cells (in their own Layout) with random rectangle sizes """
+    rng = np.random.RandomState(seed)
+    layout = pya.Layout()
+    layer = layout.layer(ap.DEVREC_LAYER, 0)
+    cells = []
+    for i in range(n):
+        w, h = rng.randint(size_min, size_max, size=2)
+        cell = layout.create_cell(f"cell{i}")
+        cell.shapes(layer).insert(pya.Box(0, 0, int(w), int(h)))
+        cells.append(cell)
+    return layout, cells
+
+
+def benchmark(n=500, die_size=25e6, direction=ap.VERTICAL, brute_force=False):
+    """ Returns runtime (s), number of placed cells and density of the packing """
+    layout, cells = random_cells(n)
+    placer = AutoPlacer(
+        f"bench_{n}_{brute_force}", die_size, die_size, brute_force=brute_force
+    )
+    t0 = time.time()
+    failed = placer.pack_many(cells, direction=direction)
+    runtime = time.time() - t0
+
+    placed = [c for c in cells if c not in failed.cells]
+    cell_area = sum(c.bbox().area() for c in placed)
+    bbox = placer.top_cell().bbox()
+    density = cell_area / bbox.area() if placed else 0
+    return runtime, len(placed), density
+
+
+if __name__ == "__main__":
+    # brute force takes minutes for 1000 cells
+    print("n, engine, runtime (s), placed, density")
+    for n in [100, 300, 1000, 3000]:
+        for brute_force in [True, False] if n <= 300 else [False]:
+            runtime, placed, density = benchmark(n=n, brute_force=brute_force)
+            engine = "brute_force" if brute_force else "max_rects"
+            print(f"{n}, {engine}, {runtime:.3f}, {placed}, {density:.3f}")
@@ -101,13 +101,27 @@ class ChipArray(AutoPlacer):
                     container.shapes(layer).insert(box)
 
     def write(self, *args, **kwargs):
-        """ Write to disk. We pack the chips at the last minute. """
+        """ Write to disk. We pack the chips at the last minute.
+
+        Identical chips on neighbouring rows and columns are packed as one
+        instance array, on a chip pitch rounded to the database grid.
+        """
         self.draw_boundary(ap.DEVREC_LAYER)
         self.draw_boundary(ap.FLOORPLAN_LAYER)
-        for chip in self.chips:
-            x = chip.col * (self.chip_width + self.spacing)
-            y = chip.row * (self.chip_height + self.spacing)
-            self.pack_manual(chip.top_cell(), x, y)
+        dx = int(self.chip_width + self.spacing)
+        dy = int(self.chip_height + self.spacing)
+
+        # identical chips are imported as the same cell
+        grid = {
+            (chip.row, chip.col): self.import_cell(chip.top_cell()).cell_index()
+            for chip in self.chips
+        }
+        for cell_index, row, col, rows, cols in ap.get_grid_arrays(grid):
+            cell = self.cell(cell_index)
+            if rows * cols > 1:
+                self.pack_array(cell, col * dx, row * dy, cols, rows, dx, dy)
+            else:
+                self.pack_manual(cell, col * dx, row * dy)
         super(ChipArray, self).write(*args, **kwargs)
 
     def write_chips(self, name=None, path=None):
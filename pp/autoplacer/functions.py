@@ -84,3 +84,53 @@ def longest_common_prefix(names):
         if all(n.startswith(prefix) for n in names):
             return prefix
         return prefix
+
+
+def get_grid_arrays(grid):
+    """ Returns regular arrays that cover a grid of cells
+
+    Consecutive grid positions holding the same key (along a row, then across
+    rows) are merged into one array, so they can be written as a single
+    instance array (AREF) instead of one instance each.
+
+    Args:
+        grid: {(row, col): key} for each occupied grid position
+
+    Returns:
+        list of (key, row, col, rows, cols), each array repeats key on
+        rows x cols grid positions starting at (row, col)
+    """
+    visited = set()
+    arrays = []
+    for row, col in sorted(grid):
+        if (row, col) in visited:
+            continue
+        key = grid[(row, col)]
+
+        def _free(r, c):
+            return (r, c) not in visited and (r, c) in grid and grid[(r, c)] == key
+
+        cols = 1
+        while _free(row, col + cols):
+            cols += 1
+        rows = 1
+        while all(_free(row + rows, col + c) for c in range(cols)):
+            rows += 1
+
+        for r in range(row, row + rows):
+            for c in range(col, col + cols):
+                visited.add((r, c))
+        arrays.append((key, row, col, rows, cols))
+    return arrays
+
+
+def test_get_grid_arrays():
+    grid = {(row, col): "a" for row in range(3) for col in range(4)}
+    assert get_grid_arrays(grid) == [("a", 0, 0, 3, 4)]
+
+    grid[(1, 2)] = "b"
+    del grid[(2, 3)]
+    arrays = get_grid_arrays(grid)
+    assert sum(rows * cols for _, _, _, rows, cols in arrays) == len(grid)
+    assert arrays[:2] == [("a", 0, 0, 1, 4), ("a", 1, 0, 2, 2)]
+    assert ("b", 1, 2, 1, 1) in arrays
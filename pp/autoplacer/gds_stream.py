@@ -0,0 +1,294 @@
+""" Streaming GDS writer for assembling subdies into a mask
+
+Copies the structures of each subdie GDS file straight into the output file,
+one subdie at a time, so the mask is never held in memory as a single Layout.
+
+Structures are deduplicated by content: a structure identical to one already
+written (same records and same children) is written once, and a different
+structure with an existing name is written as `name$1`.
+
+.. code::
+
+    with GdsStreamWriter("mask.gds") as writer:
+        name = writer.add_gds("subdie.gds")
+        writer.add_top_cell("mask", [(name, 0, 0, 90)])
+
+"""
+
+import hashlib
+import math
+import pathlib
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+HEADER = 0x00
+BGNLIB = 0x01
+LIBNAME = 0x02
+UNITS = 0x03
+ENDLIB = 0x04
+BGNSTR = 0x05
+STRNAME = 0x06
+ENDSTR = 0x07
+SREF = 0x0A
+ENDEL = 0x11
+SNAME = 0x12
+XY = 0x10
+STRANS = 0x1A
+ANGLE = 0x1C
+
+INT2 = 0x02
+INT4 = 0x03
+REAL8 = 0x05
+ASCII = 0x06
+
+
+def _record(rectype: int, datatype: int, data: bytes = b"") -> bytes:
+    return struct.pack(">HBB", 4 + len(data), rectype, datatype) + data
+
+
+def _string(rectype: int, s: str) -> bytes:
+    data = s.encode()
+    if len(data) % 2:
+        data += b"\0"
+    return _record(rectype, ASCII, data)
+
+
+def _decode_string(data: bytes) -> str:
+    return data.rstrip(b"\0").decode()
+
+
+def _real8(value: float) -> bytes:
+    """ Returns an 8 byte GDS real (excess-64, base 16) """
+    if value == 0:
+        return b"\0" * 8
+    sign = 0x80 if value < 0 else 0
+    value = abs(value)
+    exponent = int(math.floor(math.log(value, 16))) + 1
+    mantissa = int(round(value / 16.0 ** (exponent - 14)))
+    if mantissa >= 1 << 56:
+        mantissa >>= 4
+        exponent += 1
+    return struct.pack(">BBHI", sign | (exponent + 64), *_split56(mantissa))
+
+
+def _split56(mantissa: int) -> Tuple[int, int, int]:
+    return (mantissa >> 48) & 0xFF, (mantissa >> 32) & 0xFFFF, mantissa & 0xFFFFFFFF
+
+
+def _timestamp() -> bytes:
+    t = time.localtime()
+    fields = (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour, t.tm_min, t.tm_sec)
+    return struct.pack(">12h", *(fields * 2))
+
+
+def read_records(filepath: pathlib.Path):
+    """ Yields (rectype, datatype, data) for each record of a GDS file """
+    data = pathlib.Path(filepath).read_bytes()
+    i = 0
+    while i < len(data):
+        size, rectype, datatype = struct.unpack(">HBB", data[i : i + 4])
+        if size < 4:
+            break
+        yield rectype, datatype, data[i + 4 : i + size]
+        i += size
+        if rectype == ENDLIB:
+            break
+
+
+class _Structure:
+    def __init__(self, name: str):
+        self.name = name
+        # raw records between STRNAME and ENDSTR, None marks an SNAME
+        self.records: List[Optional[bytes]] = []
+        self.children: List[str] = []
+
+
+def read_structures(filepath: pathlib.Path) -> Tuple[bytes, Dict[str, _Structure]]:
+    """ Returns the UNITS record data and the structures of a GDS file """
+    units = None
+    structures = {}
+    structure = None
+    for rectype, datatype, data in read_records(filepath):
+        if rectype == UNITS:
+            units = data
+        elif rectype == STRNAME:
+            structure = _Structure(_decode_string(data))
+            structures[structure.name] = structure
+        elif structure is None:
+            continue
+        elif rectype == ENDSTR:
+            structure = None
+        elif rectype == SNAME:
+            structure.records.append(None)
+            structure.children.append(_decode_string(data))
+        else:
+            structure.records.append(_record(rectype, datatype, data))
+    if units is None:
+        raise ValueError(f"{filepath} has no UNITS record")
+    return units, structures
+
+
+def get_top_structure_name(structures: Dict[str, _Structure]) -> str:
+    children = {child for s in structures.values() for child in s.children}
+    top = [name for name in structures if name not in children]
+    if len(top) != 1:
+        raise ValueError(f"Expected one top structure, got {top}")
+    return top[0]
+
+
+class GdsStreamWriter:
+    """ Writes GDS structures from several files into one GDS file
+
+    Args:
+        filepath: output GDS
+        libname: library name
+    """
+
+    def __init__(self, filepath: pathlib.Path, libname: str = "LIB"):
+        self.filepath = pathlib.Path(filepath)
+        self.libname = libname
+        self.units = None
+        self.hash_to_name: Dict[str, str] = {}
+        self.names = set()
+        self.file = open(self.filepath, "wb")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _write_header(self, units: bytes) -> None:
+        self.units = units
+        self.file.write(_record(HEADER, INT2, struct.pack(">h", 600)))
+        self.file.write(_record(BGNLIB, INT2, _timestamp()))
+        self.file.write(_string(LIBNAME, self.libname))
+        self.file.write(_record(UNITS, REAL8, units))
+
+    def _unique_name(self, name: str) -> str:
+        new_name = name
+        i = 1
+        while new_name in self.names:
+            new_name = f"{name}${i}"
+            i += 1
+        self.names.add(new_name)
+        return new_name
+
+    def add_gds(self, filepath: pathlib.Path) -> str:
+        """ Writes all the structures of a GDS file. Returns its top cell name """
+        return self.add_structures(*read_structures(filepath))
+
+    def add_structures(self, units: bytes, structures: Dict[str, _Structure]) -> str:
+        """ Writes structures from `read_structures`. Returns the top cell name """
+        if self.units is None:
+            self._write_header(units)
+        elif units != self.units:
+            raise ValueError("GDS units differ from the previous files")
+
+        hashes = {}
+        new_names = {}
+
+        def _hash(name):
+            if name not in structures:
+                return name
+            if name not in hashes:
+                structure = structures[name]
+                h = hashlib.sha1()
+                children = iter(structure.children)
+                for record in structure.records:
+                    h.update(record or _hash(next(children)).encode())
+                hashes[name] = h.hexdigest()
+            return hashes[name]
+
+        to_write = []
+        for name in structures:
+            h = _hash(name)
+            if h in self.hash_to_name:
+                new_names[name] = self.hash_to_name[h]
+            else:
+                new_names[name] = self.hash_to_name[h] = self._unique_name(name)
+                to_write.append(name)
+
+        for name in to_write:
+            structure = structures[name]
+            children = iter(structure.children)
+            self.file.write(_record(BGNSTR, INT2, _timestamp()))
+            self.file.write(_string(STRNAME, new_names[name]))
+            for record in structure.records:
+                if record is None:
+                    child = next(children)
+                    record = _string(SNAME, new_names.get(child, child))
+                self.file.write(record)
+            self.file.write(_record(ENDSTR, 0))
+
+        return new_names[get_top_structure_name(structures)]
+
+    def add_top_cell(
+        self, name: str, references: List[Tuple[str, int, int, float]]
+    ) -> str:
+        """ Writes a cell with references (cell_name, x, y, rotation in degrees)
+
+        x and y are in database units. Returns the cell name.
+        """
+        if self.units is None:
+            raise ValueError("add_top_cell needs the units from a previous add_gds")
+        name = self._unique_name(name)
+        self.file.write(_record(BGNSTR, INT2, _timestamp()))
+        self.file.write(_string(STRNAME, name))
+        for cell_name, x, y, rotation in references:
+            self.file.write(_record(SREF, 0))
+            self.file.write(_string(SNAME, cell_name))
+            if rotation % 360:
+                self.file.write(_record(STRANS, 0x01, b"\0\0"))
+                self.file.write(_record(ANGLE, REAL8, _real8(rotation % 360)))
+            self.file.write(_record(XY, INT4, struct.pack(">2i", int(x), int(y))))
+            self.file.write(_record(ENDEL, 0))
+        self.file.write(_record(ENDSTR, 0))
+        return name
+
+    def close(self) -> None:
+        if self.file.closed:
+            return
+        if self.units is not None:
+            self.file.write(_record(ENDLIB, 0))
+        self.file.close()
+
+
+def test_gds_stream_writer(tmpdir):
+    import klayout.db as pya
+
+    from pp.autoplacer.helpers import hash_cell
+
+    gdspaths = []
+    for i, size in enumerate([10, 10, 20]):
+        layout = pya.Layout()
+        top = layout.create_cell(f"die{i}")
+        child = layout.create_cell("child")
+        child.shapes(layout.layer(1, 0)).insert(pya.Box(0, 0, size, size))
+        top.insert(pya.CellInstArray(child.cell_index(), pya.Trans(5, 5)))
+        gdspath = str(tmpdir / f"die{i}.gds")
+        layout.write(gdspath)
+        gdspaths.append(gdspath)
+
+    gdspath = tmpdir / "mask.gds"
+    with GdsStreamWriter(gdspath) as writer:
+        names = [writer.add_gds(p) for p in gdspaths]
+        writer.add_top_cell("mask", [(n, 1000 * i, 0, 90) for i, n in enumerate(names)])
+
+    layout = pya.Layout()
+    layout.read(str(gdspath))
+    # die1 is identical to die0
+    assert names == ["die0", "die0", "die2"]
+    assert sorted(c.name for c in layout.each_cell()) == [
+        "child",
+        "child$1",
+        "die0",
+        "die2",
+        "mask",
+    ]
+    mask = layout.top_cell()
+    assert mask.name == "mask"
+    assert [i.trans.rot for i in mask.each_inst()] == [1, 1, 1]
+    assert layout.cell("die2").bbox() == pya.Box(5, 5, 25, 25)
+    assert hash_cell(layout.cell("die0")) != hash_cell(layout.cell("die2"))
@@ -1,6 +1,14 @@
+import collections
 import functools
+import hashlib
+import itertools
+import weakref
+from concurrent.futures import ThreadPoolExecutor
 
 import klayout.db as pya
+import numpy as np
+
+from pp.compare_cells import normalize_polygon_start_point
 
 CELLS = {}
 
@@ -23,25 +31,222 @@ def load_gds(filepath):
     return layout
 
 
-def import_cell(layout, cell):
-    """ Imports a cell from another Layout into a given layout"""
-    # If the cell is already in the library, skip loading
-    if layout.cell(cell.name):
-        return layout.cell(cell.name)
+def read_gds(filepath):
+    """ Returns a new Layout read from filepath
+
+    Unlike `load_gds` the layout is not cached, so it is freed once it is not used
+    """
+    filepath = str(filepath)
+    layout = pya.Layout()
+    try:
+        layout.read(filepath)
+    except RuntimeError as e:
+        print(f"Error reading {filepath}")
+        raise e
+    return layout
+
+
+def iter_threaded(function, args, n_threads=8):
+    """ Yields function(arg) for each arg, in order
+
+    Runs up to n_threads calls ahead concurrently, so only a few results
+    are in memory at any time.
+    """
+    args = iter(args)
+    if n_threads <= 1:
+        for arg in args:
+            yield function(arg)
+        return
+
+    with ThreadPoolExecutor(n_threads) as executor:
+        futures = collections.deque(
+            executor.submit(function, arg) for arg in itertools.islice(args, n_threads)
+        )
+        while futures:
+            result = futures.popleft().result()
+            for arg in itertools.islice(args, 1):
+                futures.append(executor.submit(function, arg))
+            yield result
+
+
+def read_gds_iter(filepaths, n_threads=8):
+    """ Yields a new Layout for each filepath, in order
+
+    Reads up to n_threads files ahead concurrently, so only a few layouts
+    are in memory at any time.
+    """
+    return iter_threaded(read_gds, filepaths, n_threads=n_threads)
+
+
+def _hash_polygon(polygon):
+    hashes = []
+    for points in [polygon.each_point_hull()] + [
+        polygon.each_point_hole(i) for i in range(polygon.holes())
+    ]:
+        p = np.array([(point.x, point.y) for point in points], dtype=np.int64)
+        p = normalize_polygon_start_point(p)
+        hashes.append(hashlib.sha1(p).hexdigest())
+    return "_".join(hashes)
+
+
+def hash_cell(cell, dict_hashes=None):
+    """ Returns a geometry hash of a klayout cell
+
+    Follows `pp.compare_cells.hash_cells`: for each (layer, datatype) the shape
+    hashes are sorted, and each instance is hashed as its child cell hash plus
+    its transformation, so the hash does not depend on cell names or on the
+    order of shapes and instances.
+
+    Args:
+        cell: klayout cell
+        dict_hashes: cache of hashes by cell_index, for cells of the same layout
+    """
+    dict_hashes = {} if dict_hashes is None else dict_hashes
+    cell_index = cell.cell_index()
+    if cell_index in dict_hashes:
+        return dict_hashes[cell_index]
+
+    layout = cell.layout()
+    final_hash = hashlib.sha1()
+
+    layers = [
+        (info.layer, info.datatype, layer_index)
+        for layer_index, info in zip(layout.layer_indexes(), layout.layer_infos())
+    ]
+    for layer, datatype, layer_index in sorted(layers):
+        shapes = cell.shapes(layer_index)
+        if shapes.is_empty():
+            continue
+        shape_hashes = []
+        for shape in shapes.each():
+            if shape.is_text():
+                shape_hashes.append(
+                    hashlib.sha1(
+                        f"{shape.text_string}{shape.text_trans}".encode()
+                    ).hexdigest()
+                )
+            elif shape.polygon:
+                shape_hashes.append(_hash_polygon(shape.polygon))
+        final_hash.update(f"{layer}/{datatype}".encode())
+        for shape_hash in sorted(shape_hashes):
+            final_hash.update(shape_hash.encode())
+
+    instance_uids = []
+    for instance in cell.each_inst():
+        child_hash = hash_cell(instance.cell, dict_hashes)
+        cell_inst = instance.cell_inst
+        trans = cell_inst.cplx_trans if cell_inst.is_complex() else cell_inst.trans
+        uid = f"{child_hash}_{trans}"
+        if cell_inst.is_regular_array():
+            uid += f"_a{cell_inst.a}b{cell_inst.b}na{cell_inst.na}nb{cell_inst.nb}"
+        instance_uids.append(uid)
+    for uid in sorted(instance_uids):
+        final_hash.update(uid.encode())
+
+    dict_hashes[cell_index] = final_hash.hexdigest()
+    return dict_hashes[cell_index]
+
+
+class _ImportedCells:
+    """ Cells imported into a layout, by geometry hash """
+
+    def __init__(self):
+        self.hash_to_cell_index = {}
+        self.cell_index_to_hash = {}
+
+    def get(self, layout, cell_hash):
+        cell_index = self.hash_to_cell_index.get(cell_hash)
+        if cell_index is None or not layout.is_valid_cell_index(cell_index):
+            return None
+        return layout.cell(cell_index)
+
+    def get_hash(self, layout, cell):
+        """ Returns the hash of a cell of the layout, also if it was not imported """
+        cell_index = cell.cell_index()
+        if cell_index not in self.cell_index_to_hash:
+            self.add(hash_cell(cell), cell)
+        return self.cell_index_to_hash[cell_index]
+
+    def add(self, cell_hash, cell):
+        self.hash_to_cell_index.setdefault(cell_hash, cell.cell_index())
+        self.cell_index_to_hash[cell.cell_index()] = cell_hash
+
+
+# imported cells for each target layout, freed with the layout
+IMPORTED_CELLS = weakref.WeakKeyDictionary()
+
+
+def import_cell(layout, cell, dict_hashes=None):
+    """ Imports a cell from another Layout into a given layout
+
+    Cells are deduplicated by geometry (see `hash_cell`), not by name:
+
+    - a cell identical to one already in the layout is not copied again,
+      even if it has a different name
+    - a cell with the same name as a different cell of the layout is
+      imported with a unique name (`name$1`) instead of silently aliasing
+
+    Args:
+        layout: target layout
+        cell: cell from another layout
+        dict_hashes: cache of hashes by cell_index for the cell layout
+    """
+    imported = IMPORTED_CELLS.setdefault(layout, _ImportedCells())
+    dict_hashes = {} if dict_hashes is None else dict_hashes
+    cell_hash = hash_cell(cell, dict_hashes)
+
+    existing = imported.get(layout, cell_hash)
+    if existing is not None:
+        return existing
+
+    # Same name but different geometry
+    name = cell.name
+    same_name = layout.cell(name)
+    if same_name is not None:
+        if imported.get_hash(layout, same_name) == cell_hash:
+            return same_name
+        name = layout.unique_cell_name(name)
+        print(f"Cell {cell.name} has a conflicting geometry, imported as {name}")
 
     # Create a holder cell and copy in the shapes
-    new_cell = layout.create_cell(cell.name)
+    new_cell = layout.create_cell(name)
     new_cell.copy_shapes(cell)
 
     # Import all the child cells
+    cell_indexes = {}
     for child_index in cell.each_child_cell():
-        import_cell(layout, cell.layout().cell(child_index))
+        child = cell.layout().cell(child_index)
+        cell_indexes[child_index] = import_cell(layout, child, dict_hashes).cell_index()
 
     # Import all of the instances, doing the mapping from Layout to Layout
     for instance in cell.each_inst():
-        cell_index = layout.cell(instance.cell.name).cell_index()
-        # new_instance = pya.CellInstArray(cell_index, instance.trans)
         new_instance = instance.cell_inst.dup()
-        new_instance.cell_index = cell_index
+        new_instance.cell_index = cell_indexes[instance.cell_index]
         new_cell.insert(new_instance)
+
+    imported.add(cell_hash, new_cell)
     return new_cell
+
+
+def test_import_cell():
+    source = pya.Layout()
+    layer = source.layer(1, 0)
+    top = source.create_cell("top")
+    for name in ["a", "b"]:
+        c = source.create_cell(name)
+        c.shapes(layer).insert(pya.Box(0, 0, 10, 10))
+        top.insert(pya.CellInstArray(c.cell_index(), pya.Trans(0, 0)))
+    conflict = pya.Layout()
+    a = conflict.create_cell("a")
+    a.shapes(conflict.layer(1, 0)).insert(pya.Box(0, 0, 20, 20))
+
+    layout = pya.Layout()
+    new_top = import_cell(layout, top)
+    assert layout.cells() == 2
+    assert [i.cell.name for i in new_top.each_inst()] == ["a", "a"]
+    assert import_cell(layout, top).cell_index() == new_top.cell_index()
+
+    new_a = import_cell(layout, a)
+    assert new_a.name == "a$1"
+    assert new_a.bbox() == pya.Box(0, 0, 20, 20)
+    assert layout.cells() == 3
@@ -1,13 +1,27 @@
 import glob
 import json
+import os
 import re
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 import klayout.db as pya
 
 from pp.autoplacer.cell_list import CellList
 from pp.autoplacer.functions import WORKING_MEMORY, area
 
+INDEX_FILENAME = ".library_index.json"
+
+
+def get_top_cell_name(filename):
+    """ Returns the top cell name of a GDS file, reading only the hierarchy """
+    options = pya.LoadLayoutOptions()
+    options.create_other_layers = False
+    options.layer_map = pya.LayerMap()
+    layout = pya.Layout()
+    layout.read(str(filename), options)
+    return layout.top_cell().name
+
 
 class Library(object):
     """ Library of cells with convenient methods to:
@@ -18,6 +32,10 @@ class Library(object):
 
     Args:
         root: GDS devices path
+        n_threads: number of threads to read the GDS files of a selection
+
+    Only the cell names and JSON metadata are read when the `Library` is created.
+    Each GDS file is read when a `get`, `pop` or `pop_doe` selection needs it.
 
     To make a `Library` containing all the devices in `build/devices`, just instantiate the class (`library = Library()`).
     You can then pull out subsets of devices using `library.pop()`.
@@ -47,19 +65,61 @@ class Library(object):
 
     """
 
-    def __init__(self, root="build/devices"):
+    def __init__(self, root="build/devices", n_threads=8):
         self.root = root
+        self.n_threads = n_threads
+        self.filenames = {}
         self.cells = {}
         self.does = defaultdict(list)
-        self.load_all_gds()
+        self.index_all_gds()
         self.load_all_json()
 
-    def load_all_gds(self):
-        """ Loads all the gds files """
+    def index_all_gds(self):
+        """ Indexes the top cell name of each GDS file without loading it.
+
+        The index is stored in `root/.library_index.json` and keyed by file
+        modification time and size, so only new or modified files are scanned.
+        """
         filenames = glob.glob(self.root + "/*.gds")
-        print("Loading {} GDS files...".format(len(filenames)))
+        index_path = os.path.join(self.root, INDEX_FILENAME)
+        index = {}
+        if os.path.exists(index_path):
+            with open(index_path) as f:
+                index = json.load(f)
+
+        new_index = {}
         for filename in filenames:
-            self.load_gds(filename)
+            stat = os.stat(filename)
+            entry = index.get(filename)
+            if not (
+                entry
+                and entry["mtime"] == stat.st_mtime
+                and entry["size"] == stat.st_size
+            ):
+                entry = dict(
+                    mtime=stat.st_mtime,
+                    size=stat.st_size,
+                    top_cell=get_top_cell_name(filename),
+                )
+            new_index[filename] = entry
+            self.filenames[entry["top_cell"]] = filename
+
+        print(
+            "Indexed {} GDS files ({} new or modified)".format(
+                len(filenames), sum(index.get(f) != e for f, e in new_index.items())
+            )
+        )
+        if new_index != index:
+            try:
+                with open(index_path, "w") as f:
+                    json.dump(new_index, f, indent=2)
+            except OSError:
+                pass
+
+    def load_all_gds(self):
+        """ Loads all the gds files """
+        print("Loading {} GDS files...".format(len(self.filenames)))
+        self.load_cells(list(self.filenames.keys()))
         print("Done")
 
     def load_all_json(self):
@@ -76,6 +136,20 @@ class Library(object):
         self.cells[layout.top_cell().name] = layout.top_cell()
         self.cells[layout.top_cell().name].metadata = {}
 
+    def load_cells(self, names):
+        """ Returns the cells for names, reading the GDS files that are not loaded.
+
+        Large selections are read concurrently with `n_threads` threads
+        """
+        filenames = [self.filenames[name] for name in names if name not in self.cells]
+        if len(filenames) > 1 and self.n_threads > 1:
+            with ThreadPoolExecutor(self.n_threads) as executor:
+                list(executor.map(self.load_gds, filenames))
+        else:
+            for filename in filenames:
+                self.load_gds(filename)
+        return [self.cells[name] for name in names]
+
     def load_json(self, filename):
         """ Load json metadata"""
         with open(filename) as f:
@@ -83,23 +157,27 @@ class Library(object):
             if metadata.get("type") == "doe":
                 doe_name = metadata.get("name")
                 for cell_name in metadata.get("cells"):
-                    if cell_name in self.cells:
-                        self.does[doe_name].append(self.cells[cell_name])
+                    if cell_name in self.filenames:
+                        self.does[doe_name].append(cell_name)
 
-    def get(self, regex):
-        cells = [
-            cell
-            for key, cell in self.cells.items()
+    def _select(self, regex):
+        return [
+            key
+            for key in self.filenames.keys()
             if re.search(regex, key, flags=re.IGNORECASE)
         ]
+
+    def get(self, regex):
+        cells = self.load_cells(self._select(regex))
         return CellList(cells)
 
     def pop_doe(self, regex):
         """ pop out a set of cells """
         cells = []
         if regex in self.does:
-            cells = self.does[regex]
+            names = [name for name in self.does[regex] if name in self.filenames]
             del self.does[regex]
+            cells = self.load_cells(names)
             self.delete_cells(cells)
             cells = sorted(cells, key=area, reverse=True)
 
@@ -110,21 +188,11 @@ class Library(object):
 
     def pop(self, regex, delete=True):
         """ pop cells """
-        # pop out the cells
-        # cells = [
-        #     cell for key, cell in self.cells.items()
-        #     if re.search(regex, key, flags=re.IGNORECASE)
-        # ]
-        cells = []
-        keys = []
-        for key, cell in self.cells.items():
-            if re.search(regex, key, flags=re.IGNORECASE):
-                cells.append(cell)
-                keys.append(key)
+        keys = self._select(regex)
+        cells = self.load_cells(keys)
 
         if delete:
-            for key in keys:
-                del self.cells[key]
+            self.delete_cells(cells)
         if cells:
             cells = sorted(cells, key=area, reverse=True)
         else:
@@ -134,15 +202,13 @@ class Library(object):
 
     def delete_cells(self, cells):
         for cell in cells:
-            try:
-                del self.cells[cell.name]
-            except KeyError:
-                pass
+            self.filenames.pop(cell.name, None)
+            self.cells.pop(cell.name, None)
 
     def list(self):
         """ just list the devices currently in the collection """
         print("Library contains cells:")
-        for name in sorted(self.cells.keys()):
+        for name in sorted(self.filenames.keys()):
             print("-", name)
 
         if self.does and False:
@@ -153,11 +219,33 @@ class Library(object):
 
     def count(self):
         """ Safety check at the end """
-        if self.cells:
-            print("{} cells were not used".format(len(self.cells)))
+        if self.filenames:
+            print("{} cells were not used".format(len(self.filenames)))
 
     def __str__(self):
-        return "<collection of {} cells>".format(len(self.cells))
+        return "<collection of {} cells>".format(len(self.filenames))
+
+
+def test_library(tmpdir):
+    import pp
+
+    root = str(tmpdir)
+    for length in [1, 2, 3]:
+        c = pp.c.waveguide(length=length)
+        pp.write_gds(c, os.path.join(root, f"wg{length}.gds"))
+
+    lib = Library(root)
+    assert len(lib.filenames) == 3
+    assert not lib.cells
+    assert os.path.exists(os.path.join(root, INDEX_FILENAME))
+
+    cells = lib.pop("waveguide_L1")
+    assert len(cells) == 1
+    assert len(lib.filenames) == 2
+    assert len(lib.cells) == 0
+
+    lib = Library(root)
+    assert len(lib.get(".*")) == 3
 
 
 if __name__ == "__main__":
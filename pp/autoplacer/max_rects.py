@@ -0,0 +1,144 @@
+""" Maximal rectangles free-space structure for the AutoPlacer
+
+Keeps the list of maximal free rectangles of a bin in a numpy array.
+Placing a box splits every free rectangle that it overlaps and prunes the
+rectangles contained in others, so finding space for a new cell is a single
+vectorized pass over the free rectangles instead of stepping through candidate
+positions and querying the quadtree at each step.
+
+The best position for a given origin and direction is always the matching
+corner of one of the maximal free rectangles.
+"""
+
+import numpy as np
+
+import pp.autoplacer.functions as ap
+
+
+class MaxRects:
+    """ Free space of a bin, as maximal free rectangles
+
+    Args:
+        width: bin width (database units)
+        height: bin height (database units)
+        spacing: minimum gap between placed boxes (database units)
+
+    .. code::
+
+        free_space = MaxRects(100, 100)
+        x, y = free_space.find_position(10, 20)
+        free_space.insert((x, y, x + 10, y + 20))
+
+    """
+
+    def __init__(self, width, height, spacing=ap.GRID):
+        self.width = width
+        self.height = height
+        self.spacing = spacing
+        # left, bottom, right, top
+        self.free = np.array([[0, 0, width, height]], dtype=np.float64)
+
+    def __len__(self):
+        return len(self.free)
+
+    def find_position(self, width, height, origin=ap.SOUTH_WEST, direction=ap.VERTICAL):
+        """ Returns the (x, y) lower left corner for a box, or None if no space
+
+        VERTICAL searches column by column (like `AutoPlacer.find_space_vertical`),
+        HORIZONTAL row by row, both starting from the `origin` corner.
+        """
+        free = self.free
+        fits = (free[:, 2] - free[:, 0] >= width) & (free[:, 3] - free[:, 1] >= height)
+        if not fits.any():
+            return None
+        free = free[fits]
+
+        x = free[:, 0] if ap.WEST in origin else free[:, 2] - width
+        y = free[:, 1] if ap.SOUTH in origin else free[:, 3] - height
+        kx = x if ap.WEST in origin else -x
+        ky = y if ap.SOUTH in origin else -y
+
+        # np.lexsort sorts by the last key first
+        keys = (ky, kx) if direction == ap.VERTICAL else (kx, ky)
+        i = np.lexsort(keys)[0]
+        return x[i], y[i]
+
+    def insert(self, box):
+        """ Marks box (left, bottom, right, top) as used """
+        s = self.spacing
+        left, bottom, right, top = box
+        left, bottom, right, top = left - s, bottom - s, right + s, top + s
+
+        free = self.free
+        overlaps = (
+            (free[:, 0] < right)
+            & (free[:, 2] > left)
+            & (free[:, 1] < top)
+            & (free[:, 3] > bottom)
+        )
+        if not overlaps.any():
+            return
+
+        hit = free[overlaps]
+        keep = free[~overlaps]
+
+        # split each overlapped rectangle into up to 4 maximal rectangles
+        west = hit.copy()
+        west[:, 2] = left
+        east = hit.copy()
+        east[:, 0] = right
+        south = hit.copy()
+        south[:, 3] = bottom
+        north = hit.copy()
+        north[:, 1] = top
+        new = np.concatenate([west, east, south, north])
+        new = new[(new[:, 2] > new[:, 0]) & (new[:, 3] > new[:, 1])]
+        new = _prune(new)
+
+        # new rectangles contained in one that was not split are redundant
+        if len(keep):
+            contained = _contained_in(new, keep)
+            new = new[~contained]
+        self.free = np.concatenate([keep, new])
+
+
+def _contained_in(rects, others):
+    """ Returns a bool mask of rects contained in any of others """
+    return (
+        (rects[:, None, 0] >= others[None, :, 0])
+        & (rects[:, None, 1] >= others[None, :, 1])
+        & (rects[:, None, 2] <= others[None, :, 2])
+        & (rects[:, None, 3] <= others[None, :, 3])
+    ).any(axis=1)
+
+
+def _prune(rects):
+    """ Removes duplicated rectangles and rectangles contained in others """
+    rects = np.unique(rects, axis=0)
+    n = len(rects)
+    if n < 2:
+        return rects
+    contains = (
+        (rects[:, None, 0] >= rects[None, :, 0])
+        & (rects[:, None, 1] >= rects[None, :, 1])
+        & (rects[:, None, 2] <= rects[None, :, 2])
+        & (rects[:, None, 3] <= rects[None, :, 3])
+    )
+    contains[np.arange(n), np.arange(n)] = False
+    return rects[~contains.any(axis=1)]
+
+
+def test_max_rects():
+    free_space = MaxRects(100, 50, spacing=0)
+    assert free_space.find_position(10, 20) == (0, 0)
+    free_space.insert((0, 0, 10, 20))
+    assert free_space.find_position(10, 20) == (0, 20)
+    free_space.insert((0, 20, 10, 40))
+    assert free_space.find_position(10, 20) == (10, 0)
+    assert free_space.find_position(10, 20, direction=ap.HORIZONTAL) == (10, 0)
+    assert free_space.find_position(10, 20, origin=ap.NORTH_EAST) == (90, 30)
+    assert free_space.find_position(200, 20) is None
+
+
+if __name__ == "__main__":
+    test_max_rects()
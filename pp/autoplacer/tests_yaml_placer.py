@@ -1,4 +1,13 @@
-from pp.autoplacer.yaml_placer import update_dicts_recurse
+import klayout.db as pya
+
+import pp
+from pp.autoplacer.helpers import hash_cell
+from pp.autoplacer.yaml_placer import (
+    assemble_subdies,
+    placer_grid_cell_refs,
+    update_dicts_recurse,
+)
+from pp.build_profile import BuildProfile
 
 
 def test1():
@@ -17,5 +26,43 @@ def test1():
     print(new_dict)
 
 
+def test_assemble_subdies(tmpdir):
+    subdies_directory = str(tmpdir)
+    dict_subdies = {}
+    for i, length in enumerate([10, 20, 10]):
+        c = pp.c.waveguide(length=length)
+        name = f"subdie{i}"
+        pp.write_gds(c, gdspath=tmpdir / f"{name}.gds")
+        dict_subdies[name] = (1000 * i, 0, 90 * i)
+
+    profile = BuildProfile()
+    top_level = assemble_subdies(
+        "mask", dict_subdies, subdies_directory, n_threads=2, profile=profile
+    )
+    assert [r["name"] for r in profile.records] == list(dict_subdies) + ["mask"]
+    assert all("read_time" in r for r in profile.records[:-1])
+
+    gdspath = assemble_subdies(
+        "mask", dict_subdies, subdies_directory, mask_directory=tmpdir, stream=True
+    )
+    layout = pya.Layout()
+    layout.read(gdspath)
+    assert hash_cell(layout.top_cell()) == hash_cell(top_level)
+    assert layout.cells() == top_level.layout().cells()
+
+
+def test_placer_grid_cell_refs_arrays():
+    layout = pya.Layout()
+    a = layout.create_cell("a")
+    b = layout.create_cell("b")
+    refs = placer_grid_cell_refs([a, a, a, a, b], cols=3, rows=2, dx=10, dy=20)
+    assert [(r.cell_index, r.size()) for r in refs] == [
+        (a.cell_index(), 4),
+        (b.cell_index(), 1),
+    ]
+    assert refs[0].b == pya.Vector(0, 20000)
+    assert refs[1].trans.disp == pya.Vector(20000, 0)
+
+
 if __name__ == "__main__":
     test1()
@@ -21,15 +21,27 @@ iso_lines_coarse1:
 
 
 import collections
+import contextlib
 import os
 import sys
+import time
 
 import klayout.db as pya
 import numpy as np
 from omegaconf import OmegaConf
 
+import pp.autoplacer.functions as ap
 import pp.autoplacer.text as text
-from pp.autoplacer.helpers import CELLS, import_cell, load_gds
+from pp.autoplacer.gds_stream import GdsStreamWriter, read_structures
+from pp.autoplacer.helpers import (
+    CELLS,
+    hash_cell,
+    import_cell,
+    iter_threaded,
+    load_gds,
+    read_gds,
+    read_gds_iter,
+)
 from pp.config import CONFIG
 
 UM_TO_GRID = 1e3
@@ -122,7 +134,11 @@ def placer_grid_cell_refs(
     um_to_grid=UM_TO_GRID,
     **settings,
 ):
-    """cells: list of cells - order matters for placing"""
+    """cells: list of cells - order matters for placing
+
+    The same cell repeated on consecutive grid positions is placed as a single
+    instance array
+    """
 
     indices = [(i, j) for j in range(cols) for i in range(rows)]
 
@@ -131,13 +147,20 @@ def placer_grid_cell_refs(
             "Shape ({}, {}): Not enough emplacements ({}) for all these components"
             " ({}).".format(rows, cols, len(indices), len(cells))
         )
+    grid = {index: cell.cell_index() for cell, index in zip(cells, indices)}
+    a = pya.Vector(int(dx * um_to_grid), 0)
+    b = pya.Vector(0, int(dy * um_to_grid))
+
     components = []
-    for cell, (i, j) in zip(cells, indices):
+    for cell_index, i, j, nb, na in ap.get_grid_arrays(grid):
         _x = int((x0 + j * dx) * um_to_grid)
         _y = int((y0 + i * dy) * um_to_grid)
 
         transform = pya.Trans(_x, _y)
-        c_ref = pya.CellInstArray(cell.cell_index(), transform)
+        if na * nb > 1:
+            c_ref = pya.CellInstArray(cell_index, transform, a, b, na, nb)
+        else:
+            c_ref = pya.CellInstArray(cell_index, transform)
         components += [c_ref]
 
     return components
@@ -436,9 +459,10 @@ def load_yaml(filepath, defaults={"do_permutation": True}):
 DOE_CELLS = {}
 
 
-def load_doe(doe_name, doe_root):
+def get_doe_gdspaths(doe_name, doe_root):
     """
-    Load all components for this DOE from the cache
+    Returns the GDS paths of all the components of this DOE in the cache
+    or None if the DOE is not in the cache
     """
     doe_dir = os.path.join(doe_root, doe_name)
     content_file = os.path.join(doe_dir, "content.txt")
@@ -453,24 +477,25 @@ def load_doe(doe_name, doe_root):
                 If using a template, load the GDS from DOE folder used as a template
                 """
                 template_name = line.split(":")[1].strip()
-                return load_doe(template_name, doe_root)
+                return get_doe_gdspaths(template_name, doe_root)
 
             else:
                 """
                 Otherwise load the GDS from the current folder
                 """
                 component_names = line.split(" , ")
-                gdspaths = [
+                return [
                     os.path.join(doe_dir, name + ".gds") for name in component_names
                 ]
-                cells = [load_gds(gdspath) for gdspath in gdspaths]
 
-        # print("LOAD DOE")
-        # for _c in cells:
-        # print(_c.top_cell().name)
-        # print()
 
-        return cells
+def load_doe(doe_name, doe_root):
+    """
+    Load all components for this DOE from the cache
+    """
+    gdspaths = get_doe_gdspaths(doe_name, doe_root)
+    if gdspaths is not None:
+        return [load_gds(gdspath) for gdspath in gdspaths]
 
 
 PLACER_NAME2FUNC = {
@@ -524,6 +549,7 @@ def place_from_yaml(
     default_margin=10,
     default_x0="E",
     default_y0="S",
+    n_threads=8,
 ):
     """Returns a gds cell composed of DOEs/components given in a yaml file
     allows for each DOE to have its own x and y spacing (more flexible than method1)
@@ -531,6 +557,9 @@ def place_from_yaml(
     Args:
         filepath_yaml:
         root_does: used for cache, requires content.txt
+        n_threads: number of threads that read the DOE GDS files ahead.
+            Each GDS is imported into the top level layout and freed,
+            and cells with the same name (shared subcells) are copied only once
     """
     transform_identity = pya.Trans(0, 0)
     dicts, mask_settings = load_yaml(filepath_yaml)
@@ -552,6 +581,20 @@ def place_from_yaml(
     global CELLS
     CELLS[top_level_name] = top_level_layout
 
+    # Read all the DOE GDS files concurrently, in placement order
+    doe_gdspaths = {
+        doe_name: get_doe_gdspaths(doe_name, root_does) for doe_name in does.keys()
+    }
+    layouts = read_gds_iter(
+        [
+            gdspath
+            for gdspaths in doe_gdspaths.values()
+            if gdspaths
+            for gdspath in gdspaths
+        ],
+        n_threads=n_threads,
+    )
+
     default_doe_settings = {
         "add_doe_label": False,
         "add_doe_visual_label": False,
@@ -576,7 +619,8 @@ def place_from_yaml(
         doe = update_dicts_recurse(doe, default_doe_settings)
 
         # Get all the components
-        components = load_doe(doe_name, root_does)
+        gdspaths = doe_gdspaths[doe_name]
+        components = [next(layouts) for _ in gdspaths] if gdspaths is not None else None
 
         # Check that the high level components are all unique
         # For now this is mostly to circumvent a bug
@@ -724,7 +768,7 @@ def place_from_yaml(
 
         # Place components within a cell having the DOE name
 
-        if with_doe_cell or len(placed_components) > 1:
+        if with_doe_cell or len(components) > 1:
             doe_cell = top_level_layout.create_cell(doe_name)
             CELLS[doe_name] = doe_cell
             for instance in placed_components:
@@ -776,7 +820,9 @@ def place_and_write(
     c.write(filepath_gds)
 
 
-def assemble_subdies_from_yaml(filepath, subdies_directory, mask_directory=None):
+def assemble_subdies_from_yaml(
+    filepath, subdies_directory, mask_directory=None, **kwargs
+):
     data = OmegaConf.load(filepath)
     data = OmegaConf.to_container(data)
 
@@ -788,7 +834,32 @@ def assemble_subdies_from_yaml(filepath, subdies_directory, mask_directory=None)
         k: (v["x"], v["y"], v["R"] if "R" in v else 0) for k, v in data.items()
     }
 
-    return assemble_subdies(mask_name, dict_subdies, subdies_directory, mask_directory)
+    return assemble_subdies(
+        mask_name, dict_subdies, subdies_directory, mask_directory, **kwargs
+    )
+
+
+def _record(profile, name, kind):
+    """ Returns a profile record context, or an unused record without profile """
+    if profile:
+        return profile.record(name, kind=kind)
+    return contextlib.nullcontext({})
+
+
+def _read_subdie(gdspath):
+    """ Returns subdie layout, its cell hashes and read time """
+    t0 = time.perf_counter()
+    layout = read_gds(gdspath)
+    dict_hashes = {}
+    hash_cell(layout.top_cell(), dict_hashes)
+    return layout, dict_hashes, time.perf_counter() - t0
+
+
+def _read_subdie_structures(gdspath):
+    """ Returns subdie GDS units, structures and read time """
+    t0 = time.perf_counter()
+    units, structures = read_structures(gdspath)
+    return units, structures, time.perf_counter() - t0
 
 
 def assemble_subdies(
@@ -797,29 +868,69 @@ def assemble_subdies(
     subdies_directory,
     mask_directory=None,
     um_to_grid=UM_TO_GRID,
+    n_threads=8,
+    stream=False,
+    profile=None,
 ):
     """
+    Reads the subdies concurrently in n_threads and imports them into the mask
+    in order (a klayout Layout can only be edited from one thread).
+
     Args:
         dict_subdies: {subdie_name: (x, y, rotation) in (um, um, deg)}
         subdies_directory: directory where the subdies should be looked for
+        n_threads: number of subdies read ahead concurrently
+        stream: copy each subdie GDS into the mask GDS as it is read
+            (`pp.autoplacer.gds_stream`) instead of building the mask Layout
+            in memory, and return the mask gdspath
+        profile: optional `pp.build_profile.BuildProfile` that records
+            the read, import and write time of each subdie
     """
-    top_level_layout = pya.Layout()
-    top_level = top_level_layout.create_cell(mask_name)
     if mask_directory is None:
         mask_directory = subdies_directory
+    gdspath = os.path.join(mask_directory, mask_name + ".gds")
+    gdspaths = [
+        os.path.join(subdies_directory, subdie_name + ".gds")
+        for subdie_name in dict_subdies
+    ]
+
+    if stream:
+        subdies = iter_threaded(_read_subdie_structures, gdspaths, n_threads)
+        references = []
+        with GdsStreamWriter(gdspath) as writer:
+            for (subdie_name, (x_um, y_um, R)), (units, structures, read_time) in zip(
+                dict_subdies.items(), subdies
+            ):
+                with _record(profile, subdie_name, kind="subdie") as record:
+                    record["read_time"] = read_time
+                    cell_name = writer.add_structures(units, structures)
+                x = int(x_um * um_to_grid)
+                y = int(y_um * um_to_grid)
+                references.append((cell_name, x, y, R))
+
+            with _record(profile, mask_name, kind="write"):
+                writer.add_top_cell(mask_name, references)
+        return gdspath
 
-    for subdie_name, (x_um, y_um, R) in dict_subdies.items():
-        gdspath = os.path.join(subdies_directory, subdie_name + ".gds")
-        subdie = load_gds(gdspath).top_cell()
+    top_level_layout = pya.Layout()
+    top_level = top_level_layout.create_cell(mask_name)
+    # To make sure the returned cell does not get destroyed
+    CELLS[mask_name] = top_level_layout
 
-        _subdie = import_cell(top_level_layout, subdie)
+    subdies = iter_threaded(_read_subdie, gdspaths, n_threads)
+    for (subdie_name, (x_um, y_um, R)), (layout, dict_hashes, read_time) in zip(
+        dict_subdies.items(), subdies
+    ):
+        with _record(profile, subdie_name, kind="subdie") as record:
+            record["read_time"] = read_time
+            _subdie = import_cell(top_level_layout, layout.top_cell(), dict_hashes)
 
-        t = pya.Trans(R / 2, 0, int(x_um * um_to_grid), int(y_um * um_to_grid))
-        # t = pya.Trans(0, 0)
-        subdie_instance = pya.CellInstArray(_subdie.cell_index(), t)
-        top_level.insert(subdie_instance)
+            t = pya.Trans(R / 2, 0, int(x_um * um_to_grid), int(y_um * um_to_grid))
+            subdie_instance = pya.CellInstArray(_subdie.cell_index(), t)
+            top_level.insert(subdie_instance)
 
-    top_level.write(os.path.join(mask_directory, mask_name + ".gds"))
+    with _record(profile, mask_name, kind="write"):
+        top_level.write(gdspath)
     return top_level
 
 
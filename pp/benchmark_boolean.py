@@ -0,0 +1,74 @@
+""" Compares pp.boolean and pp.offset with the phidl and klayout backends
+
+A and B are two flattened arrays of overlapping ellipses (145 points each),
+shifted from each other, or two sets of random rectangles, with n polygons
+each. klayout runs the tiles on all the CPUs.
+
+.. code::
+
+    python pp/benchmark_boolean.py
+
+"""
+
+import time
+
+import numpy as np
+
+import pp
+from pp.boolean import boolean
+from pp.offset import offset
+
+
+def ellipse_array(n: int, offset: float = 0.0) -> pp.Component:
+    """Returns a flat Component with n ellipses on a grid."""
+    c = pp.Component()
+    ellipse = pp.c.ellipse(radii=(5, 3))
+    columns = int(np.ceil(np.sqrt(n)))
+    for i in range(n):
+        ref = c << ellipse
+        ref.move((8 * (i % columns) + offset, 5 * (i // columns) + offset))
+    return c.flatten()
+
+
+def random_rectangles(n: int, seed: int = 0) -> pp.Component:
+    """Returns a Component with n random rectangles."""
+    rng = np.random.RandomState(seed)
+    c = pp.Component()
+    xy = rng.rand(n, 2) * np.sqrt(n) * 20
+    sizes = rng.rand(n, 2) * 10 + 1
+    for (x, y), (w, h) in zip(xy, sizes):
+        c.add_polygon([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], (1, 0))
+    return c
+
+
+def benchmark(n=1000, operation="xor", shape="ellipse"):
+    if shape == "ellipse":
+        A = ellipse_array(n)
+        B = ellipse_array(n, offset=2.0)
+    else:
+        A = random_rectangles(n, seed=0)
+        B = random_rectangles(n, seed=1)
+
+    times = {}
+    for backend in ["phidl", "klayout"]:
+        t0 = time.time()
+        c = boolean(A, B, operation=operation, layer=(1, 0), backend=backend)
+        t1 = time.time()
+        offset(A, distance=0.5, layer=(1, 0), backend=backend)
+        t2 = time.time()
+        times[backend] = (t1 - t0, t2 - t1, c.area())
+
+    (b0, o0, area0), (b1, o1, area1) = times["phidl"], times["klayout"]
+    assert np.isclose(area0, area1, rtol=1e-4), (area0, area1)
+    print(
+        f"{n} {shape}s: {operation} phidl {b0:.2f}s, klayout {b1:.2f}s "
+        f"({b0 / b1:.1f}x); offset phidl {o0:.2f}s, klayout {o1:.2f}s "
+        f"({o0 / o1:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    for n in [1000, 5000, 20000]:
+        benchmark(n=n)
+    for n in [20000, 100000]:
+        benchmark(n=n, shape="rectangle")
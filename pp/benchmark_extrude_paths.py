@@ -0,0 +1,42 @@
+""" Extrudes many paths of different lengths, one by one and all at once
+
+The paths are Euler bends with different radii and angles, concatenated into
+one vertex buffer with offsets for `extrude_paths`.
+
+.. code::
+
+    python pp/benchmark_extrude_paths.py
+
+"""
+
+import time
+
+import numpy as np
+
+from pp.components.euler.geo_euler import euler_bend_points
+from pp.geo_utils import extrude_path, extrude_paths
+
+
+def benchmark(n=1000, width=0.5):
+    radii = 5 + np.arange(n) % 50
+    angles = [30, 45, 90, 180] * (n // 4)
+    paths = [euler_bend_points(a, radius=r) for a, r in zip(angles, radii)]
+    points = np.concatenate(paths)
+    offsets = np.cumsum([0] + [len(path) for path in paths])
+
+    t0 = time.time()
+    polygons = [extrude_path(path, width) for path in paths]
+    t1 = time.time()
+    pts, polygon_offsets = extrude_paths(points, offsets, width)
+    t2 = time.time()
+
+    assert np.array_equal(np.concatenate(polygons), pts)
+    print(
+        f"{n} paths, {len(points)} points: one by one {t1 - t0:.3f}s, "
+        f"all at once {t2 - t1:.4f}s ({(t1 - t0) / (t2 - t1):.0f}x)"
+    )
+
+
+if __name__ == "__main__":
+    for n in [100, 1000, 10000]:
+        benchmark(n=n)
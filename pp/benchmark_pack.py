@@ -0,0 +1,89 @@
+""" Compares pp.pack bin size bisection and strategies against linear bin growth
+
+.. code::
+
+    python pp/benchmark_pack.py
+
+"""
+
+import itertools
+import multiprocessing
+import time
+
+import numpy as np
+import rectpack
+
+from pp.pack import _get_density_key, _pack_single_bin, _pack_single_bin_strategy
+
+
+def _pack_single_bin_linear(rect_dict, aspect_ratio, density):
+    """Previous pp.pack search: grow the bin by `density` until all rectangles fit."""
+    total_area = sum(w * h for w, h in rect_dict.values())
+    aspect_ratio = np.asarray(aspect_ratio) / np.linalg.norm(aspect_ratio)
+    box_size = np.asarray(aspect_ratio * np.sqrt(total_area), dtype=np.float64)
+    while True:
+        rect_packer = rectpack.newPacker(
+            mode=rectpack.PackingMode.Offline,
+            pack_algo=rectpack.MaxRectsBlsf,
+            sort_algo=rectpack.SORT_AREA,
+            bin_algo=rectpack.PackingBin.BBF,
+            rotation=False,
+        )
+        for rid, r in rect_dict.items():
+            rect_packer.add_rect(width=r[0], height=r[1], rid=rid)
+        rect_packer.add_bin(width=box_size[0], height=box_size[1])
+        rect_packer.pack()
+        box_size *= density
+        if len(rect_packer.rect_list()) == len(rect_dict):
+            break
+    return {r[-1]: r[:-1] for r in rect_packer[0].rect_list()}
+
+
+def random_rects(n, seed=0):
+    rng = np.random.RandomState(seed)
+    return {i: tuple(rng.randint(100, 5000, size=2)) for i in range(n)}
+
+
+def benchmark(n=300, density=1.05):
+    rect_dict = random_rects(n)
+    kwargs = dict(
+        rect_dict=rect_dict,
+        aspect_ratio=(1, 1),
+        max_size=np.array([np.inf, np.inf]),
+        sort_by_area=True,
+        density=density,
+        precision=1e-2,
+    )
+
+    t0 = time.time()
+    packed = _pack_single_bin_linear(rect_dict, (1, 1), density)
+    print(
+        f"linear growth, {time.time() - t0:.2f}s, bin area {_get_density_key(packed)[1]:.3e}"
+    )
+
+    t0 = time.time()
+    packed, _ = _pack_single_bin(**kwargs)
+    print(
+        f"search, {time.time() - t0:.2f}s, bin area {_get_density_key(packed)[1]:.3e}"
+    )
+
+    strategies = itertools.product(
+        ["MaxRectsBlsf", "MaxRectsBssf", "MaxRectsBaf", "SkylineBl"],
+        ["SORT_AREA", "SORT_PERI", "SORT_LSIDE"],
+    )
+    list_kwargs = [
+        dict(pack_algorithm=pack_algorithm, sort_algorithm=sort_algorithm, **kwargs)
+        for pack_algorithm, sort_algorithm in strategies
+    ]
+    t0 = time.time()
+    with multiprocessing.Pool(multiprocessing.cpu_count()) as pool:
+        results = pool.map(_pack_single_bin_strategy, list_kwargs)
+    key, _, _ = min(results, key=lambda r: r[0])
+    print(
+        f"search {len(list_kwargs)} strategies in parallel, {time.time() - t0:.2f}s,"
+        f" bin area {key[1]:.3e}"
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
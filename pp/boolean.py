@@ -3,6 +3,7 @@ from typing import Optional
 import phidl.geometry as pg
 from omegaconf.listconfig import ListConfig
 
+from pp.boolean_klayout import boolean_klayout
 from pp.component import Component
 from pp.import_phidl_component import import_phidl_component
 
@@ -15,6 +16,7 @@ def boolean(
     num_divisions: Optional[int] = None,
     max_points: int = 4000,
     layer: ListConfig = 0,
+    backend: str = "phidl",
 ) -> Component:
     """Performs boolean operations between 2 Device/DeviceReference objects,
     or lists of Devices/DeviceReferences.
@@ -36,6 +38,8 @@ def boolean(
             The maximum number of vertices within the resulting polygon.
         layer : int, array-like[2], or set
             Specific layer(s) to put polygon geometry on.
+        backend : 'phidl' or 'klayout' (tiled and multi-threaded, the
+            number of tiles defaults to one per 10000 polygons)
 
     Returns:  Device
         A Device containing a polygon(s) with the boolean operations between
@@ -47,6 +51,19 @@ def boolean(
     'A-B' is equivalent to 'not'.
     'B-A' is equivalent to 'not' with the operands switched.
     """
+    if backend == "klayout":
+        return boolean_klayout(
+            A=A,
+            B=B,
+            operation=operation,
+            precision=precision,
+            num_divisions=num_divisions,
+            max_points=max_points,
+            layer=layer,
+        )
+    if backend != "phidl":
+        raise ValueError(f"backend = {backend!r} not in ['phidl', 'klayout']")
+
     num_divisions = num_divisions or [1, 1]
     c = pg.boolean(
         A=A,
@@ -0,0 +1,276 @@
+""" Boolean and offset operations on klayout Regions, tiled and multi-threaded
+
+Same API as `pp.boolean.boolean` and `pp.offset.offset`, which use this module
+with `backend="klayout"`.
+
+The polygons go into klayout Regions, in integer units of `precision`.
+Above `polygons_per_tile` polygons, the operation runs in tiles on
+`n_threads` threads (klayout TilingProcessor). As with `num_divisions` in
+phidl, polygons crossing tile boundaries come back split at the boundaries.
+
+.. code::
+
+    c = boolean_klayout(A=e1, B=e2, operation="A-B")
+    c = offset_klayout(c, distance=1)
+
+"""
+
+import math
+import os
+import pathlib
+import tempfile
+from typing import Iterable, List, Optional, Tuple
+
+import gdspy
+import klayout.db as pya
+import numpy as np
+from numpy import ndarray
+from phidl.device_layout import Device, DeviceReference, Polygon
+
+from pp.component import Component
+
+# klayout expression for each operation, on the input Regions a and b
+OPERATIONS = {
+    "and": "a & b",
+    "or": "a | b",
+    "a+b": "a | b",
+    "xor": "a ^ b",
+    "not": "a - b",
+    "a-b": "a - b",
+    "b-a": "b - a",
+}
+
+# klayout corner interpolation mode for each gdspy join
+SIZE_MODES = {"miter": 2, "bevel": 0}
+
+
+def _get_polygons(elements) -> List[ndarray]:
+    """Returns the polygons of a Device/DeviceReference/Polygon or a list."""
+    if not isinstance(elements, (list, tuple)):
+        elements = [elements]
+    polygons = []
+    for e in elements:
+        if isinstance(e, (Device, DeviceReference)):
+            polygons += e.get_polygons(by_spec=False)
+        elif isinstance(e, (Polygon, gdspy.PolygonSet)):
+            polygons += e.polygons
+    return polygons
+
+
+def get_region(elements, precision: float = 1e-4) -> pya.Region:
+    """Returns a klayout Region with the polygons of elements, in integer
+    units of precision.
+
+    Args:
+        elements: Device(/Reference), Polygon or list of them
+        precision: database unit (um)
+    """
+    region = pya.Region()
+    polygons = _get_polygons(elements)
+    if not polygons:
+        return region
+
+    # through a GDS file: much faster than creating the klayout points in Python
+    library = gdspy.GdsLibrary(unit=1e-6, precision=precision * 1e-6)
+    library.new_cell("region").add(gdspy.PolygonSet(polygons))
+    with tempfile.TemporaryDirectory() as dirpath:
+        gdspath = pathlib.Path(dirpath) / "region.gds"
+        library.write_gds(gdspath)
+        layout = pya.Layout()
+        layout.read(str(gdspath))
+    region.insert(layout.top_cell().begin_shapes_rec(layout.layer(0, 0)))
+    return region
+
+
+def region_to_polygons(
+    region: pya.Region, precision: float = 1e-4, max_points: int = 4000
+) -> List[ndarray]:
+    """Returns the polygons of a region in um, without holes and with at
+    most max_points vertices each."""
+    region = region.dup()
+    region.merged_semantics = False
+    if max_points:
+        region.break_(max_points, 0)
+    polygons = []
+    for polygon in region.each():
+        if polygon.holes():
+            polygon = polygon.resolved_holes()
+        polygons.append(
+            np.array([(p.x, p.y) for p in polygon.each_point_hull()]) * precision
+        )
+    return polygons
+
+
+def get_num_tiles(n_polygons: int, polygons_per_tile: int = 10000) -> Tuple[int, int]:
+    """Returns (nx, ny) square tiling with about polygons_per_tile each."""
+    n = max(1, math.ceil(math.sqrt(n_polygons / polygons_per_tile)))
+    return n, n
+
+
+def _run_tiled(
+    expression: str,
+    inputs: Iterable[Tuple[str, pya.Region]],
+    precision: float,
+    num_divisions: Optional[Tuple[int, int]],
+    n_threads: Optional[int],
+    polygons_per_tile: int,
+    border: float = 0.0,
+) -> pya.Region:
+    """Returns the region of a klayout expression on the inputs, in tiles of
+    about polygons_per_tile polygons."""
+    inputs = list(inputs)
+    n_polygons = sum(region.count() for _, region in inputs)
+    num_divisions = num_divisions or get_num_tiles(n_polygons, polygons_per_tile)
+
+    output = pya.Region()
+    tp = pya.TilingProcessor()
+    tp.dbu = precision
+    for name, region in inputs:
+        tp.input(name, region)
+    tp.output("o", output)
+    tp.tiles(*num_divisions)
+    tp.tile_border(border, border)
+    tp.threads = n_threads or os.cpu_count() or 1
+    tp.queue(f"_output(o, {expression})")
+    tp.execute("pp.boolean_klayout")
+    return output
+
+
+def _to_component(
+    region: pya.Region, name: str, precision: float, max_points: int, layer
+) -> Component:
+    c = Component(name)
+    polygons = region_to_polygons(region, precision=precision, max_points=max_points)
+    if polygons:
+        c.add_polygon(polygons, layer=layer)
+    return c
+
+
+def boolean_klayout(
+    A,
+    B,
+    operation: str,
+    precision: float = 1e-4,
+    num_divisions: Optional[Tuple[int, int]] = None,
+    max_points: int = 4000,
+    layer=0,
+    n_threads: Optional[int] = None,
+    polygons_per_tile: int = 10000,
+) -> Component:
+    """Performs boolean operations between 2 Device/DeviceReference objects,
+    or lists of Devices/DeviceReferences, with klayout.
+
+    Args:
+        A: Device(/Reference) or list of Device(/Reference) or Polygon.
+        B: Device(/Reference) or list of Device(/Reference) or Polygon.
+        operation: {'not', 'and', 'or', 'xor', 'A-B', 'B-A', 'A+B'}
+        precision: database unit (um), vertices are rounded to it
+        num_divisions: (nx, ny) tiles, defaults to about polygons_per_tile
+            polygons per tile
+        max_points: maximum number of vertices of each resulting polygon
+        layer: int, array-like[2], or set
+        n_threads: for the tiles, defaults to the number of CPUs
+        polygons_per_tile: for the automatic tiling
+
+    Returns: Component with the result polygons on layer
+    """
+    op = operation.lower()
+    if op not in OPERATIONS:
+        raise ValueError(
+            f"operation = {operation!r} not in "
+            "{'not', 'and', 'or', 'xor', 'A-B', 'B-A', 'A+B'}"
+        )
+
+    a = get_region(A, precision=precision)
+    b = get_region(B, precision=precision)
+    region = _run_tiled(
+        OPERATIONS[op],
+        [("a", a), ("b", b)],
+        precision=precision,
+        num_divisions=num_divisions,
+        n_threads=n_threads,
+        polygons_per_tile=polygons_per_tile,
+    )
+    return _to_component(region, "boolean", precision, max_points, layer)
+
+
+def offset_klayout(
+    elements,
+    distance: float = 0.1,
+    join_first: bool = True,
+    precision: float = 1e-4,
+    num_divisions: Optional[Tuple[int, int]] = None,
+    join: str = "miter",
+    tolerance: float = 2,
+    max_points: int = 4000,
+    layer=0,
+    n_threads: Optional[int] = None,
+    polygons_per_tile: int = 10000,
+) -> Component:
+    """Returns a Component with all the polygons of elements grown
+    (or shrunk, for a negative distance) by distance, with klayout.
+
+    Args:
+        elements: Device(/Reference), Polygon or list of them
+        distance: offset (um)
+        join_first: merge the polygons before the offset
+        precision: database unit (um)
+        num_divisions: (nx, ny) tiles, defaults to about polygons_per_tile
+            polygons per tile
+        join: 'miter' (corners up to 90 deg stay sharp) or 'bevel'
+        tolerance: unused, klayout has no miter limit
+        max_points: maximum number of vertices of each resulting polygon
+        layer: int, array-like[2], or set
+        n_threads: for the tiles, defaults to the number of CPUs
+        polygons_per_tile: for the automatic tiling
+    """
+    if join not in SIZE_MODES:
+        raise ValueError(f"join = {join!r} not in {list(SIZE_MODES)}")
+
+    region = get_region(elements, precision=precision)
+    region.merged_semantics = join_first
+    d = int(round(distance / precision))
+    region = _run_tiled(
+        f"a.sized({d}, {SIZE_MODES[join]}).merged()",
+        [("a", region)],
+        precision=precision,
+        num_divisions=num_divisions,
+        n_threads=n_threads,
+        polygons_per_tile=polygons_per_tile,
+        border=abs(distance) * 2,
+    )
+    return _to_component(region, "offset", precision, max_points, layer)
+
+
+def test_boolean_klayout():
+    import pp
+
+    e1 = pp.c.rectangle(size=(10, 10))
+    e2 = pp.c.rectangle(size=(10, 10)).ref(position=(5, 0))
+    areas = {"and": 50, "or": 150, "xor": 100, "A-B": 50, "B-A": 50}
+    for operation, area in areas.items():
+        c = boolean_klayout(e1, e2, operation=operation, layer=(1, 0))
+        assert np.isclose(c.area(), area), (operation, c.area())
+        tiled = boolean_klayout(
+            e1, e2, operation=operation, layer=(1, 0), num_divisions=(3, 2)
+        )
+        assert np.isclose(tiled.area(), area), (operation, tiled.area())
+
+
+def test_offset_klayout():
+    import pp
+
+    c = pp.c.rectangle(size=(10, 10))
+    assert np.isclose(offset_klayout(c, distance=1).area(), 144)
+    assert np.isclose(offset_klayout(c, distance=-1).area(), 64)
+    tiled = offset_klayout(c, distance=1, num_divisions=(2, 2))
+    assert np.isclose(tiled.area(), 144)
+
+    # overlapping polygons come back merged
+    c = pp.Component()
+    c << pp.c.rectangle(size=(10, 10))
+    ref = c << pp.c.rectangle(size=(10, 10))
+    ref.movex(5)
+    for join_first in [True, False]:
+        co = offset_klayout(c, distance=1, join_first=join_first)
+        assert np.isclose(co.area(), 17 * 12)
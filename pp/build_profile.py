@@ -0,0 +1,319 @@
+""" Build profiling for mask runs
+
+Records wall time, CPU time, peak memory, polygon count, vertex count, cell
+count and GDS file size for every DOE and component built with
+`pp.generate_does`, and writes them as JSON, markdown and HTML reports.
+
+Peak memory is traced with tracemalloc, which slows down allocation-heavy
+code (often 2x or more), so wall and CPU times measured with memory tracing
+are inflated. Profile with `trace_memory=False` (`--no-trace-memory`) for
+accurate times.
+
+.. code::
+
+    pf build does.yml --profile
+
+"""
+
+import contextlib
+import html
+import json
+import pathlib
+import time
+import tracemalloc
+from typing import Dict, Iterator, List, Optional
+
+from pp.component import Component
+
+COLUMNS = [
+    ("kind", "kind"),
+    ("doe", "doe"),
+    ("name", "name"),
+    ("wall_time", "wall (s)"),
+    ("cpu_time", "cpu (s)"),
+    ("peak_memory", "peak memory (MB)"),
+    ("polygons", "polygons"),
+    ("vertices", "vertices"),
+    ("cells", "cells"),
+    ("gds_size", "gds size (kB)"),
+]
+
+_peak_stack: List[int] = []
+
+
+def get_component_stats(component: Component) -> Dict[str, int]:
+    """Returns number of stored polygons, vertices and cells of a component.
+
+    Counts each cell definition once (hierarchical, not flattened)
+    """
+    cells = [component] + list(component.get_dependencies(recursive=True))
+    polygons = 0
+    vertices = 0
+    for cell in cells:
+        for polygonset in cell.polygons:
+            polygons += len(polygonset.polygons)
+            vertices += sum(len(points) for points in polygonset.polygons)
+    return dict(polygons=polygons, vertices=vertices, cells=len(cells))
+
+
+def _get_peak_memory() -> int:
+    _, peak = tracemalloc.get_traced_memory()
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+    return peak
+
+
+class BuildProfile:
+    """Collects build metrics for DOEs and components.
+
+    Args:
+        records: list of previous records
+        trace_memory: traces peak memory with tracemalloc, which inflates
+            the wall and CPU times. False only measures times
+
+    .. code::
+
+        profile = BuildProfile()
+        with profile.record("mmi1x2_w5", kind="component") as r:
+            c = pp.c.mmi1x2(width_mmi=5)
+            profile.add_component_stats(r, c)
+
+    """
+
+    def __init__(self, records: Optional[List[Dict]] = None, trace_memory: bool = True):
+        self.records = records or []
+        self.trace_memory = trace_memory
+
+    @contextlib.contextmanager
+    def record(self, name: str, kind: str = "component", **kwargs) -> Iterator[Dict]:
+        """Measures wall time, CPU time and peak traced memory of the block.
+
+        Records can be nested (a DOE record around its component records)
+        """
+        record = dict(kind=kind, name=name, **kwargs)
+        started_tracing = self.trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        if self.trace_memory:
+            if _peak_stack:
+                _peak_stack[-1] = max(_peak_stack[-1], _get_peak_memory())
+            else:
+                _get_peak_memory()
+            memory0, _ = tracemalloc.get_traced_memory()
+            _peak_stack.append(memory0)
+
+        t0 = time.perf_counter()
+        cpu0 = time.process_time()
+        try:
+            yield record
+        finally:
+            record["wall_time"] = time.perf_counter() - t0
+            record["cpu_time"] = time.process_time() - cpu0
+            if self.trace_memory:
+                peak = max(_peak_stack.pop(), _get_peak_memory())
+                if _peak_stack:
+                    _peak_stack[-1] = max(_peak_stack[-1], peak)
+                record["peak_memory"] = peak - memory0
+            if started_tracing:
+                tracemalloc.stop()
+            self.records.append(record)
+
+    def add_component_stats(self, record: Dict, component: Component) -> None:
+        record.update(get_component_stats(component))
+
+    def add_gds_size(self, name: str, gdspath: pathlib.Path) -> None:
+        """Adds the file size of the GDS written for the latest record `name`."""
+        for record in reversed(self.records):
+            if record["name"] == name:
+                record["gds_size"] = pathlib.Path(gdspath).stat().st_size
+                return
+
+    def write(self, dirpath: pathlib.Path, name: str = "build_profile"):
+        """Writes JSON, markdown and HTML reports. Returns the JSON path."""
+        return write_profile(self.records, dirpath=dirpath, name=name)
+
+
+def load_profiles(dirpath: pathlib.Path, names: List[str]) -> List[Dict]:
+    """Returns records from `{name}.json` files written by each DOE process."""
+    records = []
+    for name in names:
+        jsonpath = pathlib.Path(dirpath) / f"{name}.json"
+        if jsonpath.exists():
+            with open(jsonpath) as f:
+                records += json.load(f)
+    return records
+
+
+def _format_field(record: Dict, key: str) -> str:
+    value = record.get(key)
+    if value is None:
+        return ""
+    if key == "peak_memory":
+        return f"{value / 1e6:.2f}"
+    if key == "gds_size":
+        return f"{value / 1e3:.1f}"
+    if isinstance(value, float):
+        return f"{value:.3f}"
+    return str(value)
+
+
+def get_note(records: List[Dict]) -> str:
+    """Returns how the times were measured, for the reports."""
+    if any("peak_memory" in record for record in records):
+        return (
+            "Peak memory traced with tracemalloc: wall and cpu times include "
+            "its overhead (often 2x or more on allocation-heavy builds). "
+            "Profile with `--no-trace-memory` for accurate times."
+        )
+    return "Memory not traced: wall and cpu times without tracemalloc overhead."
+
+
+def get_markdown_table(records: List[Dict]) -> List[str]:
+    """Returns markdown table lines, sorted by decreasing wall time."""
+    records = sorted(records, key=lambda r: r["wall_time"], reverse=True)
+    t = []
+    t.append("| " + " | ".join(label for _, label in COLUMNS) + " |")
+    t.append("|" + "|".join("---" for _ in COLUMNS) + "|")
+    for record in records:
+        fields = [_format_field(record, key) for key, _ in COLUMNS]
+        t.append("| " + " | ".join(fields) + " |")
+    return t
+
+
+_html_template = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+table {{border-collapse: collapse; font-family: monospace;}}
+th, td {{border: 1px solid #ccc; padding: 2px 8px; text-align: right;}}
+th {{cursor: pointer; background: #eee;}}
+</style>
+</head>
+<body>
+<h1>{title}</h1>
+<p>{note}</p>
+<table id="profile">
+<thead><tr>{head}</tr></thead>
+<tbody>
+{rows}
+</tbody>
+</table>
+<script>
+document.querySelectorAll("th").forEach(function (th, column) {{
+  th.addEventListener("click", function () {{
+    var tbody = document.querySelector("#profile tbody");
+    var rows = Array.from(tbody.rows);
+    var reverse = th.dataset.order === "asc";
+    th.dataset.order = reverse ? "desc" : "asc";
+    rows.sort(function (a, b) {{
+      var x = a.cells[column].dataset.value, y = b.cells[column].dataset.value;
+      var fx = parseFloat(x), fy = parseFloat(y);
+      var cmp = isNaN(fx) || isNaN(fy) ? x.localeCompare(y) : fx - fy;
+      return reverse ? -cmp : cmp;
+    }});
+    rows.forEach(function (row) {{ tbody.appendChild(row); }});
+  }});
+}});
+</script>
+</body>
+</html>
+"""
+
+
+def get_html(records: List[Dict], title: str = "build profile") -> str:
+    """Returns a standalone HTML page with a click-to-sort table."""
+    records = sorted(records, key=lambda r: r["wall_time"], reverse=True)
+    head = "".join(f"<th>{html.escape(label)}</th>" for _, label in COLUMNS)
+    rows = []
+    for record in records:
+        cells = [
+            '<td data-value="{}">{}</td>'.format(
+                html.escape(str(record.get(key, ""))),
+                html.escape(_format_field(record, key)),
+            )
+            for key, _ in COLUMNS
+        ]
+        rows.append("<tr>" + "".join(cells) + "</tr>")
+    return _html_template.format(
+        title=html.escape(title),
+        note=html.escape(get_note(records)),
+        head=head,
+        rows="\n".join(rows),
+    )
+
+
+def write_profile(
+    records: List[Dict], dirpath: pathlib.Path, name: str = "build_profile"
+) -> pathlib.Path:
+    """Writes records into `name`.json, `name`.md and `name`.html
+
+    Args:
+        records: list of dicts from BuildProfile
+        dirpath: directory for the reports
+        name: file name without suffix
+    """
+    dirpath = pathlib.Path(dirpath)
+    dirpath.mkdir(parents=True, exist_ok=True)
+    jsonpath = dirpath / f"{name}.json"
+
+    with open(jsonpath, "w") as fw:
+        fw.write(json.dumps(records, indent=2))
+
+    with open(jsonpath.with_suffix(".md"), "w") as fw:
+        fw.write(f"# {name}\n\n")
+        fw.write(get_note(records) + "\n\n")
+        fw.write("\n".join(get_markdown_table(records)) + "\n")
+
+    with open(jsonpath.with_suffix(".html"), "w") as fw:
+        fw.write(get_html(records, title=name))
+
+    return jsonpath
+
+
+def test_build_profile(tmpdir):
+    import pp
+
+    profile = BuildProfile()
+    with profile.record("doe", kind="doe") as doe_record:
+        for length in [10, 20]:
+            with profile.record(f"wg{length}", doe="doe") as r:
+                c = pp.c.waveguide(length=length)
+                profile.add_component_stats(r, c)
+
+    assert len(profile.records) == 3
+    assert profile.records[-1] is doe_record
+    assert profile.records[0]["polygons"] >= 1
+    assert profile.records[0]["cells"] >= 1
+    assert doe_record["peak_memory"] >= profile.records[0]["peak_memory"]
+
+    jsonpath = profile.write(pathlib.Path(tmpdir))
+    assert jsonpath.with_suffix(".md").exists()
+    assert jsonpath.with_suffix(".html").exists()
+    assert len(load_profiles(tmpdir, ["build_profile"])) == 3
+    assert "tracemalloc" in jsonpath.with_suffix(".md").read_text()
+
+
+def test_build_profile_no_trace_memory():
+    import pp
+
+    profile = BuildProfile(trace_memory=False)
+    with profile.record("wg") as r:
+        c = pp.c.waveguide()
+        profile.add_component_stats(r, c)
+
+    assert not tracemalloc.is_tracing()
+    assert "peak_memory" not in r
+    assert r["wall_time"] >= 0
+    assert "without tracemalloc" in get_note(profile.records)
+
+
+if __name__ == "__main__":
+    import pp
+
+    profile = BuildProfile()
+    with profile.record("mmi1x2") as r:
+        c = pp.c.mmi1x2()
+        profile.add_component_stats(r, c)
+    print("\n".join(get_markdown_table(profile.records)))
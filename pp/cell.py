@@ -12,9 +12,16 @@ CACHE: Dict[str, Component] = {}
 
 
 def clear_cache():
-    """Clears the cache of components."""
-    global CACHE
-    CACHE = {}
+    """Clears the cache of components, route segments and plans and compiled
+    YAML netlists."""
+    from pp.component_from_yaml import clear_compiled_yaml_cache
+    from pp.routing.manhattan import clear_segment_cache
+    from pp.routing.route_fiber_array import clear_route_plan_cache
+
+    CACHE.clear()
+    clear_segment_cache()
+    clear_route_plan_cache()
+    clear_compiled_yaml_cache()
 
 
 def cell(
@@ -147,13 +147,9 @@ class ComponentReference(DeviceReference):
             magnification=magnification,
             x_reflection=x_reflection,
         )
+        # DeviceReference copies the ports of the component into _local_ports,
+        # each with its own unique id (uid)
         self.parent = component
-        # The ports of a DeviceReference have their own unique id (uid),
-        # since two DeviceReferences of the same parent Device can be
-        # in different locations and thus do not represent the same port
-        self._local_ports = {
-            name: port._copy(new_uid=True) for name, port in component.ports.items()
-        }
         self.visual_label = visual_label
         self.uid = str(uuid.uuid4())[:8]
 
@@ -1,8 +1,10 @@
 """Get Component from YAML file."""
 
+import functools
 import io
 import pathlib
-from typing import IO, Any, Dict, List, Optional, Union
+from dataclasses import dataclass
+from typing import IO, Any, Dict, Iterable, List, Optional, Tuple, Union
 
 import numpy as np
 from omegaconf import OmegaConf
@@ -10,6 +12,7 @@ from omegaconf import OmegaConf
 from pp.add_pins import _add_instance_label
 from pp.component import Component, ComponentReference
 from pp.components import component_factory as component_factory_default
+from pp.port import Port
 from pp.routing import link_factory, route_factory
 
 valid_placements = ["x", "y", "dx", "dy", "rotation", "mirror", "port"]
@@ -25,36 +28,128 @@ valid_keys = [
 valid_route_keys = ["links", "factory", "settings", "link_factory", "link_settings"]
 
 
-def place(
+class _PortsCache(dict):
+    """Ports of each instance, transformed once per instance position.
+
+    `ComponentReference.ports` transforms all the ports on every access, so the
+    ports are cached until the instance moves (pop the instance name then).
+    """
+
+    def __init__(self, instances: Dict[str, ComponentReference]):
+        super().__init__()
+        self.instances = instances
+
+    def __missing__(self, instance_name: str):
+        ports = self[instance_name] = self.instances[instance_name].ports
+        return ports
+
+
+def _get_placement_dependencies(
+    placement_settings: Dict[str, Union[int, float, str]]
+) -> List[str]:
+    """Returns instance names that x and y refer to (`x: instanceName,portName`)."""
+    dependencies = []
+    for k in ["x", "y"]:
+        v = placement_settings.get(k)
+        if v and isinstance(v, str):
+            if not len(v.split(",")) == 2:
+                raise ValueError(
+                    f"You can define {k} as `{k}: instaceName,portName` got `{k}: {v}`"
+                )
+            dependencies.append(v.split(",")[0])
+    return dependencies
+
+
+def get_placement_order(
     placements_conf: Dict[str, Dict[str, Union[int, float, str]]],
-    instances: Dict[str, ComponentReference],
-    encountered_insts: List[str],
-    instance_name: Optional[str] = None,
-) -> None:
-    """Place instance_name with placements_conf config.
+    instance_names: Optional[List[str]] = None,
+) -> List[str]:
+    """Returns instance names sorted so that each placement comes after
+    the placements it refers to.
+
+    Raises ValueError on circular references.
 
     Args:
         placements_conf: Dict of instance_name to placement (x, y, rotation ...)
-        instances: Dict of references
-        encountered_insts: list of encountered_instances
-        instance_name: instance_name to place
+        instance_names: to place (and their dependencies), defaults to all
     """
-    if instance_name is None:
-        instance_name = list(placements_conf.keys())[0]
-    if instance_name in encountered_insts:
-        encountered_insts.append(instance_name)
-        loop_str = " -> ".join(encountered_insts)
+    dependencies = {
+        instance_name: [
+            d
+            for d in _get_placement_dependencies(placements_conf[instance_name] or {})
+            if d in placements_conf
+        ]
+        for instance_name in placements_conf
+    }
+    order = []
+    done = set()
+    if instance_names is None:
+        instance_names = list(placements_conf.keys())
+
+    for root in instance_names:
+        if root in done:
+            continue
+        # iterative depth first search, path holds the instances being visited
+        path = [root]
+        on_path = {root}
+        stack = [iter(dependencies[root])]
+        while stack:
+            instance_name = next(stack[-1], None)
+            if instance_name is None:
+                stack.pop()
+                name = path.pop()
+                on_path.remove(name)
+                done.add(name)
+                order.append(name)
+            elif instance_name in on_path:
+                loop_str = " -> ".join(path + [instance_name])
+                raise ValueError(
+                    f"circular reference in placement definition for {instance_name}! Loop: {loop_str}"
+                )
+            elif instance_name not in done:
+                path.append(instance_name)
+                on_path.add(instance_name)
+                stack.append(iter(dependencies[instance_name]))
+    return order
+
+
+def _get_port_coordinate(
+    value: str, k: str, instances: Dict[str, ComponentReference], ports: _PortsCache
+) -> float:
+    instance_name_ref, port_name = value.split(",")
+    if instance_name_ref not in instances:
         raise ValueError(
-            f"circular reference in placement definition for {instance_name}! Loop: {loop_str}"
+            f"instaceName = `{instance_name_ref}` not in {list(instances.keys())}, "
+            f"you can define {k} as `{k}: instaceName,portName`, got `{k}: {value}`"
         )
-    encountered_insts.append(instance_name)
-    ref = instances[instance_name]
-    placement_settings = placements_conf[instance_name] or {}
-    for k, v in placement_settings.items():
+    if port_name not in ports[instance_name_ref]:
+        raise ValueError(
+            f"portName = `{port_name}` not in {list(ports[instance_name_ref].keys())} "
+            f"for {instance_name_ref}, "
+            f"you can define {k} as `{k}: instaceName,portName`, got `{k}: {value}`"
+        )
+    return getattr(ports[instance_name_ref][port_name], k)
+
+
+def _validate_placement(
+    instance_name: str, placement_settings: Dict[str, Union[int, float, str]]
+) -> None:
+    for k in placement_settings.keys():
         if k not in valid_placements:
             raise ValueError(
                 f"`{k}` not valid placement {valid_placements} for" f" {instance_name}"
             )
+
+
+def _place_instance(
+    instance_name: str,
+    placement_settings: Dict[str, Union[int, float, str]],
+    instances: Dict[str, ComponentReference],
+    ports: _PortsCache,
+) -> None:
+    """Place one instance, once the instances it refers to are placed."""
+    ref = instances[instance_name]
+    placement_settings = placement_settings or {}
     x = placement_settings.get("x")
     y = placement_settings.get("y")
     dx = placement_settings.get("dx")
@@ -63,55 +158,18 @@ def place(
     rotation = placement_settings.get("rotation")
     mirror = placement_settings.get("mirror")
 
+    ports.pop(instance_name, None)
     if port:
         a = ref.ports[port]
         ref.x -= a.x
         ref.y -= a.y
     if x:
         if isinstance(x, str):
-            if not len(x.split(",")) == 2:
-                raise ValueError(
-                    f"You can define x as `x: instaceName,portName` got `x: {x}`"
-                )
-            instance_name_ref, port_name = x.split(",")
-            if instance_name_ref in placements_conf:
-                place(placements_conf, instances, encountered_insts, instance_name_ref)
-            if instance_name_ref not in instances:
-                raise ValueError(
-                    f"instaceName = `{instance_name_ref}` not in {list(instances.keys())}, "
-                    f"you can define x as `x: instaceName,portName`, got `x: {x}`"
-                )
-            if port_name not in instances[instance_name_ref].ports:
-                raise ValueError(
-                    f"portName = `{port_name}` not in {list(instances[instance_name_ref].ports.keys())} "
-                    f"for {instance_name_ref}, "
-                    f"you can define x as `x: instaceName,portName`, got `x: {x}`"
-                )
-
-            x = instances[instance_name_ref].ports[port_name].x
+            x = _get_port_coordinate(x, "x", instances, ports)
         ref.x += x
     if y:
         if isinstance(y, str):
-            if not len(y.split(",")) == 2:
-                raise ValueError(
-                    f"You can define y as `y: instaceName,portName` got `y: {y}`"
-                )
-            instance_name_ref, port_name = y.split(",")
-            if instance_name_ref in placements_conf:
-                place(placements_conf, instances, encountered_insts, instance_name_ref)
-            if instance_name_ref not in instances:
-                raise ValueError(
-                    f"instaceName = `{instance_name_ref}` not in {list(instances.keys())}, "
-                    f"you can define y as `y: instaceName,portName`, got `y: {y}`"
-                )
-            if port_name not in instances[instance_name_ref].ports:
-                raise ValueError(
-                    f"portName = `{port_name}` not in {list(instances[instance_name_ref].ports.keys())} "
-                    f"for {instance_name_ref}, "
-                    f"you can define y as `y: instaceName,portName`, got `y: {y}`"
-                )
-
-            y = instances[instance_name_ref].ports[port_name].y
+            y = _get_port_coordinate(y, "y", instances, ports)
         ref.y += y
     if dx:
         ref.x += dx
@@ -144,8 +202,357 @@ def place(
             x, y = ref.origin
             ref.rotate(rotation, center=(x, y))
             # ref.rotate(rotation, center=(ref.x, ref.y))
+    ports.pop(instance_name, None)
+
+
+def place(
+    placements_conf: Dict[str, Dict[str, Union[int, float, str]]],
+    instances: Dict[str, ComponentReference],
+    encountered_insts: Optional[List[str]] = None,
+    instance_name: Optional[str] = None,
+) -> None:
+    """Place instance_name with placements_conf config.
+
+    Places first the instances it refers to, and removes all the placed
+    instances from placements_conf.
+
+    Args:
+        placements_conf: Dict of instance_name to placement (x, y, rotation ...)
+        instances: Dict of references
+        encountered_insts: unused, kept for backwards compatibility
+        instance_name: instance_name to place
+    """
+    if instance_name is None:
+        instance_name = next(iter(placements_conf))
+    ports = _PortsCache(instances)
+    for name in get_placement_order(placements_conf, [instance_name]):
+        placement_settings = placements_conf.pop(name) or {}
+        _validate_placement(name, placement_settings)
+        _place_instance(name, placement_settings, instances, ports)
+
+
+@dataclass
+class Route:
+    """Compiled route bundle, with the links already expanded."""
+
+    factory: str
+    settings: Dict[str, Any]
+    link_factory: str
+    link_settings: Dict[str, Any]
+    # (route_name, instance_src, port_src, instance_dst, port_dst)
+    links: List[Tuple[str, str, str, str, str]]
+
+
+@dataclass
+class CompiledYaml:
+    """YAML netlist parsed and validated once, see `compile_yaml`."""
+
+    conf: Dict[str, Any]
+    name: str
+    # instance_name: (component_type, settings)
+    instances: Dict[str, Tuple[str, Dict[str, Any]]]
+    placements: Dict[str, Dict[str, Union[int, float, str]]]
+    placement_order: List[str]
+    # (instance_src, port_src, instance_dst, port_dst)
+    connections: List[Tuple[str, str, str, str]]
+    routes: Dict[str, Route]
+    # port_name: (instance_name, instance_port_name)
+    ports: Dict[str, Tuple[str, str]]
+
+
+def read_yaml_text(yaml_str: Union[str, pathlib.Path, IO[Any]]) -> str:
+    if isinstance(yaml_str, str) and "\n" in yaml_str:
+        return yaml_str
+    if hasattr(yaml_str, "read"):
+        return yaml_str.read()
+    return pathlib.Path(yaml_str).read_text()
+
+
+def _split_instance_port(
+    instance_comma_port: str, instance_names: Iterable[str]
+) -> Tuple[str, str]:
+    instance_name, port_name = [s.strip() for s in instance_comma_port.split(",")]
+    assert (
+        instance_name in instance_names
+    ), f"{instance_name} not in {list(instance_names)}"
+    return instance_name, port_name
+
+
+def _get_port_range(port_name: str, start: int, stop: int) -> List[str]:
+    step = 1 if stop > start else -1
+    return [f"{port_name}{i}" for i in range(start, stop + step, step)]
+
+
+def _compile_route(route_alias: str, routes_dict: Dict[str, Any], instance_names):
+    if not isinstance(routes_dict, dict):
+        print(f"Unvalid syntax for {routes_dict}\n", sample_mmis)
+        raise ValueError(f"Unvalid syntax for {routes_dict}")
+    for key in routes_dict.keys():
+        if key not in valid_route_keys:
+            raise ValueError(
+                f"`{route_alias}` has a key=`{key}` not in valid {valid_route_keys}"
+            )
+
+    if "factory" not in routes_dict:
+        raise ValueError(
+            f"`{route_alias}` route needs `factory` : {list(route_factory.keys())}"
+        )
+    if "links" not in routes_dict:
+        raise ValueError(f"You need to define links for the `{route_alias}` route")
+
+    links = []
+    for port_src_string, port_dst_string in routes_dict["links"].items():
+        if ":" in port_src_string:
+            src, src0, src1 = [s.strip() for s in port_src_string.split(":")]
+            dst, dst0, dst1 = [s.strip() for s in port_dst_string.split(":")]
+            instance_src_name, port_src_name = _split_instance_port(src, instance_names)
+            instance_dst_name, port_dst_name = _split_instance_port(dst, instance_names)
+            ports1names = _get_port_range(port_src_name, int(src0), int(src1))
+            ports2names = _get_port_range(port_dst_name, int(dst0), int(dst1))
+            assert len(ports1names) == len(ports2names)
+            links += [
+                (
+                    f"{instance_src_name},{i}:{instance_dst_name},{j}",
+                    instance_src_name,
+                    i,
+                    instance_dst_name,
+                    j,
+                )
+                for i, j in zip(ports1names, ports2names)
+            ]
+        else:
+            links.append(
+                (
+                    f"{port_src_string}:{port_dst_string}",
+                    *_split_instance_port(port_src_string, instance_names),
+                    *_split_instance_port(port_dst_string, instance_names),
+                )
+            )
+
+    return Route(
+        factory=routes_dict["factory"],
+        settings=routes_dict.get("settings") or {},
+        link_factory=routes_dict.get("link_factory", "link_ports"),
+        link_settings=routes_dict.get("link_settings") or {},
+        links=links,
+    )
+
+
+def merge_dicts(conf: Dict[str, Any], overrides: Dict[str, Any]) -> Dict[str, Any]:
+    """Returns conf updated recursively with overrides, without changing conf."""
+    conf = dict(conf)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(conf.get(key), dict):
+            conf[key] = merge_dicts(conf[key], value)
+        else:
+            conf[key] = value
+    return conf
+
+
+def compile_yaml(
+    yaml_str: Union[str, pathlib.Path, IO[Any]],
+    overrides: Optional[Dict[str, Any]] = None,
+) -> CompiledYaml:
+    """Returns a YAML netlist parsed and validated.
+
+    The result is cached by the YAML text (for the last 256 texts, cleared by
+    `pp.clear_cache`), so building many variants of the same YAML with
+    `component_from_compiled` only parses it once.
+
+    Args:
+        yaml_str: YAML IO, file or string (with newlines)
+        overrides: nested dict merged into the YAML
+            `{"instances": {"mmi": {"settings": {"width_mmi": 5}}}}`
+    """
+    compiled = _compile_text(read_yaml_text(yaml_str))
+    if overrides:
+        return _compile_conf(merge_dicts(compiled.conf, overrides))
+    return compiled
+
+
+@functools.lru_cache(maxsize=256)
+def _compile_text(text: str) -> CompiledYaml:
+    # nicer loader than conf = yaml.safe_load(yaml_str)
+    conf = OmegaConf.load(io.StringIO(text))
+    conf = OmegaConf.to_container(conf, resolve=True)
+    return _compile_conf(conf)
+
+
+def clear_compiled_yaml_cache() -> None:
+    """Clears the cache of compiled YAML netlists."""
+    _compile_text.cache_clear()
+
+
+def _compile_conf(conf: Dict[str, Any]) -> CompiledYaml:
+    for key in conf.keys():
+        assert key in valid_keys, f"{key} not in {list(valid_keys)}"
+
+    instances = {
+        instance_name: (
+            instance_conf["component"],
+            instance_conf.get("settings") or {},
+        )
+        for instance_name, instance_conf in conf["instances"].items()
+    }
+
+    placements = conf.get("placements") or {}
+    for instance_name, placement_settings in placements.items():
+        _validate_placement(instance_name, placement_settings or {})
+
+    connections = [
+        (
+            *_split_instance_port(port_src_string, instances),
+            *_split_instance_port(port_dst_string, instances),
+        )
+        for port_src_string, port_dst_string in (conf.get("connections") or {}).items()
+    ]
+
+    routes = {
+        route_alias: _compile_route(route_alias, routes_dict, instances)
+        for route_alias, routes_dict in (conf.get("routes") or {}).items()
+    }
+
+    ports_conf = conf.get("ports") or {}
+    assert hasattr(ports_conf, "items"), f"{ports_conf} needs to be a dict"
+    ports = {
+        port_name: _split_instance_port(instance_comma_port, instances)
+        for port_name, instance_comma_port in ports_conf.items()
+    }
+
+    return CompiledYaml(
+        conf=conf,
+        name=conf.get("name", "Unnamed"),
+        instances=instances,
+        placements=placements,
+        placement_order=get_placement_order(placements),
+        connections=connections,
+        routes=routes,
+        ports=ports,
+    )
+
+
+def _get_instance_port(
+    ports: _PortsCache, instance_name: str, port_name: str, end: str = ""
+) -> Port:
+    instance_ports = ports[instance_name]
+    assert port_name in instance_ports, (
+        f"{port_name} not in {list(instance_ports.keys())} for" f" {instance_name}{end}"
+    )
+    return instance_ports[port_name]
+
+
+def component_from_compiled(
+    compiled: CompiledYaml,
+    component_factory=None,
+    route_factory=route_factory,
+    link_factory=link_factory,
+    label_instance_function=_add_instance_label,
+    **kwargs,
+) -> Component:
+    """Returns a Component from a YAML netlist compiled with `compile_yaml`.
+
+    Args:
+        compiled: from compile_yaml
+        component_factory: dict of {factory_name: factory_function}
+        route_factory: for routes
+        link_factory: for links
+        label_instance_function: to label each instance
+        kwargs: cache, pins ... to pass to all factories
+    """
+    component_factory = component_factory or component_factory_default
+
+    instances = {}
+    routes = {}
+    c = Component(compiled.name)
+
+    for instance_name, (component_type, settings) in compiled.instances.items():
+        assert (
+            component_type in component_factory
+        ), f"{component_type} not in {list(component_factory.keys())}"
+        component_settings = dict(settings, **kwargs)
+        ci = component_factory[component_type](**component_settings)
+        ref = c << ci
+        instances[instance_name] = ref
+
+    ports = _PortsCache(instances)
+    for instance_name in compiled.placement_order:
+        _place_instance(
+            instance_name, compiled.placements[instance_name], instances, ports
+        )
+
+    for (
+        instance_src_name,
+        port_src_name,
+        instance_dst_name,
+        port_dst_name,
+    ) in compiled.connections:
+        _get_instance_port(ports, instance_src_name, port_src_name, " ")
+        port_dst = _get_instance_port(ports, instance_dst_name, port_dst_name)
+        ports.pop(instance_src_name)
+        instances[instance_src_name].connect(port=port_src_name, destination=port_dst)
+
+    for instance_name in compiled.instances:
+        label_instance_function(
+            component=c, instance_name=instance_name, reference=instances[instance_name]
+        )
+
+    for route_alias, route_conf in compiled.routes.items():
+        assert isinstance(route_factory, dict), "route_factory needs to be a dict"
+        assert (
+            route_conf.factory in route_factory
+        ), f"factory `{route_conf.factory}` not in route_factory {list(route_factory.keys())}"
+        route_filter = route_factory[route_conf.factory]
+
+        link_function_name = route_conf.link_factory
+        assert (
+            link_function_name in link_factory
+        ), f"function `{link_function_name}` not in link_factory {list(link_factory.keys())}"
+        link_function = link_factory[link_function_name]
+
+        route_names = []
+        ports1 = []
+        ports2 = []
+        for (
+            route_name,
+            instance_src_name,
+            port_src,
+            instance_dst_name,
+            port_dst,
+        ) in route_conf.links:
+            ports1.append(_get_instance_port(ports, instance_src_name, port_src, " "))
+            ports2.append(_get_instance_port(ports, instance_dst_name, port_dst))
+            route_names.append(route_name)
+
+        if link_function_name in [
+            "link_electrical_waypoints",
+            "link_optical_waypoints",
+        ]:
+            route = link_function(
+                route_filter=route_filter,
+                **route_conf.settings,
+                **route_conf.link_settings,
+            )
+            routes[route_names[-1]] = route
 
-    placements_conf.pop(instance_name)
+        else:
+            route = link_function(
+                ports1,
+                ports2,
+                route_filter=route_filter,
+                **route_conf.settings,
+                **route_conf.link_settings,
+            )
+            for i, r in enumerate(route):
+                routes[route_names[i]] = r
+
+        c.add(route)
+
+    for port_name, (instance_name, instance_port_name) in compiled.ports.items():
+        port = _get_instance_port(ports, instance_name, instance_port_name, " ")
+        c.add_port(port_name, port=port)
+    c.instances = instances
+    c.routes = routes
+    return c
 
 
 def component_from_yaml(
@@ -225,259 +632,14 @@ def component_from_yaml(
                     mmi_top,E0: mmi_bot,W0
 
     """
-    yaml_str = (
-        io.StringIO(yaml_str)
-        if isinstance(yaml_str, str) and "\n" in yaml_str
-        else yaml_str
+    return component_from_compiled(
+        compile_yaml(yaml_str),
+        component_factory=component_factory,
+        route_factory=route_factory,
+        link_factory=link_factory,
+        label_instance_function=label_instance_function,
+        **kwargs,
     )
-    component_factory = component_factory or component_factory_default
-
-    conf = OmegaConf.load(yaml_str)  # nicer loader than conf = yaml.safe_load(yaml_str)
-    for key in conf.keys():
-        assert key in valid_keys, f"{key} not in {list(valid_keys)}"
-
-    instances = {}
-    routes = {}
-    name = conf.get("name", "Unnamed")
-    c = Component(name)
-    placements_conf = conf.get("placements")
-    routes_conf = conf.get("routes")
-    ports_conf = conf.get("ports")
-    connections_conf = conf.get("connections")
-    instances_dict = conf["instances"]
-
-    for instance_name in instances_dict:
-        instance_conf = instances_dict[instance_name]
-        component_type = instance_conf["component"]
-        assert (
-            component_type in component_factory
-        ), f"{component_type} not in {list(component_factory.keys())}"
-        component_settings = instance_conf["settings"] or {}
-        component_settings.update(**kwargs)
-        ci = component_factory[component_type](**component_settings)
-        ref = c << ci
-        instances[instance_name] = ref
-
-    while placements_conf:
-        place(
-            placements_conf=placements_conf,
-            instances=instances,
-            encountered_insts=list(),
-        )
-
-    if connections_conf:
-        for port_src_string, port_dst_string in connections_conf.items():
-            instance_src_name, port_src_name = port_src_string.split(",")
-            instance_dst_name, port_dst_name = port_dst_string.split(",")
-
-            instance_src_name = instance_src_name.strip()
-            instance_dst_name = instance_dst_name.strip()
-            port_src_name = port_src_name.strip()
-            port_dst_name = port_dst_name.strip()
-
-            assert (
-                instance_src_name in instances
-            ), f"{instance_src_name} not in {list(instances.keys())}"
-            assert (
-                instance_dst_name in instances
-            ), f"{instance_dst_name} not in {list(instances.keys())}"
-            instance_src = instances[instance_src_name]
-            instance_dst = instances[instance_dst_name]
-
-            assert port_src_name in instance_src.ports, (
-                f"{port_src_name} not in {list(instance_src.ports.keys())} for"
-                f" {instance_src_name} "
-            )
-            assert port_dst_name in instance_dst.ports, (
-                f"{port_dst_name} not in {list(instance_dst.ports.keys())} for"
-                f" {instance_dst_name}"
-            )
-            port_dst = instance_dst.ports[port_dst_name]
-            instance_src.connect(port=port_src_name, destination=port_dst)
-
-    for instance_name in instances_dict:
-        label_instance_function(
-            component=c, instance_name=instance_name, reference=instances[instance_name]
-        )
-
-    if routes_conf:
-        for route_alias in routes_conf:
-            route_names = []
-            ports1 = []
-            ports2 = []
-            routes_dict = routes_conf[route_alias]
-            if not hasattr(routes_dict, "__items__"):
-                print(f"Unvalid syntax for {routes_dict}\n", sample_mmis)
-                raise ValueError(f"Unvalid syntax for {routes_dict}")
-            for key in routes_dict.keys():
-                if key not in valid_route_keys:
-                    raise ValueError(
-                        f"`{route_alias}` has a key=`{key}` not in valid {valid_route_keys}"
-                    )
-
-            if "factory" not in routes_dict:
-                raise ValueError(
-                    f"`{route_alias}` route needs `factory` : {list(route_factory.keys())}"
-                )
-            route_type = routes_dict.pop("factory")
-            assert isinstance(route_factory, dict), "route_factory needs to be a dict"
-            assert (
-                route_type in route_factory
-            ), f"factory `{route_type}` not in route_factory {list(route_factory.keys())}"
-            route_filter = route_factory[route_type]
-            route_settings = routes_dict.pop("settings", {})
-
-            link_function_name = routes_dict.pop("link_factory", "link_ports")
-            assert (
-                link_function_name in link_factory
-            ), f"function `{link_function_name}` not in link_factory {list(link_factory.keys())}"
-            link_function = link_factory[link_function_name]
-            link_settings = routes_dict.pop("link_settings", {})
-
-            if "links" not in routes_dict:
-                raise ValueError(
-                    f"You need to define links for the `{route_alias}` route"
-                )
-            links_dict = routes_dict["links"]
-
-            for port_src_string, port_dst_string in links_dict.items():
-                # print(port_src_string)
-
-                if ":" in port_src_string:
-                    src, src0, src1 = [s.strip() for s in port_src_string.split(":")]
-                    dst, dst0, dst1 = [s.strip() for s in port_dst_string.split(":")]
-                    instance_src_name, port_src_name = [
-                        s.strip() for s in src.split(",")
-                    ]
-                    instance_dst_name, port_dst_name = [
-                        s.strip() for s in dst.split(",")
-                    ]
-
-                    src0 = int(src0)
-                    src1 = int(src1)
-                    dst0 = int(dst0)
-                    dst1 = int(dst1)
-
-                    if src1 > src0:
-                        ports1names = [
-                            f"{port_src_name}{i}" for i in range(src0, src1 + 1, 1)
-                        ]
-                    else:
-                        ports1names = [
-                            f"{port_src_name}{i}" for i in range(src0, src1 - 1, -1)
-                        ]
-
-                    if dst1 > dst0:
-                        ports2names = [
-                            f"{port_dst_name}{i}" for i in range(dst0, dst1 + 1, 1)
-                        ]
-                    else:
-                        ports2names = [
-                            f"{port_dst_name}{i}" for i in range(dst0, dst1 - 1, -1)
-                        ]
-
-                    # print(ports1names)
-                    # print(ports2names)
-
-                    assert len(ports1names) == len(ports2names)
-                    route_names += [
-                        f"{instance_src_name},{i}:{instance_dst_name},{j}"
-                        for i, j in zip(ports1names, ports2names)
-                    ]
-
-                    instance_src = instances[instance_src_name]
-                    instance_dst = instances[instance_dst_name]
-
-                    for port_src_name in ports1names:
-                        assert port_src_name in instance_src.ports, (
-                            f"{port_src_name} not in {list(instance_src.ports.keys())}"
-                            f"for {instance_src_name} "
-                        )
-                        ports1.append(instance_src.ports[port_src_name])
-
-                    for port_dst_name in ports2names:
-                        assert port_dst_name in instance_dst.ports, (
-                            f"{port_dst_name} not in {list(instance_dst.ports.keys())}"
-                            f"for {instance_dst_name}"
-                        )
-                        ports2.append(instance_dst.ports[port_dst_name])
-
-                    # print(ports1)
-                    # print(ports2)
-                    print(route_names)
-
-                else:
-                    instance_src_name, port_src_name = port_src_string.split(",")
-                    instance_dst_name, port_dst_name = port_dst_string.split(",")
-
-                    instance_src_name = instance_src_name.strip()
-                    instance_dst_name = instance_dst_name.strip()
-                    port_src_name = port_src_name.strip()
-                    port_dst_name = port_dst_name.strip()
-                    assert (
-                        instance_src_name in instances
-                    ), f"{instance_src_name} not in {list(instances.keys())}"
-                    assert (
-                        instance_dst_name in instances
-                    ), f"{instance_dst_name} not in {list(instances.keys())}"
-
-                    instance_src = instances[instance_src_name]
-                    instance_dst = instances[instance_dst_name]
-
-                    assert port_src_name in instance_src.ports, (
-                        f"{port_src_name} not in {list(instance_src.ports.keys())} for"
-                        f" {instance_src_name} "
-                    )
-                    assert port_dst_name in instance_dst.ports, (
-                        f"{port_dst_name} not in {list(instance_dst.ports.keys())} for"
-                        f" {instance_dst_name}"
-                    )
-
-                    ports1.append(instance_src.ports[port_src_name])
-                    ports2.append(instance_dst.ports[port_dst_name])
-                    route_name = f"{port_src_string}:{port_dst_string}"
-                    route_names.append(route_name)
-
-            if link_function_name in [
-                "link_electrical_waypoints",
-                "link_optical_waypoints",
-            ]:
-                route = link_function(
-                    route_filter=route_filter, **route_settings, **link_settings,
-                )
-                routes[route_name] = route
-
-            else:
-                route = link_function(
-                    ports1,
-                    ports2,
-                    route_filter=route_filter,
-                    **route_settings,
-                    **link_settings,
-                )
-                for i, r in enumerate(route):
-                    routes[route_names[i]] = r
-
-            c.add(route)
-
-    if ports_conf:
-        assert hasattr(ports_conf, "items"), f"{ports_conf} needs to be a dict"
-        for port_name, instance_comma_port in ports_conf.items():
-            instance_name, instance_port_name = instance_comma_port.split(",")
-            instance_name = instance_name.strip()
-            instance_port_name = instance_port_name.strip()
-            assert (
-                instance_name in instances
-            ), f"{instance_name} not in {list(instances.keys())}"
-            instance = instances[instance_name]
-            assert instance_port_name in instance.ports, (
-                f"{instance_port_name} not in {list(instance.ports.keys())} for"
-                f" {instance_name} "
-            )
-            c.add_port(port_name, port=instance.ports[instance_port_name])
-    c.instances = instances
-    c.routes = routes
-    return c
 
 
 sample_mmis = """
@@ -580,6 +742,34 @@ def test_sample():
     return c
 
 
+def test_get_placement_order():
+    import pytest
+
+    placements = dict(a=dict(x="b,E0"), b=dict(y="c,E0"), c=dict(x=1))
+    assert get_placement_order(placements) == ["c", "b", "a"]
+
+    placements["c"] = dict(x="a,E0")
+    with pytest.raises(ValueError, match="Loop: a -> b -> c -> a"):
+        get_placement_order(placements)
+
+
+def test_compile_yaml():
+    compiled = compile_yaml(sample_mmis)
+    assert compile_yaml(sample_mmis) is compiled
+    assert compiled.placement_order == ["mmi_long"]
+    assert compiled.routes["route_name1"].links == [
+        ("mmi_short,E1:mmi_long,E0", "mmi_short", "E1", "mmi_long", "E0")
+    ]
+    c = component_from_compiled(compiled)
+    assert len(c.get_dependencies()) == 3
+    assert len(c.ports) == 2
+
+    from pp.cell import clear_cache
+
+    clear_cache()
+    assert compile_yaml(sample_mmis) is not compiled
+
+
 def test_connections():
     c = component_from_yaml(sample_connections)
     # print(len(c.get_dependencies()))
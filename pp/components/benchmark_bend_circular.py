@@ -0,0 +1,59 @@
+""" Generates many circular bends, each with a new radius and width
+
+The arc points come from a cached unit arc (`get_unit_arc`), scaled for each
+bend, so most of the time per bend goes into the Component and its ports.
+
+.. code::
+
+    python pp/components/benchmark_bend_circular.py
+
+"""
+
+import time
+
+import numpy as np
+
+import pp
+from pp.components.bend_circular import _arc_polygon, bend_circular, get_unit_arc
+
+
+def _arc_polygon_lists(radius, width, theta=-90, start_angle=0, angle_resolution=2.5):
+    """Arc polygon built with Python lists, as bend_circular used to."""
+    angle1 = start_angle * np.pi / 180
+    angle2 = (start_angle + theta) * np.pi / 180
+    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
+    inner_points_x = ((radius - width / 2) * np.cos(t)).tolist()
+    inner_points_y = ((radius - width / 2) * np.sin(t)).tolist()
+    outer_points_x = ((radius + width / 2) * np.cos(t)).tolist()
+    outer_points_y = ((radius + width / 2) * np.sin(t)).tolist()
+    return inner_points_x + outer_points_x[::-1], inner_points_y + outer_points_y[::-1]
+
+
+def benchmark(n=2000, angle_resolution=2.5):
+    radii = 5 + np.arange(n) * 0.01
+    width = 0.5
+
+    t0 = time.time()
+    for radius in radii:
+        _arc_polygon_lists(radius, width, angle_resolution=angle_resolution)
+    t1 = time.time()
+    for radius in radii:
+        unit_arc = get_unit_arc(0, -90, angle_resolution)
+        _arc_polygon(radius - width / 2, radius + width / 2, unit_arc)
+    t2 = time.time()
+    for radius in radii:
+        bend_circular(radius=radius, width=width, angle_resolution=angle_resolution)
+    t3 = time.time()
+    pp.clear_cache()
+
+    print(
+        f"{n} bends, angle_resolution {angle_resolution}: "
+        f"points with lists {(t1 - t0) / n * 1e6:.1f}us, "
+        f"cached unit arc {(t2 - t1) / n * 1e6:.1f}us, "
+        f"bend_circular cell {(t3 - t2) / n * 1e6:.0f}us per bend"
+    )
+
+
+if __name__ == "__main__":
+    for angle_resolution in [2.5, 0.5, 0.1]:
+        benchmark(angle_resolution=angle_resolution)
@@ -0,0 +1,70 @@
+""" Computes the points of many Euler bends, each with a new radius
+
+`euler_bend_points` evaluates the Fresnel integrals on all the points of a
+bend at once. The per-point loop below is how it used to be computed.
+
+.. code::
+
+    python pp/components/benchmark_bend_euler.py
+
+"""
+
+import time
+
+import numpy as np
+from scipy.special import fresnel
+
+from pp.components.euler.geo_euler import euler_bend_points
+
+
+def _euler_bend_points_loop(angle_amount=90.0, radius=10.0, resolution=150.0):
+    """Euler bend points with one Fresnel call per point."""
+    th = angle_amount * np.pi / 180 / 2
+    Ltot = 4 * radius * th
+    a = np.sqrt(radius ** 2 * th)
+    sq2pi = np.sqrt(2 * np.pi)
+    fasin, facos = fresnel(np.sqrt(2 / np.pi) * radius * th / a)
+    c, s = np.cos(2 * th), np.sin(2 * th)
+    step = Ltot / int(th * resolution)
+
+    points = []
+    for i in range(int(round(Ltot / step)) + 1):
+        if i * step <= Ltot / 2:
+            fsin, fcos = fresnel(i * step / (sq2pi * a))
+            x, y = fcos, fsin
+        else:
+            fsin, fcos = fresnel((Ltot - i * step) / (sq2pi * a))
+            x = facos + c * (facos - fcos) + s * (fasin - fsin)
+            y = fasin - c * (fasin - fsin) + s * (facos - fcos)
+        points.append((sq2pi * a * x, sq2pi * a * y))
+    return points
+
+
+def benchmark(n=200, angle_amount=90.0, resolution=150.0):
+    radii = 5 + np.arange(n) * 0.1
+
+    t0 = time.time()
+    for radius in radii:
+        _euler_bend_points_loop(angle_amount, radius, resolution)
+    t1 = time.time()
+    for radius in radii:
+        euler_bend_points(angle_amount, radius, resolution, use_cache=False)
+    t2 = time.time()
+    for radius in radii:
+        euler_bend_points(angle_amount, radius, resolution)
+    t3 = time.time()
+    for radius in radii:
+        euler_bend_points(angle_amount, radius, resolution)
+    t4 = time.time()
+
+    print(
+        f"{n} bends of {angle_amount} deg, resolution {resolution}: "
+        f"loop {(t1 - t0) / n * 1e3:.2f}ms, vectorized {(t2 - t1) / n * 1e3:.3f}ms "
+        f"({(t1 - t0) / (t2 - t1):.0f}x), first cached call {(t3 - t2) / n * 1e3:.3f}ms, "
+        f"cache hit {(t4 - t3) / n * 1e6:.2f}us per bend"
+    )
+
+
+if __name__ == "__main__":
+    for angle_amount, resolution in [(90, 150.0), (180, 150.0), (90, 1000.0)]:
+        benchmark(angle_amount=angle_amount, resolution=resolution)
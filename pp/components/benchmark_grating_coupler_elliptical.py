@@ -0,0 +1,55 @@
+""" Sweeps elliptical grating couplers over wavelength and fill factor
+
+All the teeth of a grating are extruded at once (`grating_tooth_points` with
+arrays) from one cached unit arc per taper angle and angle step.
+
+.. code::
+
+    python pp/components/benchmark_grating_coupler_elliptical.py
+
+"""
+
+import time
+
+import numpy as np
+
+import pp
+from pp.components.grating_coupler.elliptical import (
+    grating_coupler_elliptical_te,
+    grating_tooth_points,
+)
+
+
+def benchmark(n_wavelengths=10, n_widths=10, n_periods=24, p_start=26):
+    wavelengths = np.linspace(1.5, 1.6, n_wavelengths)
+    widths = np.linspace(0.3, 0.4, n_widths)
+    n = n_wavelengths * n_widths
+    p = np.arange(p_start, p_start + n_periods + 1)
+    a1, b1, x1 = 0.621, 0.581, 0.086
+
+    t0 = time.time()
+    for w in widths:
+        for pi in p:
+            grating_tooth_points(pi * a1, pi * b1, pi * x1, w, 40.0)
+    t1 = time.time()
+    for w in widths:
+        grating_tooth_points(p * a1, p * b1, p * x1, w, 40.0)
+    t2 = time.time()
+    for lambda_c in wavelengths:
+        for w in widths:
+            grating_coupler_elliptical_te(
+                lambda_c=lambda_c, grating_line_width=w, n_periods=n_periods
+            )
+    t3 = time.time()
+    pp.clear_cache()
+
+    print(
+        f"{len(p)} teeth: one at a time {(t1 - t0) / n_widths * 1e3:.2f}ms, "
+        f"at once {(t2 - t1) / n_widths * 1e3:.2f}ms per grating; "
+        f"{n} grating couplers in {t3 - t2:.2f}s"
+    )
+
+
+if __name__ == "__main__":
+    benchmark()
+    benchmark(n_wavelengths=20, n_widths=20, n_periods=40)
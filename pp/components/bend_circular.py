@@ -1,7 +1,8 @@
+import functools
 from typing import List, Optional, Tuple, Union
 
 import numpy as np
-from numpy import cos, pi, sin
+from numpy import cos, ndarray, pi, sin
 
 import pp
 from pp.component import Component
@@ -10,36 +11,49 @@ from pp.layers import LAYER
 from pp.port import deco_rename_ports
 
 
+@functools.lru_cache(maxsize=1024)
+def get_unit_arc(
+    start_angle: float = 0, theta: float = -90, angle_resolution: float = 2.5
+) -> ndarray:
+    """Returns the (N, 2) points of a unit radius arc, cached and read only.
+
+    Any arc with the same angles is a scale (and offset) of this one.
+    """
+    angle1 = start_angle * pi / 180
+    angle2 = (start_angle + theta) * pi / 180
+    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
+    points = np.stack([cos(t), sin(t)], axis=1)
+    points.flags.writeable = False
+    return points
+
+
 def _interpolate_segment(p0, p1, N=2):
-    p0 = np.array(p0)
-    p1 = np.array(p1)
-    dp = p1 - p0
-    d = np.sqrt(dp[0] ** 2 + dp[1] ** 2)
-    return [p0 + dp * a / d for a in np.linspace(0, d, N)]
+    p0 = np.asarray(p0, dtype=float)
+    p1 = np.asarray(p1, dtype=float)
+    return p0 + (p1 - p0) * np.linspace(0, 1, N)[:, None]
 
 
 def _bend_path_from_pts(pts, n_interp=2):
+    pts = np.asarray(pts, dtype=float)
     n = len(pts) // 2
-    pts0 = pts[:n]
-    pts1 = pts[n:][::-1]
+    pts = (pts[:n] + pts[n:][::-1][:n]) * 0.5
 
-    pts = [((x0 + x1) * 0.5, (y0 + y1) * 0.5) for (x0, y0), (x1, y1) in zip(pts0, pts1)]
+    # n_interp points per segment, the first of each one is the previous end
+    a = np.linspace(0, 1, n_interp)[1:, None, None]
+    segments = pts[:-1] + (pts[1:] - pts[:-1]) * a
+    return np.concatenate([pts[:1], segments.transpose(1, 0, 2).reshape(-1, 2)])
 
-    all_pts = [pts[0]]
-    for p0, p1 in zip(pts[:-1], pts[1:]):
-        _pts = _interpolate_segment(p0, p1, N=n_interp)
-        all_pts += _pts[1:]
 
-    return all_pts
+def _bend_path(radius=10.0, start_angle=0, theta=-90, angle_resolution=2.5):
+    points = radius * get_unit_arc(start_angle, theta, angle_resolution)
+    return points[:, 0], points[:, 1]
 
 
-def _bend_path(radius=10.0, start_angle=0, theta=-90, angle_resolution=2.5):
-    angle1 = (start_angle) * pi / 180
-    angle2 = (start_angle + theta) * pi / 180
-    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
-    points_x = (radius * cos(t)).tolist()
-    points_y = (radius * sin(t)).tolist()
-    return points_x, points_y
+def _arc_polygon(
+    inner_radius: float, outer_radius: float, unit_arc: ndarray
+) -> ndarray:
+    """Returns the polygon between two arcs, inner arc forward, outer backward."""
+    return np.concatenate([inner_radius * unit_arc, outer_radius * unit_arc[::-1]])
 
 
 def _bend_points(
@@ -53,29 +67,17 @@ def _bend_points(
 ):
     inner_radius = inner_radius or radius - width / 2
     outer_radius = outer_radius or radius + width / 2
-    angle1 = (start_angle) * pi / 180
-    angle2 = (start_angle + theta) * pi / 180
-    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
-    inner_points_x = (inner_radius * cos(t)).tolist()
-    inner_points_y = (inner_radius * sin(t)).tolist()
-    outer_points_x = (outer_radius * cos(t)).tolist()
-    outer_points_y = (outer_radius * sin(t)).tolist()
-    xpts = inner_points_x + outer_points_x[::-1]
-    ypts = inner_points_y + outer_points_y[::-1]
-    return xpts, ypts
+    unit_arc = get_unit_arc(start_angle, theta, angle_resolution)
+    points = _arc_polygon(inner_radius, outer_radius, unit_arc)
+    return points[:, 0], points[:, 1]
 
 
 def _disk_section_points(
     radius=10.0, theta=-90, start_angle=0, angle_resolution=2.5, layer=LAYER.WG
 ):
-    angle1 = (start_angle) * pi / 180
-    angle2 = (start_angle + theta) * pi / 180
-    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
-    xpts = (radius * cos(t)).tolist()
-    ypts = (radius * sin(t)).tolist()
-    xpts.append(0)
-    ypts.append(0)
-    return xpts, ypts
+    points = radius * get_unit_arc(start_angle, theta, angle_resolution)
+    points = np.concatenate([points, [(0, 0)]])
+    return points[:, 0], points[:, 1]
 
 
 @deco_rename_ports
@@ -118,39 +120,20 @@ def bend_circular(
     """
     component = pp.Component()
 
-    # Core
-    inner_radius = radius - width / 2
-    outer_radius = radius + width / 2
+    unit_arc = get_unit_arc(start_angle, theta, angle_resolution)
     angle1 = (start_angle) * pi / 180
     angle2 = (start_angle + theta) * pi / 180
-    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
-    inner_points_x = (inner_radius * cos(t)).tolist()
-    inner_points_y = (inner_radius * sin(t)).tolist()
-    outer_points_x = (outer_radius * cos(t)).tolist()
-    outer_points_y = (outer_radius * sin(t)).tolist()
-    xpts = inner_points_x + outer_points_x[::-1]
-    ypts = inner_points_y + outer_points_y[::-1]
 
-    component.add_polygon(points=(xpts, ypts), layer=layer)
+    # Core
+    points = _arc_polygon(radius - width / 2, radius + width / 2, unit_arc)
+    component.add_polygon(points=points, layer=layer)
 
     # Cladding
     w = width + 2 * cladding_offset
-    inner_radius = radius - w / 2
-    outer_radius = radius + w / 2
-    angle1 = (start_angle) * pi / 180
-    angle2 = (start_angle + theta) * pi / 180
-    t = np.linspace(angle1, angle2, int(abs(theta) / angle_resolution))
-    inner_points_x = (inner_radius * cos(t)).tolist()
-    inner_points_y = (inner_radius * sin(t)).tolist()
-    outer_points_x = (outer_radius * cos(t)).tolist()
-    outer_points_y = (outer_radius * sin(t)).tolist()
-    xpts = inner_points_x + outer_points_x[::-1]
-    ypts = inner_points_y + outer_points_y[::-1]
-
+    points = _arc_polygon(radius - w / 2, radius + w / 2, unit_arc)
     layers_cladding = layers_cladding or []
     for layer_cladding in layers_cladding:
-        print(layer_cladding)
-        component.add_polygon(points=(xpts, ypts), layer=layer_cladding)
+        component.add_polygon(points=points, layer=layer_cladding)
 
     midpoint1 = (radius * cos(angle1), radius * sin(angle1))
     component.add_port(
@@ -276,7 +259,7 @@ def _bend_circular_windows(
 def bend_circular_trenches(
     width=0.5, trench_width=3.0, trench_offset=0.2, trench_layer=LAYER.SLAB90, **kwargs
 ):
-    """ defines trenches """
+    """defines trenches"""
     w = width / 2
     ww = w + trench_width
     wt = ww + trench_offset
@@ -303,6 +286,18 @@ def bend_circular_slot(width=0.5, gap=0.2, **kwargs):
     return _bend_circular_windows(windows=windows, **kwargs)
 
 
+def test_get_unit_arc():
+    unit_arc = get_unit_arc(0, -90, 2.5)
+    assert get_unit_arc(0, -90, 2.5) is unit_arc
+    assert not unit_arc.flags.writeable
+    assert np.allclose(unit_arc[[0, -1]], [(1, 0), (0, -1)])
+
+    xpts, ypts = _bend_points(radius=10, width=0.5)
+    assert np.allclose(np.hypot(xpts, ypts)[[0, -1]], [9.75, 10.25])
+    c = bend_circular(radius=10, width=0.5, layers_cladding=[LAYER.WGCLAD])
+    assert len(c.get_polygons(by_spec=True)[LAYER.WGCLAD]) == 1
+
+
 def _demo_bend():
     c = bend_circular()
     pp.write_gds(c)
@@ -1,29 +1,18 @@
-from typing import List, Union
+import functools
+from typing import Union
 
 import numpy as np
-from numpy import pi, sqrt
+from numpy import ndarray, pi, sqrt
 from scipy.special import fresnel
 
 from pp.coord2 import Coord2
 
 DEG2RAD = np.pi / 180
 
-# Dict for caching Euler bend point lists
-__euler_bend_cache__ = dict()
-
-
-def euler_bend_points(
-    angle_amount: float = 90.0,
-    radius: float = 10.0,
-    resolution: float = 150.0,
-    use_cache: bool = True,
-) -> List[Coord2]:
-    """ Base euler bend, no transformation, emerging from the origin."""
-    # Check if we've calculated this already
-    key = (angle_amount, radius, resolution)
-    if key in __euler_bend_cache__ and use_cache:
-        return __euler_bend_cache__[key]
 
+def _euler_bend_points(
+    angle_amount: float = 90.0, radius: float = 10.0, resolution: float = 150.0
+) -> ndarray:
     if angle_amount < 0:
         raise ValueError("angle_amount should be positive. Got {}".format(angle_amount))
     # End angle
@@ -31,7 +20,7 @@ def euler_bend_points(
 
     # If bend is trivial, return a trivial shape
     if eth == 0.0:
-        return [Coord2(0, 0)]
+        return np.zeros((1, 2))
 
     # Curve min radius
     R = radius
@@ -46,51 +35,51 @@ def euler_bend_points(
     a = sqrt(R ** 2.0 * np.abs(th))
     sq2pi = sqrt(2.0 * pi)
 
-    # Function for computing curve coords
     (fasin, facos) = fresnel(sqrt(2.0 / pi) * R * th / a)
 
-    def _xy(s):
-        if th == 0:
-            return Coord2(0.0, 0.0)
-        elif s <= Ltot / 2:
-            (fsin, fcos) = fresnel(s / (sq2pi * a))
-            X = sq2pi * a * fcos
-            Y = sq2pi * a * fsin
-        else:
-            (fsin, fcos) = fresnel((Ltot - s) / (sq2pi * a))
-            X = (
-                sq2pi
-                * a
-                * (
-                    facos
-                    + np.cos(2 * th) * (facos - fcos)
-                    + np.sin(2 * th) * (fasin - fsin)
-                )
-            )
-            Y = (
-                sq2pi
-                * a
-                * (
-                    fasin
-                    - np.cos(2 * th) * (fasin - fsin)
-                    + np.sin(2 * th) * (facos - fcos)
-                )
-            )
-        return Coord2(X, Y)
-
     # Parametric step size
     step = Ltot / int(th * resolution)
+    s = np.arange(int(round(Ltot / step)) + 1) * step
+
+    # first half from the start, second half mirrored from the end
+    first_half = s <= Ltot / 2
+    (fsin, fcos) = fresnel(np.where(first_half, s, Ltot - s) / (sq2pi * a))
+    X = np.where(
+        first_half,
+        fcos,
+        facos + np.cos(2 * th) * (facos - fcos) + np.sin(2 * th) * (fasin - fsin),
+    )
+    Y = np.where(
+        first_half,
+        fsin,
+        fasin - np.cos(2 * th) * (fasin - fsin) + np.sin(2 * th) * (facos - fcos),
+    )
+    return sq2pi * a * np.stack([X, Y], axis=1)
+
+
+@functools.lru_cache(maxsize=1024)
+def _euler_bend_points_cached(
+    angle_amount: float, radius: float, resolution: float
+) -> ndarray:
+    points = _euler_bend_points(angle_amount, radius, resolution)
+    points.flags.writeable = False
+    return points
 
-    # Generate points
-    points = []
-    for i in range(0, int(round(Ltot / step)) + 1):
-        points += [_xy(i * step)]
 
-    # Cache calculated points
-    if use_cache:
-        __euler_bend_cache__[(angle_amount, radius, resolution)] = points
+def euler_bend_points(
+    angle_amount: float = 90.0,
+    radius: float = 10.0,
+    resolution: float = 150.0,
+    use_cache: bool = True,
+) -> ndarray:
+    """Base euler bend, no transformation, emerging from the origin.
 
-    return points
+    Returns the (N, 2) points. With use_cache, the array is read only and
+    shared by the calls with the same arguments (last 1024 kept).
+    """
+    if use_cache:
+        return _euler_bend_points_cached(angle_amount, radius, resolution)
+    return _euler_bend_points(angle_amount, radius, resolution)
 
 
 def euler_end_pt(
@@ -120,3 +109,17 @@ def euler_end_pt(
 def euler_length(radius: Union[int, float] = 10.0, angle_amount: int = 90.0) -> float:
     th = abs(angle_amount) * DEG2RAD / 2
     return 4 * radius * th
+
+
+def test_euler_bend_points():
+    points = euler_bend_points(90, radius=10, resolution=150)
+    assert euler_bend_points(90, radius=10, resolution=150) is points
+    assert not points.flags.writeable
+    assert np.allclose(points[0], (0, 0))
+    # symmetric about the perpendicular bisector of the chord
+    assert np.allclose(points[::-1], points[-1, 0] - points[:, ::-1])
+    assert np.allclose(
+        euler_bend_points(90, radius=10, resolution=150, use_cache=False), points
+    )
+    length = np.sum(np.hypot(*np.diff(points, axis=0).T))
+    assert np.isclose(length, euler_length(10), rtol=1e-4)
@@ -1,3 +1,4 @@
+import functools
 from typing import Tuple, Union
 
 import numpy as np
@@ -5,49 +6,70 @@ from numpy import float64, ndarray
 
 import pp
 from pp.component import Component
-from pp.geo_utils import DEG2RAD, extrude_path
+from pp.geo_utils import DEG2RAD, extrude_paths
 from pp.layers import LAYER
 
 
+@functools.lru_cache(maxsize=256)
+def _get_unit_arc(theta_min: float, theta_max: float, angle_step: float) -> ndarray:
+    """Returns the read only (N, 2) cos and sin of the arc angles."""
+    theta = np.arange(theta_min, theta_max + angle_step, angle_step) * DEG2RAD
+    unit_arc = np.column_stack([np.cos(theta), np.sin(theta)])
+    unit_arc.flags.writeable = False
+    return unit_arc
+
+
 def ellipse_arc(
-    a: float64,
-    b: float64,
-    x0: float64,
+    a: Union[float64, ndarray],
+    b: Union[float64, ndarray],
+    x0: Union[float64, ndarray],
     theta_min: float,
     theta_max: float,
     angle_step: float = 0.5,
 ) -> ndarray:
-    theta = np.arange(theta_min, theta_max + angle_step, angle_step) * DEG2RAD
-    xs = a * np.cos(theta) + x0
-    ys = b * np.sin(theta)
-    return np.column_stack([xs, ys])
+    """Returns the (N, 2) points of an ellipse arc, or (T, N, 2) for T
+    ellipses if a, b and x0 are arrays."""
+    unit_arc = _get_unit_arc(theta_min, theta_max, angle_step)
+    a = np.asarray(a)[..., None]
+    b = np.asarray(b)[..., None]
+    x0 = np.asarray(x0)[..., None]
+    xs = a * unit_arc[:, 0] + x0
+    ys = b * unit_arc[:, 1]
+    return np.stack([xs, ys], axis=-1)
 
 
 def grating_tooth_points(
-    ap: float64,
-    bp: float64,
-    xp: float64,
-    width: Union[float64, float],
+    ap: Union[float64, ndarray],
+    bp: Union[float64, ndarray],
+    xp: Union[float64, ndarray],
+    width: Union[float64, float, ndarray],
     taper_angle: float,
     spiked: bool = True,
     angle_step: float = 1.0,
 ) -> ndarray:
+    """Returns the (M, 2) polygon of a tooth, or the (T, M, 2) polygons of T
+    teeth, all at once, if ap, bp and xp are arrays."""
     theta_min = -taper_angle / 2
     theta_max = taper_angle / 2
 
     backbone_points = ellipse_arc(ap, bp, xp, theta_min, theta_max, angle_step)
+    batch = backbone_points.ndim == 3
+    n_teeth = len(backbone_points) if batch else 1
+    n_points = backbone_points.shape[-2]
+    width = np.broadcast_to(np.asarray(width, dtype=float), n_teeth)
     if spiked:
         spike_length = width / 3
     else:
         spike_length = 0.0
-    points = extrude_path(
-        backbone_points,
+    points, _ = extrude_paths(
+        backbone_points.reshape(-1, 2),
+        np.arange(n_teeth + 1) * n_points,
         width,
         with_manhattan_facing_angles=False,
         spike_length=spike_length,
     )
 
-    return points
+    return points.reshape(n_teeth, -1, 2) if batch else points
 
 
 def grating_taper_points(
@@ -209,12 +231,10 @@ def grating_coupler_elliptical(
     c.polarization = polarization
     c.wavelength = int(lambda_c * 1e3)
 
-    # Make each grating line
-    for p in range(p_start, p_start + n_periods + 1):
-        pts = grating_tooth_points(
-            p * a1, p * b1, p * x1, grating_line_width, taper_angle
-        )
-        c.add_polygon(pts, layer)
+    # Make all the grating lines at once
+    p = np.arange(p_start, p_start + n_periods + 1)
+    pts = grating_tooth_points(p * a1, p * b1, p * x1, grating_line_width, taper_angle)
+    c.add_polygon(pts, layer)
 
     # Make the taper
     p_taper = p_start - 1
@@ -279,6 +299,18 @@ def grating_coupler_elliptical(
     return c
 
 
+def test_grating_tooth_points():
+    p = np.arange(26, 31)
+    teeth = grating_tooth_points(p * 1.2, p * 0.9, p * 0.3, 0.343, 40)
+    for i, pi in enumerate(p):
+        tooth = grating_tooth_points(pi * 1.2, pi * 0.9, pi * 0.3, 0.343, 40)
+        assert np.array_equal(teeth[i], tooth)
+    assert _get_unit_arc(-20, 20, 1.0) is _get_unit_arc(-20, 20, 1.0)
+
+    c = grating_coupler_elliptical_te(p_start=26, n_periods=24)
+    assert len(c.get_polygons(by_spec=True)[LAYER.WG]) == 24 + 1 + 2
+
+
 if __name__ == "__main__":
     c = grating_coupler_elliptical_tm()
     c = grating_coupler_elliptical_te(layer_slab=None, with_fiber_marker=False)
@@ -81,16 +81,16 @@ def grating_coupler_elliptical_trenches(
     c.polarization = polarization
     c.wavelength = int(lambda_c * 1e3)
 
-    # Make each grating line
-    for p in range(p_start, p_start + n_periods + 1):
-        pts = grating_tooth_points(
-            p * a1,
-            p * b1,
-            p * x1,
-            width=trench_line_width,
-            taper_angle=taper_angle + trenches_extra_angle,
-        )
-        c.add_polygon(pts, layer_trench)
+    # Make all the grating lines at once
+    p = np.arange(p_start, p_start + n_periods + 1)
+    pts = grating_tooth_points(
+        p * a1,
+        p * b1,
+        p * x1,
+        width=trench_line_width,
+        taper_angle=taper_angle + trenches_extra_angle,
+    )
+    c.add_polygon(pts, layer_trench)
 
     # Make the taper
     p_taper = p_start - 1
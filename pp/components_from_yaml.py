@@ -0,0 +1,208 @@
+"""Build many variants of a YAML circuit in parallel processes.
+
+.. code::
+
+    import pp
+    from pp.components_from_yaml import components_from_yaml
+
+    list_overrides = [
+        {"instances": {"mmi_short": {"settings": {"length_mmi": length}}}}
+        for length in [5, 10, 15]
+    ]
+    components = components_from_yaml(yaml, list_overrides, n_processes=4)
+
+"""
+
+import multiprocessing
+import pathlib
+from typing import IO, Any, Dict, Iterator, List, Optional, Union
+
+from pp.component import Component
+from pp.component_from_yaml import (
+    compile_yaml,
+    component_from_compiled,
+    read_yaml_text,
+)
+from pp.config import CONFIG
+from pp.name import get_component_name
+from pp.placer import (
+    get_build_id,
+    load_doe_component_names,
+    merge_doe_shards,
+    save_doe,
+)
+
+
+def _flatten_overrides(overrides: Dict[str, Any], prefix: str = "") -> Dict[str, Any]:
+    """Returns {instance_setting: value}, skipping `instances` and `settings` keys."""
+    flat = {}
+    for key, value in overrides.items():
+        name = prefix if key in ["instances", "settings"] else f"{prefix}{key}_"
+        if isinstance(value, dict):
+            flat.update(_flatten_overrides(value, prefix=name))
+        else:
+            flat[name.rstrip("_")] = value
+    return flat
+
+
+def get_variant_name(name: str, overrides: Dict[str, Any]) -> str:
+    """Returns overrides["name"] or a name from the YAML name and the overrides."""
+    if "name" in overrides:
+        return overrides["name"]
+    return get_component_name(name, **_flatten_overrides(overrides))
+
+
+def iter_variants(
+    yaml_str: Union[str, pathlib.Path, IO[Any]],
+    list_overrides: List[Dict[str, Any]],
+    **kwargs,
+) -> Iterator[Component]:
+    """Yields a Component for each overrides dict, parsing the YAML only once.
+
+    Args:
+        yaml_str: YAML IO, file or string (with newlines)
+        list_overrides: list of nested dicts merged into the YAML
+        kwargs: for component_from_compiled
+    """
+    compiled = compile_yaml(yaml_str)
+    for overrides in list_overrides:
+        variant = compile_yaml(yaml_str, overrides=overrides)
+        variant.name = get_variant_name(compiled.name, overrides)
+        yield component_from_compiled(variant, **kwargs)
+
+
+def _build_variants(args) -> Union[List[Component], List[str]]:
+    text, list_overrides, doe_name, doe_root_path, precision, shard, kwargs = args
+    components = iter_variants(text, list_overrides, **kwargs)
+    if doe_name is None:
+        return list(components)
+
+    shard_index, n_shards, build_id = shard
+    return save_doe(
+        doe_name,
+        components,
+        doe_root_path=doe_root_path,
+        precision=precision,
+        shard_index=shard_index,
+        n_shards=n_shards,
+        build_id=build_id,
+    )
+
+
+def components_from_yaml(
+    yaml_str: Union[str, pathlib.Path, IO[Any]],
+    list_overrides: List[Dict[str, Any]],
+    n_processes: Optional[int] = None,
+    doe_name: Optional[str] = None,
+    doe_root_path: pathlib.Path = CONFIG["cache_doe_directory"],
+    precision: float = 1e-9,
+    **kwargs,
+) -> Union[List[Component], List[str]]:
+    """Returns a list of Components, one for each overrides dict,
+    built in n_processes worker processes.
+
+    If doe_name is given, each worker writes its components straight into the
+    DOE cache (same format as `pp.placer.save_doe`, so `generate_does` and
+    `place_from_yaml` can use them) and the component names are returned instead.
+
+    Args:
+        yaml_str: YAML IO, file or string (with newlines)
+        list_overrides: list of nested dicts merged into the YAML
+            (a `name` key sets the variant name)
+        n_processes: number of processes, defaults to the number of CPUs
+        doe_name: writes the components into doe_root_path/doe_name
+        doe_root_path: DOE cache directory
+        precision: for the GDS files
+        kwargs: component_factory, route_factory, link_factory ...
+    """
+    text = read_yaml_text(yaml_str)
+    n_processes = n_processes or multiprocessing.cpu_count()
+    n_shards = max(1, min(n_processes, len(list_overrides)))
+
+    # contiguous chunks, so the DOE content keeps the order of list_overrides
+    size, extra = divmod(len(list_overrides), n_shards)
+    chunks = []
+    start = 0
+    for i in range(n_shards):
+        stop = start + size + (i < extra)
+        chunks.append(list_overrides[start:stop])
+        start = stop
+
+    build_id = get_build_id(text, list_overrides)
+    shards = [(i, n_shards, build_id) for i in range(n_shards)]
+    list_args = [
+        (text, chunk, doe_name, doe_root_path, precision, shard, kwargs)
+        for chunk, shard in zip(chunks, shards)
+    ]
+    if n_shards == 1:
+        results = [_build_variants(list_args[0])]
+    else:
+        with multiprocessing.Pool(n_shards) as pool:
+            results = pool.map(_build_variants, list_args)
+
+    if doe_name is not None and n_shards > 1:
+        merge_doe_shards(
+            doe_name,
+            n_shards=n_shards,
+            doe_root_path=doe_root_path,
+            build_id=build_id,
+        )
+    return [item for result in results for item in result]
+
+
+yaml_sample = """
+name: mzi_mmis
+
+instances:
+    mmi_bot:
+      component: mmi1x2
+      settings:
+        width_mmi: 4.5
+        length_mmi: 10
+    mmi_top:
+      component: mmi1x2
+      settings:
+        width_mmi: 4.5
+        length_mmi: 5
+
+placements:
+    mmi_top:
+        x: 100
+        y: 100
+"""
+
+
+def test_components_from_yaml(tmpdir):
+    list_overrides = [
+        {"instances": {"mmi_top": {"settings": {"length_mmi": length}}}}
+        for length in [5, 10, 15]
+    ]
+    components = components_from_yaml(yaml_sample, list_overrides, n_processes=2)
+    assert [c.name for c in components] == [
+        "mzi_mmis_MTLM5",
+        "mzi_mmis_MTLM10",
+        "mzi_mmis_MTLM15",
+    ]
+    assert len(components[2].references) == 2
+
+    names = components_from_yaml(
+        yaml_sample,
+        list_overrides,
+        n_processes=2,
+        doe_name="mzi_mmis",
+        doe_root_path=tmpdir,
+    )
+    assert names == [c.name for c in components]
+    assert load_doe_component_names("mzi_mmis", doe_root_path=tmpdir) == names
+    assert (pathlib.Path(tmpdir) / "mzi_mmis" / f"{names[0]}.gds").exists()
+
+
+if __name__ == "__main__":
+    import pp
+
+    list_overrides = [
+        {"instances": {"mmi_top": {"settings": {"length_mmi": length}}}}
+        for length in range(5, 50, 5)
+    ]
+    components = components_from_yaml(yaml_sample, list_overrides)
+    pp.show(components[0])
@@ -78,6 +78,74 @@ def load_does(filepath):
     return does
 
 
+def _get_keys_and_values(kwargs):
+    """Returns keys and list of values for each key (accepts both values or lists)"""
+    if not kwargs:
+        return (), ()
+    list_values = [v if isinstance(v, list) else [v] for v in kwargs.values()]
+    return tuple(kwargs.keys()), tuple(list_values)
+
+
+def get_settings_count(do_permutations=True, **kwargs):
+    """Returns the number of settings in a sweep without building them"""
+    keys, list_values = _get_keys_and_values(kwargs)
+    if not keys:
+        return 1
+    lengths = [len(values) for values in list_values]
+    if do_permutations:
+        n = 1
+        for length in lengths:
+            n *= length
+        return n
+    return min(lengths)
+
+
+def iter_settings(do_permutations=True, shard_index=0, n_shards=1, **kwargs):
+    """Yields settings dicts lazily, one at a time
+
+    Args:
+        do_permutations: if False, will only zip the values passed for each parameter
+        shard_index: index of this shard (0 <= shard_index < n_shards)
+        n_shards: splits the sweep into contiguous and deterministic chunks
+            so N workers can build one chunk each
+        **kwargs: Keyword arguments with a list or tuple of desired values to sweep.
+            Without kwargs yields a single empty dict (component defaults)
+
+    .. code::
+
+        import pp
+
+        for settings in pp.doe.iter_settings(length=[30, 40], width=[4, 8]):
+            c = pp.c.waveguide(**settings)
+
+        # second half of the sweep
+        pp.doe.iter_settings(length=[30, 40], width=[4, 8], shard_index=1, n_shards=2)
+
+    """
+    if not 0 <= shard_index < n_shards:
+        raise ValueError(f"shard_index = {shard_index} not in [0, {n_shards})")
+
+    keys, list_values = _get_keys_and_values(kwargs)
+    if not keys:
+        if shard_index == 0:
+            yield {}
+        return
+
+    if do_permutations:
+        values_iterator = it.product(*list_values)
+    else:
+        values_iterator = zip(*list_values)
+
+    if n_shards > 1:
+        n = get_settings_count(do_permutations, **kwargs)
+        start = shard_index * n // n_shards
+        stop = (shard_index + 1) * n // n_shards
+        values_iterator = it.islice(values_iterator, start, stop)
+
+    for values in values_iterator:
+        yield dict(zip(keys, values))
+
+
 def get_settings_list(do_permutations=True, **kwargs):
     """Return a list of settings
 
@@ -101,25 +169,15 @@ def get_settings_list(do_permutations=True, **kwargs):
     get arguments from default_args and then update them from kwargs
     updates default_args with kwargs
     self.settings lists all the variations
+
+    For large sweeps use `iter_settings` that yields the settings lazily
     """
 
     # Deal with empty parameter case
     if kwargs == {}:
         return {}
 
-    # Accept both values or lists
-    for key, value in list(kwargs.items()):
-        if not isinstance(value, list):
-            kwargs[key] = [value]
-
-    if do_permutations:
-        keys, list_values = list(zip(*[x for x in list(kwargs.items())]))
-        settings = [dict(list(zip(keys, perms))) for perms in it.product(*list_values)]
-    else:
-        keys, list_values = list(zip(*[x for x in list(kwargs.items())]))
-        settings = [dict(list(zip(keys, values))) for values in zip(*list_values)]
-
-    return settings
+    return list(iter_settings(do_permutations, **kwargs))
 
 
 def test_load_does():
@@ -129,6 +187,26 @@ def test_load_does():
     return does
 
 
+def test_iter_settings():
+    kwargs = dict(length=[30, 40, 50], width=[4, 8], layer=(1, 0))
+    settings = get_settings_list(**kwargs)
+    assert len(settings) == get_settings_count(**kwargs) == 6
+    assert list(iter_settings(**kwargs)) == settings
+
+    shards = [
+        list(iter_settings(shard_index=i, n_shards=4, **kwargs)) for i in range(4)
+    ]
+    assert sum(shards, []) == settings
+
+    zipped = get_settings_list(do_permutations=False, **kwargs)
+    assert len(zipped) == get_settings_count(do_permutations=False, **kwargs) == 1
+
+    # no settings: a single component with the defaults
+    assert list(iter_settings()) == [{}]
+    assert get_settings_count() == 1
+    assert list(iter_settings(shard_index=1, n_shards=2)) == []
+
+
 if __name__ == "__main__":
     test_load_does()
     # from pprint import pprint
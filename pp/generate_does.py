@@ -1,13 +1,24 @@
 import collections
+import contextlib
+import json
+import pathlib
 import time
 from multiprocessing import Process
 
 from omegaconf import OmegaConf
 
+from pp.build_profile import BuildProfile, load_profiles, write_profile
 from pp.components import component_factory
 from pp.config import CONFIG, logging
-from pp.doe import get_settings_list
-from pp.placer import build_components, doe_exists, load_doe_component_names, save_doe
+from pp.doe import get_settings_count, get_settings_list, iter_settings
+from pp.placer import (
+    doe_exists,
+    get_build_id,
+    iter_components,
+    load_doe_component_names,
+    merge_doe_shards,
+    save_doe,
+)
 from pp.write_doe import write_doe_metadata
 
 
@@ -54,6 +65,12 @@ def save_doe_use_template(doe, doe_root_path=None):
         fw.write(f"TEMPLATE: {doe_template}")
 
 
+def _get_profile_name(doe_name, shard_index=0, n_shards=1):
+    if n_shards > 1:
+        return f"{doe_name}_{shard_index}_of_{n_shards}"
+    return doe_name
+
+
 def write_doe(
     doe,
     component_factory=component_factory,
@@ -61,27 +78,85 @@ def write_doe(
     doe_metadata_path=None,
     overwrite=False,
     precision=1e-9,
+    profile_path=None,
+    trace_memory=True,
+    shard_index=0,
+    n_shards=1,
     **kwargs,
 ):
-    doe_name = doe["name"]
-    list_settings = doe["list_settings"]
+    """Builds and saves the DOE components and writes the DOE metadata.
+
+    Settings are generated lazily and each component is written to disk and
+    released before the next one is built, so memory does not grow with the
+    number of components in the DOE.
+
+    if profile_path is defined, writes the build profile records of this DOE
+    into `profile_path/doe_name.json`, with peak memory if trace_memory
 
-    # Otherwise generate each component using the component factory
+    if n_shards > 1, only builds the shard_index chunk of the sweep
+    and writes the DOE metadata once all the shards are saved
+    """
+    doe_name = doe["name"]
+    settings = doe["settings"]
+    do_permutation = doe["do_permutation"]
     component_type = doe["component"]
-    components = build_components(
-        component_type, list_settings, component_factory=component_factory
-    )
+    profile = BuildProfile(trace_memory=trace_memory) if profile_path else None
+    build_id = get_build_id(component_type, do_permutation, settings)
+
+    with contextlib.ExitStack() as stack:
+        if profile:
+            doe_record = stack.enter_context(
+                profile.record(doe_name, kind="doe", component=component_type)
+            )
 
-    component_names = [c.name for c in components]
-    save_doe(doe_name, components, doe_root_path=doe_root_path, precision=precision)
+        # Otherwise generate each component using the component factory
+        list_settings = iter_settings(
+            do_permutation, shard_index=shard_index, n_shards=n_shards, **settings
+        )
+        components = iter_components(
+            component_type,
+            list_settings,
+            component_factory=component_factory,
+            profile=profile,
+        )
+
+        component_names = save_doe(
+            doe_name,
+            components,
+            doe_root_path=doe_root_path,
+            precision=precision,
+            profile=profile,
+            shard_index=shard_index,
+            n_shards=n_shards,
+            build_id=build_id,
+        )
+        if n_shards > 1:
+            component_names = merge_doe_shards(
+                doe_name,
+                n_shards=n_shards,
+                doe_root_path=doe_root_path,
+                build_id=build_id,
+            )
 
-    write_doe_metadata(
-        doe_name=doe["name"],
-        cell_names=component_names,
-        list_settings=doe["list_settings"],
-        doe_settings=kwargs,
-        doe_metadata_path=doe_metadata_path,
-    )
+        if component_names is not None:
+            write_doe_metadata(
+                doe_name=doe["name"],
+                cell_names=component_names,
+                list_settings=get_settings_list(do_permutation, **settings),
+                doe_settings=kwargs,
+                doe_metadata_path=doe_metadata_path,
+            )
+
+    if profile:
+        component_records = profile.records[:-1]
+        for record in component_records:
+            record["doe"] = doe_name
+        for key in ["polygons", "vertices", "cells", "gds_size"]:
+            doe_record[key] = sum(r.get(key, 0) for r in component_records)
+        profile_path.mkdir(parents=True, exist_ok=True)
+        profile_name = _get_profile_name(doe_name, shard_index, n_shards)
+        with open(profile_path / f"{profile_name}.json", "w") as fw:
+            fw.write(json.dumps(profile.records, indent=2))
 
 
 def load_does(filepath, defaults=None):
@@ -111,14 +186,40 @@ def generate_does(
     overwrite=False,
     precision=1e-9,
     cache=False,
+    profile=False,
+    profile_path=None,
+    trace_memory=True,
+    shard_index=0,
+    n_shards=1,
 ):
     """Generates a DOEs of components specified in a yaml file
     allows for each DOE to have its own x and y spacing (more flexible than method1)
     similar to write_doe
+
+    Args:
+        shard_index: builds only this chunk of each DOE sweep
+        n_shards: number of chunks that each DOE sweep is split into.
+            N workers can run generate_does with the same doe_root_path
+            and shard_index = 0 ... N-1
+        profile: records wall time, CPU time, peak memory, polygons, vertices,
+            cells and GDS size for every DOE and component that is built
+        profile_path: directory for the profile reports
+            (build_profile.json/.md/.html), defaults to `doe_metadata_path/../profile`
+        trace_memory: profiles peak memory with tracemalloc, which inflates the
+            profiled wall and CPU times. False for accurate times
     """
 
+    doe_root_path = pathlib.Path(doe_root_path)
+    doe_metadata_path = pathlib.Path(doe_metadata_path)
     doe_root_path.mkdir(parents=True, exist_ok=True)
     doe_metadata_path.mkdir(parents=True, exist_ok=True)
+    if profile:
+        profile_path = pathlib.Path(
+            profile_path or doe_metadata_path.parent / "profile"
+        )
+    else:
+        profile_path = None
+    does_built = []
 
     dicts, mask_settings = load_does(filepath)
     does, templates_by_type = separate_does_from_templates(dicts)
@@ -151,9 +252,8 @@ def generate_does(
                     print(template, "does not exist")
                     raise
 
-        do_permutation = doe.pop("do_permutation")
-        settings = doe["settings"]
-        doe["list_settings"] = get_settings_list(do_permutation, **settings)
+        doe["do_permutation"] = doe.pop("do_permutation")
+        doe["n_settings"] = get_settings_count(doe["do_permutation"], **doe["settings"])
 
         list_args += [doe]
 
@@ -171,7 +271,7 @@ def generate_does(
             # Only launch a build process if we do not use the cache
             # Or if the DOE is not built
 
-            list_settings = doe["list_settings"]
+            n_settings = doe["n_settings"]
 
             use_cached_does = (
                 default_use_cached_does if "cache" not in doe else doe["cache"]
@@ -186,16 +286,22 @@ def generate_does(
                 save_doe_use_template(doe)
 
             elif use_cached_does:
-                _doe_exists = doe_exists(doe_name, list_settings)
+                _doe_exists = doe_exists(
+                    doe_name, n_settings, doe_root_path=doe_root_path
+                )
                 if _doe_exists:
                     logger.info("Cached - {}".format(doe_name))
                     if overwrite:
-                        component_names = load_doe_component_names(doe_name)
+                        component_names = load_doe_component_names(
+                            doe_name, doe_root_path=doe_root_path
+                        )
 
                         write_doe_metadata(
                             doe_name=doe["name"],
                             cell_names=component_names,
-                            list_settings=doe["list_settings"],
+                            list_settings=get_settings_list(
+                                doe["do_permutation"], **doe["settings"]
+                            ),
                             doe_metadata_path=doe_metadata_path,
                         )
 
@@ -209,10 +315,15 @@ def generate_does(
                         "doe_metadata_path": doe_metadata_path,
                         "overwrite": overwrite,
                         "precision": precision,
+                        "profile_path": profile_path,
+                        "trace_memory": trace_memory,
+                        "shard_index": shard_index,
+                        "n_shards": n_shards,
                     },
                 )
                 doe_name_to_process[doe_name] = p
                 does_running += [doe_name]
+                does_built += [_get_profile_name(doe_name, shard_index, n_shards)]
                 try:
                     p.start()
                 except Exception:
@@ -246,6 +357,11 @@ def generate_does(
 
         time.sleep(0.05)
 
+    if profile_path:
+        records = load_profiles(profile_path, does_built)
+        jsonpath = write_profile(records, dirpath=profile_path)
+        logger.info(f"Wrote build profile in {jsonpath.with_suffix('.md')}")
+
 
 if __name__ == "__main__":
     filepath = CONFIG["samples_path"] / "mask" / "does.yml"
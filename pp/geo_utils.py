@@ -1,4 +1,4 @@
-from typing import List, Optional, Union
+from typing import List, Optional, Tuple, Union
 
 import numpy as np
 from numpy import cos, float64, ndarray, sin
@@ -155,9 +155,12 @@ def snap_angle(a: float64) -> int:
 
 
 def angles_rad(pts: ndarray) -> ndarray:
-    """ returns the angles (radians) of the connection between each point and the next """
-    _pts = np.roll(pts, -1, 0)
-    radians = np.arctan2(_pts[:, 1] - pts[:, 1], _pts[:, 0] - pts[:, 0])
+    """ returns the angles (radians) of the connection between each point and the next
+
+    pts can also be (T, N, 2) for T paths of N points
+    """
+    _pts = np.roll(pts, -1, -2)
+    radians = np.arctan2(_pts[..., 1] - pts[..., 1], _pts[..., 0] - pts[..., 0])
     return radians
 
 
@@ -166,6 +169,113 @@ def angles_deg(pts: ndarray) -> ndarray:
     return angles_rad(pts) * RAD2DEG
 
 
+def snap_angles(a: ndarray) -> ndarray:
+    """ Returns the angles (deg) snapped along manhattan angles, as snap_angle """
+    a = np.asarray(a) % 360
+    snapped = np.floor((a + 45) / 90) % 4 * 90
+    # halfway angles snap to 0, as in snap_angle
+    return np.where(a % 90 == 45, 0, snapped).astype(int)
+
+
+def extrude_paths(
+    points: ndarray,
+    offsets: ndarray,
+    width: Union[float, ndarray],
+    with_manhattan_facing_angles: bool = True,
+    spike_length: Union[float, ndarray] = 0,
+    start_angle: Optional[Union[float, ndarray]] = None,
+    end_angle: Optional[Union[float, ndarray]] = None,
+    grid: float = 0.001,
+) -> Tuple[ndarray, ndarray]:
+    """
+    Extrude many paths at once, each one as `extrude_path` does
+
+    The paths are one (V, 2) vertex buffer: path k is
+    points[offsets[k]:offsets[k + 1]], with 2 points or more.
+    The polygons come back in the same layout.
+
+    Args:
+        points: numpy 2D array of shape (V, 2), all the paths concatenated
+        offsets: (P + 1) start index of each path, then V
+        width: float or (P) one per path
+        with_manhattan_facing_angles: bool
+        spike_length: float or (P)
+        start_angle: None, float or (P)
+        end_angle: None, float or (P)
+        grid:
+
+    Returns:
+        polygon points (2*V + 2 per spiked path, 2), polygon offsets (P + 1)
+    """
+    points = np.asarray(points)
+    offsets = np.asarray(offsets)
+    sizes = np.diff(offsets)
+    n_paths = len(sizes)
+    starts = offsets[:-1]
+    ends = offsets[1:] - 1
+
+    # the last vertex of each path connects back to its first, as np.roll
+    _pts = np.roll(points, -1, 0)
+    _pts[ends] = points[starts]
+    radians = np.arctan2(_pts[:, 1] - points[:, 1], _pts[:, 0] - points[:, 0])
+    a = radians * RAD2DEG
+    if with_manhattan_facing_angles:
+        _start_angle = snap_angles(a[starts] + 180)
+        _end_angle = snap_angles(a[ends - 1])
+    else:
+        _start_angle = a[starts] + 180
+        _end_angle = a[ends - 1]
+
+    start_angle = _start_angle if start_angle is None else start_angle
+    end_angle = _end_angle if end_angle is None else end_angle
+    start_angle = np.zeros(n_paths) + start_angle
+    end_angle = np.zeros(n_paths) + end_angle
+
+    a2 = radians * 0.5
+    a1 = np.roll(a2, 1)
+    a1[starts] = a2[ends]
+
+    a2[ends] = end_angle * DEG2RAD - a2[ends - 1]
+    a1[starts] = start_angle * DEG2RAD - a1[starts + 1]
+
+    a_plus = a2 + a1
+    cos_a_min = np.cos(a2 - a1)
+    width = np.repeat(np.zeros(n_paths) + width, sizes)
+    vertex_offsets = np.column_stack(
+        (-sin(a_plus) / cos_a_min, cos(a_plus) / cos_a_min)
+    ) * (0.5 * width[:, None])
+
+    # each polygon: [start spike], points + offsets, [end spike], points - offsets
+    # reversed, spikes only where spike_length != 0
+    spike_length = np.zeros(n_paths) + spike_length
+    spiked = (spike_length != 0).astype(int)
+    polygon_offsets = np.concatenate([[0], np.cumsum(2 * sizes + 2 * spiked)])
+    pts = np.empty((polygon_offsets[-1], 2))
+
+    index = np.arange(len(points))
+    polygon_starts = polygon_offsets[:-1]
+    front = index + np.repeat(polygon_starts + spiked - starts, sizes)
+    back = np.repeat(polygon_starts + 2 * spiked + 2 * sizes - 1 + starts, sizes)
+    pts[front] = points + vertex_offsets
+    pts[back - index] = points - vertex_offsets
+
+    k = np.flatnonzero(spiked)
+    if len(k):
+        d = spike_length[k, None]
+        a_start = start_angle[k] * DEG2RAD
+        a_end = end_angle[k] * DEG2RAD
+        p_start_spike = points[starts[k]] + d * np.column_stack(
+            [cos(a_start), sin(a_start)]
+        )
+        p_end_spike = points[ends[k]] + d * np.column_stack([cos(a_end), sin(a_end)])
+        pts[polygon_offsets[k]] = p_start_spike
+        pts[polygon_offsets[k] + 1 + sizes[k]] = p_end_spike
+
+    pts = np.round(pts / grid) * grid
+
+    return pts, polygon_offsets
+
+
 def extrude_path(
     points: Union[List[Coord2], ndarray],
     width: float,
@@ -178,6 +288,8 @@ def extrude_path(
     """
     Extrude a path of width `width` along a curve defined by `points`
 
+    Use `extrude_paths` to extrude many paths at once.
+
     Args:
         points: numpy 2D array of shape (N, 2)
         width: float
@@ -261,3 +373,25 @@ def polygon_grow(polygon, offset):
 
     pts = s + offsets
     return pts
+
+
+def test_extrude_paths():
+    t = np.linspace(0, 1, 21)
+    paths = [
+        np.column_stack([10 * t, 3 * np.sin(3 * t)]),
+        np.array([(0.0, 0.0), (10.0, 0.0), (10.0, 10.0)]),
+        np.array([(0.0, 0.0), (5.0, 5.0)]),
+    ]
+    widths = [0.5, 1.0, 2.0]
+    spike_lengths = [0.2, 0.0, 0.3]
+    offsets = np.cumsum([0] + [len(path) for path in paths])
+    pts, polygon_offsets = extrude_paths(
+        np.concatenate(paths), offsets, widths, spike_length=spike_lengths
+    )
+    for i, path in enumerate(paths):
+        polygon = pts[polygon_offsets[i] : polygon_offsets[i + 1]]
+        expected = extrude_path(path, widths[i], spike_length=spike_lengths[i])
+        assert np.array_equal(polygon, expected)
+
+    angles = np.arange(-360, 361, 15)
+    assert list(snap_angles(angles)) == [snap_angle(a) for a in angles]
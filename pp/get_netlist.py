@@ -14,7 +14,10 @@
 
 """
 
-from typing import Dict, Tuple
+from typing import Dict, List, Tuple
+
+import numpy as np
+from phidl.device_layout import CellArray, DeviceReference
 
 from pp.drc import snap_to_1nm_grid
 from pp.layers import LAYER
@@ -54,6 +57,46 @@ def get_instance_name(
     return text
 
 
+def get_cell_array_references(cell_array: CellArray) -> List[DeviceReference]:
+    """Returns one reference for each element of a CellArray (AREF)."""
+    from pp.component import ComponentReference
+
+    rotation = cell_array.rotation or 0
+    magnification = cell_array.magnification or 1
+    dx, dy = cell_array.spacing
+    columns, rows = np.meshgrid(
+        np.arange(cell_array.columns), np.arange(cell_array.rows)
+    )
+    offsets = np.stack([columns.ravel() * dx, rows.ravel() * dy], axis=-1)
+    if cell_array.x_reflection:
+        offsets[:, 1] *= -1
+    angle = np.radians(rotation)
+    ca, sa = np.cos(angle), np.sin(angle)
+    offsets = magnification * offsets @ np.array([[ca, sa], [-sa, ca]])
+    return [
+        ComponentReference(
+            cell_array.parent,
+            origin=tuple(np.array(cell_array.origin) + offset),
+            rotation=rotation,
+            magnification=cell_array.magnification,
+            x_reflection=cell_array.x_reflection,
+        )
+        for offset in offsets
+    ]
+
+
+def get_references(component) -> List[DeviceReference]:
+    """Returns the references of a component, with each CellArray expanded
+    into one reference per element."""
+    references = []
+    for reference in component.references:
+        if isinstance(reference, CellArray):
+            references += get_cell_array_references(reference)
+        else:
+            references.append(reference)
+    return references
+
+
 def get_netlist(
     component, full_settings=False, layer_label: Tuple[int, int] = LAYER.LABEL_INSTANCE
 ) -> Dict[str, Dict]:
@@ -76,8 +119,9 @@ def get_netlist(
     instances = {}
     connections = {}
     top_ports = {}
+    references = get_references(component)
 
-    for reference in component.references:
+    for reference in references:
         c = reference.parent
         origin = snap_to_1nm_grid(reference.origin)
         x = snap_to_1nm_grid(origin[0])
@@ -106,7 +150,7 @@ def get_netlist(
         top_ports_list.add(src)
 
     # lower level ports
-    for reference in component.references:
+    for reference in references:
         for port in reference.ports.values():
             reference_name = get_instance_name(
                 component, reference, layer_label=layer_label
@@ -171,6 +215,19 @@ def demo_mzi_lattice():
     print(c.get_netlist_yaml())
 
 
+def test_get_netlist_cell_array():
+    import pp
+    from pp.placer import placer_grid_cell_refs
+
+    wg = pp.c.waveguide()
+    c = pp.Component()
+    c.add(placer_grid_cell_refs([wg] * 4, cols=2, rows=2, dx=100, dy=50))
+    netlist = c.get_netlist()
+    assert len(netlist["instances"]) == 4
+    xy = {(p["x"], p["y"]) for p in netlist["placements"].values()}
+    assert xy == {(0, 0), (100, 0), (0, 50), (100, 50)}
+
+
 if __name__ == "__main__":
     # test_mzi_lattice()
     # import matplotlib.pyplot as plt
@@ -10,6 +10,7 @@ from phidl.geometry import (
 )
 
 import pp
+from pp.boolean_klayout import offset_klayout
 
 
 def offset(
@@ -22,10 +23,30 @@ def offset(
     tolerance=2,
     max_points=4000,
     layer=0,
+    backend="phidl",
 ):
     """ returns an element containing all polygons with an offset
     from phidl geometry
+
+    backend="klayout" uses klayout Regions, tiled and multi-threaded, with
+    join in miter or bevel. num_divisions=(1, 1), the default, picks one
+    tile per 10000 polygons
     """
+    if backend == "klayout":
+        return offset_klayout(
+            elements,
+            distance=distance,
+            join_first=join_first,
+            precision=precision,
+            num_divisions=None if num_divisions == (1, 1) else num_divisions,
+            join=join,
+            tolerance=tolerance,
+            max_points=max_points,
+            layer=layer,
+        )
+    if backend != "phidl":
+        raise ValueError(f"backend = {backend!r} not in ['phidl', 'klayout']")
+
     if not isinstance(elements, list):
         elements = [elements]
     polygons_to_offset = []
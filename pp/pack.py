@@ -1,7 +1,9 @@
 """ adapted from phidl.Geometry
 """
 
-from typing import Any, Dict, List, Tuple
+import itertools
+import multiprocessing
+from typing import Any, Dict, List, Optional, Tuple
 
 import numpy as np
 import rectpack
@@ -10,6 +12,30 @@ from numpy import ndarray
 from pp.component import Component
 
 
+def _get_packed_rects(
+    rects: List[Tuple[int, int, int]],
+    box_size: ndarray,
+    pack_algorithm: str,
+) -> List[Tuple[int, int, int, int, int]]:
+    """Packs presorted rectangles [(w, h, id)] into a single bin.
+
+    Returns:
+        list of packed rectangles [(x, y, w, h, id)]
+    """
+    rect_packer = rectpack.newPacker(
+        mode=rectpack.PackingMode.Offline,
+        pack_algo=getattr(rectpack, pack_algorithm),
+        sort_algo=rectpack.SORT_NONE,
+        bin_algo=rectpack.PackingBin.BBF,
+        rotation=False,
+    )
+    for w, h, rid in rects:
+        rect_packer.add_rect(width=w, height=h, rid=rid)
+    rect_packer.add_bin(width=int(box_size[0]), height=int(box_size[1]))
+    rect_packer.pack()
+    return rect_packer[0].rect_list() if len(rect_packer) else []
+
+
 def _pack_single_bin(
     rect_dict: Dict[int, Tuple[int, int]],
     aspect_ratio: Tuple[int, int],
@@ -17,11 +43,14 @@ def _pack_single_bin(
     sort_by_area: bool,
     density: float,
     precision: float,
+    pack_algorithm: str = "MaxRectsBlsf",
+    sort_algorithm: Optional[str] = None,
 ) -> Tuple[Dict[int, Tuple[int, int, int, int]], Dict[Any, Any]]:
     """Packs a dict of rectangles {id:(w,h)} and tries to
     pack it into a bin as small as possible with aspect ratio `aspect_ratio`
-    Will iteratively grow the bin size until everything fits or the bin size
-    reaches `max_size`.
+    Starts from the smallest bin that can hold the total area, grows it with
+    increasing steps until everything fits (or it reaches `max_size`) and then
+    bisects the last step until the bin size is known within a factor `density`.
 
     Returns:
         packed rectangles dict {id:(x,y,w,h)}
@@ -33,45 +62,54 @@ def _pack_single_bin(
     for r in rect_dict.values():
         total_area += r[0] * r[1]
     aspect_ratio = np.asarray(aspect_ratio) / np.linalg.norm(aspect_ratio)  # Normalize
+    box_unit = aspect_ratio * np.sqrt(total_area)
+
+    # The bin needs at least the total area and the largest width and height
+    max_width = max(r[0] for r in rect_dict.values())
+    max_height = max(r[1] for r in rect_dict.values())
+    scale_min = max(
+        1 / np.sqrt(np.prod(aspect_ratio)),
+        max_width / box_unit[0],
+        max_height / box_unit[1],
+    )
 
-    # Setup variables
-    box_size = np.asarray(aspect_ratio * np.sqrt(total_area), dtype=np.float64)
-    box_size = np.clip(box_size, None, max_size)
-    if sort_by_area:
-        rp_sort = rectpack.SORT_AREA
-    else:
-        rp_sort = rectpack.SORT_NONE
-
-    # Repeatedly run the rectangle-packing algorithm with increasingly larger
-    # areas until everything fits or we've reached the maximum size
-    while True:
-        # Create the pack object
-        rect_packer = rectpack.newPacker(
-            mode=rectpack.PackingMode.Offline,
-            pack_algo=rectpack.MaxRectsBlsf,
-            sort_algo=rp_sort,
-            bin_algo=rectpack.PackingBin.BBF,
-            rotation=False,
-        )
-
-        # Add each rectangle to the pack, create a single bin, and pack
-        for rid, r in rect_dict.items():
-            rect_packer.add_rect(width=r[0], height=r[1], rid=rid)
-        rect_packer.add_bin(width=box_size[0], height=box_size[1])
-        rect_packer.pack()
-
-        # Adjust the box size for next time
-        box_size *= density  # Increase area to try to fit
-        box_size = np.clip(box_size, None, max_size)
-
-        # Quit the loop if we've packed all the rectangles or reached the max size
-        if len(rect_packer.rect_list()) == len(rect_dict):
-            break
-        elif all(box_size >= max_size):
+    # Sort the rectangles once for all the bin sizes
+    sort_algorithm = sort_algorithm or ("SORT_AREA" if sort_by_area else "SORT_NONE")
+    rects = [(r[0], r[1], rid) for rid, r in rect_dict.items()]
+    rects = getattr(rectpack, sort_algorithm)(rects)
+
+    def _pack(scale):
+        box_size = np.clip(box_unit * scale, None, max_size)
+        return _get_packed_rects(rects, box_size, pack_algorithm)
+
+    # Grow the bin by density, density**2, density**4 ... from the smallest
+    # possible bin until everything fits or we've reached the maximum size
+    scale_low = None
+    scale = scale_min
+    step = density
+    packed = _pack(scale)
+    while len(packed) < len(rects):
+        if all(box_unit * scale >= max_size):
             break
+        scale_low = scale
+        scale *= step
+        step *= step
+        packed = _pack(scale)
+
+    # Bisect between the largest bin that failed and the smallest that fits
+    if len(packed) == len(rects) and scale_low is not None:
+        scale_high = scale
+        while scale_high / scale_low > density:
+            scale = np.sqrt(scale_low * scale_high)
+            packed_scale = _pack(scale)
+            if len(packed_scale) == len(rects):
+                scale_high = scale
+                packed = packed_scale
+            else:
+                scale_low = scale
 
     # Separate packed from unpacked rectangles, make dicts of form {id:(x,y,w,h)}
-    packed_rect_dict = {r[-1]: r[:-1] for r in rect_packer[0].rect_list()}
+    packed_rect_dict = {r[-1]: r[:-1] for r in packed}
     unpacked_rect_dict = {}
     for k, v in rect_dict.items():
         if k not in packed_rect_dict:
@@ -80,6 +118,22 @@ def _pack_single_bin(
     return (packed_rect_dict, unpacked_rect_dict)
 
 
+def _pack_single_bin_strategy(kwargs):
+    """Runs _pack_single_bin in a worker process, returns its area metrics."""
+    packed_rect_dict, unpacked_rect_dict = _pack_single_bin(**kwargs)
+    return _get_density_key(packed_rect_dict), packed_rect_dict, unpacked_rect_dict
+
+
+def _get_density_key(packed_rect_dict) -> Tuple[float, float]:
+    """Returns a sorting key that favors more packed area and then a smaller bin."""
+    if not packed_rect_dict:
+        return (0, 0)
+    rects = np.array(list(packed_rect_dict.values()), dtype=np.float64)
+    packed_area = np.sum(rects[:, 2] * rects[:, 3])
+    bbox_area = np.max(rects[:, 0] + rects[:, 2]) * np.max(rects[:, 1] + rects[:, 3])
+    return (-packed_area, bbox_area)
+
+
 def pack(
     D_list: List[Component],
     spacing: int = 10,
@@ -88,6 +142,9 @@ def pack(
     sort_by_area: bool = True,
     density: float = 1.1,
     precision: float = 1e-2,
+    pack_algorithms: Tuple[str, ...] = ("MaxRectsBlsf",),
+    sort_algorithms: Optional[Tuple[str, ...]] = None,
+    n_processes: int = 1,
 ) -> List[Component]:
     """Pack a list of components into as few Components as possible.
 
@@ -98,6 +155,14 @@ def pack(
         max_size: Limits the size into which the shapes will be packed
         density:  Values closer to 1 pack tighter but require more computation
         sort_by_area (Boolean): Pre-sorts the shapes by area
+        pack_algorithms: rectpack algorithms to try (MaxRectsBlsf, MaxRectsBssf,
+            MaxRectsBaf, MaxRectsBl, SkylineBl, GuillotineBssfSas ...)
+        sort_algorithms: rectpack sort orders to try (SORT_AREA, SORT_PERI,
+            SORT_LSIDE, SORT_SSIDE, SORT_DIFF, SORT_RATIO, SORT_NONE).
+            Defaults to SORT_AREA if sort_by_area else SORT_NONE
+        n_processes: number of processes to try the strategies in parallel.
+            Every combination of pack_algorithms and sort_algorithms is tried
+            and the densest packing is kept
     """
 
     if density < 1.01:
@@ -124,17 +189,44 @@ def pack(
             )
         rect_dict[n] = (w, h)
 
+    sort_algorithms = sort_algorithms or (
+        ("SORT_AREA",) if sort_by_area else ("SORT_NONE",)
+    )
+    strategies = list(itertools.product(pack_algorithms, sort_algorithms))
+    pool = (
+        multiprocessing.Pool(min(n_processes, len(strategies)))
+        if n_processes > 1 and len(strategies) > 1
+        else None
+    )
+
     packed_list = []
-    while len(rect_dict) > 0:
-        (packed_rect_dict, rect_dict) = _pack_single_bin(
-            rect_dict,
-            aspect_ratio=aspect_ratio,
-            max_size=max_size,
-            sort_by_area=sort_by_area,
-            density=density,
-            precision=precision,
-        )
-        packed_list.append(packed_rect_dict)
+    try:
+        while len(rect_dict) > 0:
+            list_kwargs = [
+                dict(
+                    rect_dict=rect_dict,
+                    aspect_ratio=aspect_ratio,
+                    max_size=max_size,
+                    sort_by_area=sort_by_area,
+                    density=density,
+                    precision=precision,
+                    pack_algorithm=pack_algorithm,
+                    sort_algorithm=sort_algorithm,
+                )
+                for pack_algorithm, sort_algorithm in strategies
+            ]
+            if pool:
+                results = pool.map(_pack_single_bin_strategy, list_kwargs)
+            else:
+                results = [_pack_single_bin_strategy(kwargs) for kwargs in list_kwargs]
+
+            _, packed_rect_dict, rect_dict = min(results, key=lambda r: r[0])
+            if not packed_rect_dict:
+                raise ValueError(f"pack() could not pack {len(rect_dict)} objects")
+            packed_list.append(packed_rect_dict)
+    finally:
+        if pool:
+            pool.close()
 
     D_packed_list = []
     for rect_dict in packed_list:
@@ -189,6 +281,23 @@ def test_pack():
     assert len(c.get_dependencies()) == 4
 
 
+def test_pack_strategies():
+    import phidl.geometry as pg
+
+    D_list = [pg.rectangle(size=(n % 7 + 1, n % 5 + 1)) for n in range(20)]
+    D_packed_list = pack(
+        D_list,
+        spacing=1,
+        pack_algorithms=("MaxRectsBlsf", "MaxRectsBssf", "SkylineBl"),
+        sort_algorithms=("SORT_AREA", "SORT_PERI"),
+    )
+    assert len(D_packed_list) == 1
+    assert len(D_packed_list[0].references) == 20
+
+    D_packed_list = pack(D_list, spacing=1, max_size=(12, 12))
+    assert sum(len(D.references) for D in D_packed_list) == 20
+
+
 if __name__ == "__main__":
     test_pack()
 
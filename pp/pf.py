@@ -14,6 +14,7 @@ import pp.build as pb
 from pp import CONFIG, klive
 from pp.config import logging, print_config
 from pp.gdsdiff.gdsdiff import gdsdiff
+from pp.generate_does import generate_does
 from pp.install import install_gdsdiff, install_generic_tech, install_klive
 from pp.layers import LAYER
 from pp.mask.merge_json import merge_json
@@ -135,6 +136,32 @@ def build_does():
     pb.build_does()
 
 
+@click.command(name="build")
+@click.argument("filepath", required=False, default="does.yml")
+@click.option("--n-cores", default=8, help="Number of DOE build processes")
+@click.option("--cache", default=False, help="Use cached DOEs", is_flag=True)
+@click.option(
+    "--profile",
+    default=False,
+    help="Write a per-DOE and per-component build profile report",
+    is_flag=True,
+)
+@click.option(
+    "--trace-memory/--no-trace-memory",
+    default=True,
+    help="Profile peak memory (slows down the profiled times)",
+)
+def build(filepath, n_cores, cache, profile, trace_memory):
+    """ Build DOEs defined in does.yml into the DOE cache"""
+    generate_does(
+        filepath,
+        n_cores=n_cores,
+        cache=cache,
+        profile=profile,
+        trace_memory=trace_memory,
+    )
+
+
 @click.command(name="write_metadata")
 @click.argument("label_layer", required=False, default=LAYER_LABEL)
 def mask_merge(label_layer):
@@ -223,6 +250,7 @@ mask.add_command(mask_merge)
 mask.add_command(write_mask_labels)
 
 cli.add_command(config_get)
+cli.add_command(build)
 cli.add_command(mask)
 cli.add_command(show)
 cli.add_command(test)
@@ -29,13 +29,19 @@ YAML defines component DOE settings and placement
         A-B1-2: doe1
 """
 
+import hashlib
+import json
 import os
 import pathlib
 import sys
+from typing import Iterator, List, Tuple
 
 from omegaconf import OmegaConf
+from phidl.device_layout import CellArray
 
 import pp
+from pp.autoplacer.functions import get_grid_arrays
+from pp.cell import CACHE
 from pp.components import component_factory
 from pp.config import CONFIG
 from pp.doe import get_settings_list, load_does
@@ -50,6 +56,11 @@ def _print(*args, **kwargs):
 def placer_grid_cell_refs(
     component_factory, cols=1, rows=1, dx=10.0, dy=10.0, x0=0, y0=0, **settings
 ):
+    """Returns references on a grid, column by column
+
+    The same component repeated on consecutive grid positions is placed as a
+    single CellArray (AREF)
+    """
     if callable(component_factory):
         settings_list = get_settings_list(**settings)
         component_list = [component_factory(**s) for s in settings_list]
@@ -64,9 +75,23 @@ def placer_grid_cell_refs(
                 rows, cols, len(indices), len(component_list)
             )
         )
+    grid = {index: id(component) for component, index in zip(component_list, indices)}
+    id_to_component = {id(component): component for component in component_list}
+
     components = []
-    for component, (i, j) in zip(component_list, indices):
-        c_ref = component.ref(position=(x0 + j * dx, y0 + i * dy))
+    for key, i, j, n_rows, n_cols in get_grid_arrays(grid):
+        component = id_to_component[key]
+        position = (x0 + j * dx, y0 + i * dy)
+        if n_rows * n_cols > 1:
+            c_ref = CellArray(
+                component,
+                columns=n_cols,
+                rows=n_rows,
+                spacing=(dx, dy),
+                origin=position,
+            )
+        else:
+            c_ref = component.ref(position=position)
         components += [c_ref]
 
     return components
@@ -288,25 +313,107 @@ def load_placer_with_does(filepath, defaults=None):
 CONTENT_SEP = " , "
 
 
+def get_build_id(*args, **kwargs) -> str:
+    """Returns a hash of the settings of a DOE build.
+
+    Shards saved with the same build_id belong to the same sweep
+    (see `save_doe` and `merge_doe_shards`)
+    """
+    text = json.dumps([args, kwargs], sort_keys=True, default=str)
+    return hashlib.sha1(text.encode()).hexdigest()[:16]
+
+
+def _read_shard(shard_file: pathlib.Path) -> Tuple[str, List[str]]:
+    """Returns build_id and component names of a shard content file."""
+    build_id, _, content = shard_file.read_text().partition("\n")
+    return build_id, content.split(CONTENT_SEP) if content else []
+
+
 def save_doe(
-    doe_name, components, doe_root_path=CONFIG["cache_doe_directory"], precision=1e-9
+    doe_name,
+    components,
+    doe_root_path=CONFIG["cache_doe_directory"],
+    precision=1e-9,
+    profile=None,
+    shard_index=0,
+    n_shards=1,
+    build_id="",
 ):
     """
     Save all components from this DOE in a tmp cache folder
+
+    Components are written one at a time, so `components` can be a generator
+    (see `iter_components`) and each component can be released after writing.
+    Returns the list of component names.
+
+    Args:
+        profile: optional pp.build_profile.BuildProfile to record GDS file sizes
+        shard_index: index of the shard of the sweep that these components belong to
+        n_shards: when > 1, writes `content_{shard_index}_of_{n_shards}.txt`.
+            Call `merge_doe_shards` once all the shards are saved
+        build_id: identifies the sweep of the shards (see `get_build_id`),
+            shards of other builds of this DOE are removed
     """
     doe_dir = pathlib.Path(doe_root_path) / doe_name
     doe_dir.mkdir(parents=True, exist_ok=True)
 
-    # Store list of component names - order matters
-    component_names = [c.name for c in components]
-    content_file = doe_dir / "content.txt"
-    with open(content_file, "w") as fw:
-        fw.write(CONTENT_SEP.join(component_names))
+    # stale content files from a previous build of this DOE (or of this shard)
+    stale_files = [doe_dir / "content.txt"]
+    stale_files += [
+        shard_file
+        for shard_file in doe_dir.glob("content_*_of_*.txt")
+        if not shard_file.name.endswith(f"_of_{n_shards}.txt")
+        or _read_shard(shard_file)[0] != build_id
+    ]
+    stale_files += [doe_dir / f"content_{shard_index}_of_{n_shards}.txt"]
+    for stale_file in stale_files:
+        if stale_file.exists():
+            stale_file.unlink()
 
+    # Store list of component names - order matters
+    component_names = []
     for c in components:
         gdspath = doe_dir / f"{c.name}.gds"
         write_gds(c, gdspath=gdspath, precision=precision)
         write_component_report(c, json_path=gdspath.with_suffix(".json"))
+        if profile:
+            profile.add_gds_size(c.name, gdspath)
+        component_names.append(c.name)
+
+    # content.txt is written last so an interrupted DOE is not taken from cache
+    if n_shards > 1:
+        content_file = doe_dir / f"content_{shard_index}_of_{n_shards}.txt"
+        with open(content_file, "w") as fw:
+            fw.write(build_id + "\n" + CONTENT_SEP.join(component_names))
+    else:
+        with open(doe_dir / "content.txt", "w") as fw:
+            fw.write(CONTENT_SEP.join(component_names))
+    return component_names
+
+
+def merge_doe_shards(doe_name, n_shards, doe_root_path=None, build_id=""):
+    """Writes content.txt from the shard content files written by `save_doe`
+
+    Returns the list of component names of the DOE, or None if some shards
+    of this build_id are not saved yet.
+    """
+    if doe_root_path is None:
+        doe_root_path = CONFIG["cache_doe_directory"]
+    doe_dir = pathlib.Path(doe_root_path) / doe_name
+    shard_files = [doe_dir / f"content_{i}_of_{n_shards}.txt" for i in range(n_shards)]
+    if not all(shard_file.exists() for shard_file in shard_files):
+        return None
+
+    component_names = []
+    for shard_file in shard_files:
+        shard_build_id, names = _read_shard(shard_file)
+        if shard_build_id != build_id:
+            return None
+        component_names += names
+
+    with open(doe_dir / "content.txt", "w") as fw:
+        fw.write(CONTENT_SEP.join(component_names))
+    return component_names
 
 
 def load_doe_from_cache(doe_name, doe_root_path=None):
@@ -340,6 +447,12 @@ def doe_exists(doe_name, list_settings, doe_root_path=None):
     """
     Check whether the folder exists and that the number of items in content.txt
     matches the number of items in list_settings
+
+    Args:
+        doe_name:
+        list_settings: list of settings or number of settings
+            (see `pp.doe.get_settings_count`)
+        doe_root_path:
     """
     if doe_root_path is None:
         doe_root_path = CONFIG["cache_doe_directory"]
@@ -350,8 +463,9 @@ def doe_exists(doe_name, list_settings, doe_root_path=None):
     with open(content_file) as f:
         component_names = f.read().split(CONTENT_SEP)
 
-    if len(component_names) == len(list_settings) or (
-        len(list_settings) == 0 and len(component_names) == 1
+    n_settings = list_settings if isinstance(list_settings, int) else len(list_settings)
+    if len(component_names) == n_settings or (
+        n_settings == 0 and len(component_names) == 1
     ):
         return True
 
@@ -360,7 +474,7 @@ def doe_exists(doe_name, list_settings, doe_root_path=None):
         doe_name,
         "needs regeneration",
         len(component_names),
-        len(list_settings),
+        n_settings,
     )
     return False
 
@@ -516,24 +630,133 @@ def component_grid_from_yaml(filepath, precision=1e-9):
     return component_grid
 
 
-def build_components(
-    component_type, list_settings, component_factory=component_factory
+def iter_components(
+    component_type,
+    list_settings,
+    component_factory=component_factory,
+    profile=None,
+    release=True,
 ):
-    components = []
+    """Yields components one at a time, one for each settings dict
+
+    Args:
+        component_type: component factory name
+        list_settings: list or iterator of settings dicts (see `pp.doe.iter_settings`)
+        component_factory: dict of component functions
+        profile: optional pp.build_profile.BuildProfile to record build metrics
+        release: removes each component, and the cells that it added to the
+            cell cache, once the next one is requested, so memory does not grow
+            with the size of the sweep
+    """
+    component_function = component_factory[component_type]
 
     # If no settings passed, generate a single component with defaults
-    if not list_settings:
-        component_function = component_factory[component_type]
-        component = component_function()
-        components += [component]
-        return components
+    # (`iter_settings` yields a single {} itself)
+    if not isinstance(list_settings, Iterator) and not list_settings:
+        list_settings = [{}]
 
     for settings in list_settings:
-        component_function = component_factory[component_type]
-        component = component_function(**settings)
-        components += [component]
+        cached_names = set(CACHE) if release else None
+        if profile:
+            with profile.record(component_type, settings=settings) as record:
+                component = component_function(**settings)
+                record["name"] = component.name
+                profile.add_component_stats(record, component)
+        else:
+            component = component_function(**settings)
+        yield component
 
-    return components
+        if release:
+            for name in [name for name in CACHE if name not in cached_names]:
+                CACHE.pop(name)
+        del component
+
+
+def build_components(
+    component_type, list_settings, component_factory=component_factory, profile=None
+):
+    """Returns a list of components, one for each settings dict
+
+    Args:
+        component_type: component factory name
+        list_settings: list of settings dicts
+        component_factory: dict of component functions
+        profile: optional pp.build_profile.BuildProfile to record build metrics
+    """
+    return list(
+        iter_components(
+            component_type,
+            list_settings,
+            component_factory=component_factory,
+            profile=profile,
+            release=False,
+        )
+    )
+
+
+def test_iter_components_empty_settings():
+    from pp.doe import iter_settings
+
+    for list_settings in [None, [], iter_settings()]:
+        components = list(iter_components("waveguide", list_settings, release=False))
+        assert len(components) == 1
+
+
+def test_iter_components_release():
+    from pp.doe import iter_settings
+
+    n_cached = len(CACHE)
+    list_settings = iter_settings(delta_length=list(range(1, 11)))
+    for component in iter_components("mzi", list_settings):
+        assert component.name in CACHE
+    assert len(CACHE) == n_cached
+
+
+def test_save_doe_removes_stale_shards(tmpdir):
+    doe_dir = pathlib.Path(tmpdir) / "doe"
+    components = [pp.c.waveguide(length=length) for length in [1, 2, 3]]
+    old = get_build_id(length=[1, 3])
+    new = get_build_id(length=[1, 2])
+    assert old != new
+
+    # previous build of the DOE, with other settings or number of shards
+    for shard_index in range(2):
+        save_doe(
+            "doe",
+            components[2 * shard_index : 2 * shard_index + 1],
+            doe_root_path=tmpdir,
+            shard_index=shard_index,
+            n_shards=2,
+            build_id=old,
+        )
+    (doe_dir / "content_1_of_3.txt").write_text(new + "\nstale")
+    assert merge_doe_shards("doe", 2, doe_root_path=tmpdir, build_id=old)
+
+    save_doe("doe", components[:1], doe_root_path=tmpdir, n_shards=2, build_id=new)
+    assert not (doe_dir / "content.txt").exists()
+    assert not (doe_dir / "content_1_of_3.txt").exists()
+    assert not (doe_dir / "content_1_of_2.txt").exists()
+    assert merge_doe_shards("doe", 2, doe_root_path=tmpdir, build_id=new) is None
+    assert not (doe_dir / "content.txt").exists()
+
+    save_doe(
+        "doe",
+        components[1:2],
+        doe_root_path=tmpdir,
+        shard_index=1,
+        n_shards=2,
+        build_id=new,
+    )
+    names = merge_doe_shards("doe", 2, doe_root_path=tmpdir, build_id=new)
+    assert names == [c.name for c in components[:2]]
+    assert (doe_dir / "content.txt").read_text() == CONTENT_SEP.join(names)
+
+
+def test_placer_grid_cell_refs_arrays():
+    c = pp.c.waveguide()
+    refs = placer_grid_cell_refs([c, c, c, c], cols=2, rows=2, dx=100, dy=50)
+    assert len(refs) == 1
+    assert (refs[0].columns, refs[0].rows) == (2, 2)
 
 
 if __name__ == "__main__":
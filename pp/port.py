@@ -138,7 +138,8 @@ class Port(PortPhidl):
             layer=self.layer,
             port_type=self.port_type,
         )
-        new_port.info = deepcopy(self.info)
+        if self.info:
+            new_port.info = deepcopy(self.info)
         if not new_uid:
             new_port.uid = self.uid
             Port._next_uid -= 1
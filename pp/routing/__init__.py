@@ -6,6 +6,7 @@ from pp.routing.add_electrical_pads_shortest import add_electrical_pads_shortest
 from pp.routing.add_electrical_pads_top import add_electrical_pads_top
 from pp.routing.add_fiber_array import add_fiber_array
 from pp.routing.add_fiber_single import add_fiber_single
+from pp.routing.check_routes import RouteViolation, check_routes
 from pp.routing.connect import (
     connect_elec_waypoints,
     connect_strip,
@@ -21,6 +22,7 @@ from pp.routing.connect_bundle import (
 from pp.routing.manhattan import round_corners, route_manhattan
 from pp.routing.repackage import package_optical2x2
 from pp.routing.route_fiber_single import route_fiber_single
+from pp.routing.route_grid import route_grid
 from pp.routing.route_ports_to_side import route_elec_ports_to_side, route_ports_to_side
 from pp.routing.route_south import route_south
 
@@ -43,6 +45,7 @@ __all__ = [
     "add_fiber_array",
     "add_fiber_array",
     "add_fiber_single",
+    "check_routes",
     "connect_bundle",
     "connect_bundle_path_length_match",
     "connect_strip",
@@ -53,8 +56,10 @@ __all__ = [
     "link_factory",
     "package_optical2x2",
     "round_corners",
+    "RouteViolation",
     "route_elec_ports_to_side",
     "route_fiber_single",
+    "route_grid",
     "route_manhattan",
     "route_ports_to_side",
     "route_ports_to_side",
@@ -0,0 +1,52 @@
+""" Checks thousands of routes for overlaps and spacing violations
+
+The routes are nested L shapes `pitch` apart, plus one route crossing them all.
+
+.. code::
+
+    python pp/routing/benchmark_check_routes.py
+
+"""
+
+import time
+
+import numpy as np
+
+from pp.components import waveguide
+from pp.components.bend_circular import bend_circular
+from pp.routing.check_routes import check_routes
+from pp.routing.manhattan import round_corners, round_corners_bundle
+
+
+def nested_routes(n=1000, pitch=5.0, length=100.0):
+    """Returns (n, 3, 2) waypoints: route i goes north from (i * pitch, 0)
+    then east to x = (n + 1) * pitch + length"""
+    i = np.arange(n)
+    x = i * pitch
+    y = length + (n - 1 - i) * pitch
+    x_end = np.full(n, (n + 1) * pitch + length)
+    return np.stack(
+        [np.stack([x, np.zeros(n)], 1), np.stack([x, y], 1), np.stack([x_end, y], 1)],
+        axis=1,
+    )
+
+
+def benchmark(n=1000, pitch=5.0, min_spacing=1.0):
+    bend = bend_circular()
+    routes = round_corners_bundle(nested_routes(n, pitch), bend, waveguide)
+    points = np.array([(-50, 50), (n * pitch + 50, 50)])
+    routes.append(round_corners(points, bend, waveguide))
+
+    t0 = time.time()
+    violations = check_routes(routes, min_spacing=min_spacing)
+    runtime = time.time() - t0
+    crossing = [v for v in violations if v.route2 == n]
+    print(
+        f"{n + 1} routes: {runtime:.3f}s, {len(violations)} violations, "
+        f"{len(crossing)} with the crossing route"
+    )
+
+
+if __name__ == "__main__":
+    for n in [100, 1000, 3000]:
+        benchmark(n)
@@ -0,0 +1,48 @@
+""" Routes a 256 channel bundle to a fiber array, one route at a time and
+with all the routes at once (`bundle_route_filter`)
+
+.. code::
+
+    python pp/routing/benchmark_connect_bundle.py
+
+"""
+
+import time
+
+import pp
+from pp.port import Port
+from pp.routing.connect import connect_strip_way_points_bundle
+from pp.routing.connect_bundle import connect_bundle, link_ports_routes
+from pp.routing.manhattan import clear_segment_cache
+
+
+def fiber_array_ports(n=256, pitch=5.0, fiber_pitch=127.0, dy=3000.0):
+    """Returns n device ports (facing south) and n fiber ports (facing north)"""
+    ports1 = [Port(f"E{i}", (i * pitch, 0), 0.5, 270) for i in range(n)]
+    x0 = (n - 1) * (pitch - fiber_pitch) / 2
+    ports2 = [Port(f"F{i}", (x0 + i * fiber_pitch, -dy), 0.5, 90) for i in range(n)]
+    return ports1, ports2
+
+
+def benchmark(n=256, batched=True):
+    ports1, ports2 = fiber_array_ports(n)
+    clear_segment_cache()
+    t0 = time.time()
+    link_ports_routes(ports1, ports2, separation=5.0)
+    t1 = time.time()
+    bundle_route_filter = connect_strip_way_points_bundle if batched else None
+    routes = connect_bundle(ports1, ports2, bundle_route_filter=bundle_route_filter)
+    t2 = time.time()
+    c = pp.Component(f"bundle_{n}_{batched}")
+    c.add(routes)
+    print(
+        f"{n} channels, batched {batched}: waypoints {t1 - t0:.3f}s, "
+        f"connect_bundle {t2 - t1:.2f}s"
+    )
+    return c
+
+
+if __name__ == "__main__":
+    for n in [64, 256]:
+        benchmark(n, batched=False)
+        benchmark(n, batched=True)
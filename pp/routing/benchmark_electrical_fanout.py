@@ -0,0 +1,64 @@
+""" Routes a 200 pad heater array with route_pad_array and
+route_elec_ports_to_side, one wire component per port or all the wires at
+once (`bundle_route_filter=connect_elec_waypoints_bundle`)
+
+.. code::
+
+    python pp/routing/benchmark_electrical_fanout.py
+
+"""
+
+import time
+
+import pp
+from pp.layers import LAYER
+from pp.routing.connect import connect_elec_waypoints_bundle
+from pp.routing.route_pad_array import route_pad_array
+from pp.routing.route_ports_to_side import route_elec_ports_to_side
+
+
+def heater_array(n=200, pitch=20.0, width=10.0):
+    """Returns a row of n heaters with a south facing electrical port each"""
+    c = pp.Component(f"heater_array_{n}")
+    c.add_polygon([(0, 0), (n * pitch, 0), (n * pitch, 100), (0, 100)], LAYER.M3)
+    for i in range(n):
+        c.add_port(
+            f"S{i}",
+            midpoint=(pitch / 2 + i * pitch, 0),
+            width=width,
+            orientation=270,
+            layer=LAYER.M3,
+            port_type="dc",
+        )
+    return c
+
+
+def count_cells(elements):
+    c = pp.Component()
+    for e in elements:
+        c.add(e)
+    return len(c.get_dependencies(recursive=True))
+
+
+def benchmark(n=200):
+    c = heater_array(n)
+    for bundle_route_filter in [None, connect_elec_waypoints_bundle]:
+        t0 = time.time()
+        elements, _, _ = route_pad_array(
+            c, fanout_length=100, bundle_route_filter=bundle_route_filter
+        )
+        t1 = time.time()
+        wires, _ = route_elec_ports_to_side(
+            c, side="west", bundle_route_filter=bundle_route_filter
+        )
+        t2 = time.time()
+        mode = "bundle" if bundle_route_filter else "per port"
+        print(
+            f"{n} pads, {mode}: route_pad_array {t1 - t0:.3f}s "
+            f"({count_cells(elements)} cells), "
+            f"route_elec_ports_to_side {t2 - t1:.3f}s ({count_cells(wires)} cells)"
+        )
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,95 @@
+""" Computes the end straights of link_ports bundles with the vectorized sweep
+(`get_end_straights`) and with the previous loop, and checks they match
+
+.. code::
+
+    python pp/routing/benchmark_link_ports.py
+
+"""
+
+import time
+
+import numpy as np
+
+from pp.port import Port
+from pp.routing.connect_bundle import (
+    are_decoupled,
+    get_end_straights,
+    get_min_spacing,
+    link_ports_routes,
+)
+
+
+def get_end_straights_loop(x1, x2, widths, separation, end_offsets, Le=15.0):
+    """Previous link_ports_routes first pass, one port at a time"""
+    end_straights = []
+    end_straights_in_group = []
+    curr_end_straight = 0
+    x1_prev, x2_prev = x1[0], x2[0]
+    n = len(x1)
+    for i in range(n):
+        if i != n - 1 and i != 0:
+            curr_sep = 0.5 * (widths[i] + max(widths[i + 1], widths[i - 1]))
+        elif i == 0:
+            curr_sep = 0.5 * (widths[0] + widths[1])
+        else:
+            curr_sep = 0.5 * (widths[-2] + widths[-1])
+        curr_sep += separation
+
+        if are_decoupled(x2[i], x2_prev, x1[i], x1_prev, sep=curr_sep):
+            L = min(end_straights_in_group)
+            end_straights += [max(x - L, 0) + Le for x in end_straights_in_group]
+            end_straights_in_group = []
+            curr_end_straight = 0
+        elif x2[i] >= x1[i]:
+            curr_end_straight += curr_sep
+        else:
+            curr_end_straight -= curr_sep
+
+        end_straights_in_group.append(curr_end_straight + end_offsets[i])
+        x1_prev, x2_prev = x1[i], x2[i]
+
+    L = min(end_straights_in_group)
+    end_straights += [max(x - L, 0) + Le for x in end_straights_in_group]
+    return np.array(end_straights)
+
+
+def bundle_ports(n=1000, seed=0):
+    """Returns n random start ports (facing south) and end ports (facing north)"""
+    rng = np.random.default_rng(seed)
+    x1 = np.sort(rng.uniform(0, 10 * n, n))
+    x2 = x1 + rng.uniform(-200, 200, n)
+    widths = rng.choice([0.5, 1.0, 2.0], n)
+    ports1 = [Port(f"S{i}", (x1[i], 0), widths[i], 270) for i in range(n)]
+    ports2 = [Port(f"E{i}", (x2[i], -1000), widths[i], 90) for i in range(n)]
+    return ports1, ports2
+
+
+def benchmark(n=1000, separation=5.0):
+    ports1, ports2 = bundle_ports(n)
+    x1 = np.array([p.x for p in ports1])
+    x2 = np.array([p.x for p in ports2])
+    widths = np.array([p.width for p in ports1])
+    end_offsets = np.zeros(n)
+
+    t0 = time.time()
+    expected = get_end_straights_loop(x1, x2, widths, separation, end_offsets)
+    t1 = time.time()
+    end_straights = get_end_straights(x1, x2, widths, separation, end_offsets)
+    t2 = time.time()
+    assert np.allclose(end_straights, expected)
+
+    link_ports_routes(ports1, ports2, separation=separation)
+    t3 = time.time()
+    get_min_spacing(ports1, ports2, sep=separation)
+    t4 = time.time()
+    print(
+        f"{n} ports: end straights loop {1e3 * (t1 - t0):.1f}ms, "
+        f"sweep {1e3 * (t2 - t1):.2f}ms, link_ports_routes {t3 - t2:.3f}s, "
+        f"get_min_spacing {1e3 * (t4 - t3):.1f}ms"
+    )
+
+
+if __name__ == "__main__":
+    for n in [10, 100, 1000, 10000]:
+        benchmark(n)
@@ -0,0 +1,45 @@
+""" Path length matches the waypoints of 32 to 256 channel bundles at once
+
+.. code::
+
+    python pp/routing/benchmark_path_length_matching.py
+
+"""
+
+import time
+
+import numpy as np
+
+from pp.port import Port
+from pp.routing.connect_bundle import generate_waypoints_connect_bundle
+from pp.routing.path_length_matching import path_length_match_bundle
+
+
+def bundle_waypoints(n=128, pitch=10.0, fiber_pitch=127.0, dy=2000.0):
+    """Returns the waypoints of a bundle of n routes fanning out"""
+    ports1 = [Port(f"top_{i}", (i * pitch, 0), 0.5, 90) for i in range(n)]
+    x0 = (n - 1) * (pitch - fiber_pitch) / 2
+    ports2 = [
+        Port(f"bottom_{i}", (x0 + i * fiber_pitch, dy), 0.5, 270) for i in range(n)
+    ]
+    return generate_waypoints_connect_bundle(ports1, ports2)
+
+
+def benchmark(n=128, repeat=10, **kwargs):
+    routes = bundle_waypoints(n)
+    t0 = time.time()
+    for _ in range(repeat):
+        waypoints, spread = path_length_match_bundle(routes, **kwargs)
+    runtime = (time.time() - t0) / repeat
+    print(
+        f"{n} channels {kwargs}: {1e3 * runtime:.2f}ms, "
+        f"{waypoints.shape[1]} waypoints, spread {spread:.2e}um"
+    )
+    assert np.isclose(spread, 0, atol=1e-6)
+
+
+if __name__ == "__main__":
+    for n in [32, 64, 128, 256]:
+        benchmark(n)
+    # loops on the first segment, which is long enough for many loops
+    benchmark(128, max_loop_length=1000.0, modify_segment_i=-3)
@@ -0,0 +1,53 @@
+""" Routes a bundle with round_corners, with and without the segment cache
+
+.. code::
+
+    python pp/routing/benchmark_round_corners.py
+
+"""
+
+import time
+
+import numpy as np
+
+import pp
+from pp.components import waveguide
+from pp.components.bend_circular import bend_circular
+from pp.routing.manhattan import clear_segment_cache, round_corners
+
+
+def bundle_waypoints(n=1000, pitch=1.0):
+    """Returns the waypoints of n nested routes, all with different lengths"""
+    routes = []
+    for i in range(n):
+        dy = pitch * i
+        routes.append(
+            np.array(
+                [(0, dy), (1200 - dy, dy), (1200 - dy, 1200 + dy), (2500, 1200 + dy)]
+            )
+        )
+    return routes
+
+
+def benchmark(n=1000, use_cache=True, flatten=False):
+    routes = bundle_waypoints(n)
+    bend90 = bend_circular(radius=10)
+    clear_segment_cache()
+    c = pp.Component(f"bundle_{n}_{use_cache}_{flatten}")
+    t0 = time.time()
+    for points in routes:
+        if not use_cache:
+            clear_segment_cache()
+        c.add(round_corners(points, bend90, waveguide, flatten=flatten))
+    runtime = time.time() - t0
+    n_cells = len(c.get_dependencies(recursive=True))
+    print(
+        f"{n} routes, cache {use_cache}, flatten {flatten}: {runtime:.2f}s, "
+        f"{n_cells} cells"
+    )
+
+
+if __name__ == "__main__":
+    benchmark(use_cache=False)
+    benchmark(use_cache=True)
+    benchmark(use_cache=True, flatten=True)
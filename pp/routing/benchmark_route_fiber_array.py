@@ -0,0 +1,28 @@
+""" Adds fiber arrays to rings that only differ in gap, with and without
+the route_fiber_array plan cache
+
+.. code::
+
+    python pp/routing/benchmark_route_fiber_array.py
+
+"""
+
+import time
+
+import pp
+from pp.routing.add_fiber_array import add_fiber_array
+from pp.routing.route_fiber_array import clear_route_plan_cache
+
+
+def benchmark(n=100):
+    components = [pp.c.ring_single(gap=0.1 + 0.002 * i) for i in range(n)]
+    for cache in [False, True]:
+        clear_route_plan_cache()
+        t0 = time.time()
+        for c in components:
+            add_fiber_array(c, cache=cache)
+        print(f"{n} rings, cache={cache}: {time.time() - t0:.3f}s")
+
+
+if __name__ == "__main__":
+    benchmark()
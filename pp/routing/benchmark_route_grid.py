@@ -0,0 +1,60 @@
+""" Routes 100+ nets between the devices of a die with the grid router
+
+Each net goes from an east port of a device to a west port of the device one
+column to the east and one row to the north, around the other devices.
+
+.. code::
+
+    python pp/routing/benchmark_route_grid.py
+
+"""
+
+import time
+
+import pp
+from pp.layers import LAYER
+from pp.port import Port
+from pp.routing.route_grid import ObstacleGrid, generate_grid_waypoints_bundle
+
+
+def device_die(n=6, n_ports=4, pitch=400.0, size=(150.0, 100.0), port_pitch=10.0):
+    """Returns a die with n x n devices, and the ports of the nets"""
+    c = pp.Component(f"die_{n}_{n_ports}")
+    w, h = size
+    ports1 = []
+    ports2 = []
+    for row in range(n):
+        for col in range(n):
+            x, y = col * pitch, row * pitch
+            c.add_polygon([(x, y), (x + w, y), (x + w, y + h), (x, y + h)], LAYER.WG)
+            if row == n - 1 or col == n - 1:
+                continue
+            for k in range(n_ports):
+                yk = y + (h - (n_ports - 1) * port_pitch) / 2 + k * port_pitch
+                ports1.append(Port(f"E{row}_{col}_{k}", (x + w, yk), 0.5, 0))
+                ports2.append(
+                    Port(f"W{row}_{col}_{k}", (x + pitch, yk + pitch), 0.5, 180)
+                )
+    return c, ports1, ports2
+
+
+def benchmark(n=6, n_ports=4, bend_radius=10.0, grid=5.0):
+    c, ports1, ports2 = device_die(n=n, n_ports=n_ports)
+    t0 = time.time()
+    obstacles = ObstacleGrid.from_component(c, grid=grid)
+    t1 = time.time()
+    routes = generate_grid_waypoints_bundle(
+        c, ports1, ports2, bend_radius=bend_radius, obstacles=obstacles
+    )
+    t2 = time.time()
+    bends = sum(len(points) - 2 for points in routes)
+    print(
+        f"{len(routes)} nets, grid {obstacles.occupied.shape}: "
+        f"rasterize {t1 - t0:.3f}s, route {t2 - t1:.2f}s, {bends} bends"
+    )
+    return c, routes
+
+
+if __name__ == "__main__":
+    for n, n_ports in [(4, 4), (6, 4), (8, 4), (6, 8)]:
+        benchmark(n=n, n_ports=n_ports)
@@ -0,0 +1,244 @@
+""" Checks routes for overlaps and minimum spacing violations, without DRC
+
+The route polygons are indexed in an R-tree (shapely STRtree), so only the
+polygons closer than `min_spacing` are compared, all at once.
+
+.. code::
+
+    routes = pp.routing.connect_bundle(ports1, ports2)
+    violations = check_routes(routes, component=c, min_spacing=1.0)
+    assert not violations, violations
+
+"""
+
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+from numpy import ndarray
+
+from pp.component import Component, ComponentReference
+
+Layer = Tuple[int, int]
+
+
+@dataclass
+class RouteViolation:
+    """Closest approach between two routes, or between a route and the component."""
+
+    # "intersection" (the polygons touch or overlap) or "spacing"
+    kind: str
+    route1: int
+    # None for the component
+    route2: Optional[int]
+    layer: Layer
+    distance: float
+    location: Tuple[float, float]
+
+
+def _import_shapely():
+    """Returns the shapely module, which needs to be >= 2.0 for the
+    vectorized geometry functions."""
+    import shapely
+
+    if int(shapely.__version__.split(".")[0]) < 2:
+        raise ImportError(
+            f"check_routes needs shapely>=2.0, got shapely {shapely.__version__}"
+        )
+    return shapely
+
+
+def _get_layer_polygons(item) -> Dict[Layer, List[ndarray]]:
+    """Returns {layer: polygons} of a Component, a reference or a polygon."""
+    if isinstance(item, (Component, ComponentReference)):
+        return item.get_polygons(by_spec=True)
+    polygons = {}
+    for points, layer, datatype in zip(item.polygons, item.layers, item.datatypes):
+        polygons.setdefault((layer, datatype), []).append(points)
+    return polygons
+
+
+def _get_polygons(
+    items: Iterable,
+    layers: Optional[Iterable[Layer]] = None,
+) -> Tuple[ndarray, ndarray, List[Layer]]:
+    """Returns the polygons of items on layers as shapely geometries, with the
+    index of the item and the layer of each one."""
+    shapely = _import_shapely()
+    layers = None if layers is None else {tuple(layer) for layer in layers}
+    polygons = []
+    owners = []
+    polygon_layers = []
+    for i, item in enumerate(items):
+        for layer, layer_polygons in _get_layer_polygons(item).items():
+            if layers is not None and layer not in layers:
+                continue
+            polygons += layer_polygons
+            owners += [i] * len(layer_polygons)
+            polygon_layers += [layer] * len(layer_polygons)
+
+    if not polygons:
+        return np.array([], dtype=object), np.zeros(0, dtype=int), []
+
+    # one linear ring per polygon, built from all the vertices at once
+    sizes = [len(points) for points in polygons]
+    rings = shapely.linearrings(
+        np.concatenate(polygons), indices=np.repeat(np.arange(len(polygons)), sizes)
+    )
+    return shapely.polygons(rings), np.array(owners), polygon_layers
+
+
+def _get_port_boxes(
+    routes: List[Union[Component, ComponentReference]], min_spacing: float
+) -> ndarray:
+    """Returns a square around the ports of each route, wide enough to hide
+    the component geometry a route connects to."""
+    shapely = _import_shapely()
+    boxes = []
+    for route in routes:
+        squares = [
+            shapely.box(
+                *(port.midpoint - port.width / 2 - min_spacing),
+                *(port.midpoint + port.width / 2 + min_spacing),
+            )
+            for port in route.ports.values()
+        ]
+        boxes.append(shapely.union_all(squares))
+    return np.array(boxes, dtype=object)
+
+
+def check_routes(
+    routes: List[Union[Component, ComponentReference]],
+    component: Optional[Component] = None,
+    min_spacing: float = 1.0,
+    layers: Optional[Iterable[Layer]] = None,
+) -> List[RouteViolation]:
+    """Returns the overlaps and spacing violations between routes, and
+    between routes and the component, one per pair and layer, where the
+    polygons come closest.
+
+    Only polygons on the same layer are compared.
+    Within `min_spacing` of its ports, a route may touch the component:
+    that is where it connects.
+
+    Args:
+        routes: route references, as returned by connect_bundle or round_corners
+        component: other geometry. If it contains the routes, they are skipped
+        min_spacing: min distance between polygons of different routes (um)
+        layers: layers to check, defaults to all the layers of the routes
+    """
+    shapely = _import_shapely()
+    geometries, owners, polygon_layers = _get_polygons(routes, layers)
+    if not len(geometries):
+        return []
+    layer_names = sorted(set(polygon_layers))
+    layer_index = {layer: i for i, layer in enumerate(layer_names)}
+    layer_ids = np.array([layer_index[layer] for layer in polygon_layers])
+
+    # component polygons get owner -1, routes are clipped around their ports
+    if component is not None:
+        route_ids = {id(route) for route in routes}
+        items = [ref for ref in component.references if id(ref) not in route_ids]
+        items += component.polygons
+        component_geometries, _, component_layers = _get_polygons(
+            items, layers=layer_names
+        )
+        geometries = np.concatenate([geometries, component_geometries])
+        owners = np.concatenate([owners, np.full(len(component_geometries), -1)])
+        layer_ids = np.concatenate(
+            [layer_ids, [layer_index[layer] for layer in component_layers]]
+        ).astype(int)
+        port_boxes = _get_port_boxes(routes, min_spacing)
+
+    tree = shapely.STRtree(geometries)
+    i, j = tree.query(geometries, predicate="dwithin", distance=min_spacing)
+    keep = (owners[i] != owners[j]) & (layer_ids[i] == layer_ids[j])
+    # each pair once, and a component polygon always second
+    keep &= np.where(owners[j] < 0, True, (owners[i] >= 0) & (i < j))
+    i, j = i[keep], j[keep]
+
+    a = geometries[i]
+    b = geometries[j]
+    with_component = owners[j] < 0
+    if np.any(with_component):
+        clipped = shapely.difference(
+            a[with_component], port_boxes[owners[i[with_component]]]
+        )
+        a = a.copy()
+        a[with_component] = clipped
+
+    distances = shapely.distance(a, b)
+    overlap = shapely.intersects(a, b)
+    distances[overlap] = 0.0
+    valid = (distances < min_spacing) & ~shapely.is_empty(a)
+    i, j, a, b = i[valid], j[valid], a[valid], b[valid]
+    distances = distances[valid]
+
+    # closest approach of each (route1, route2, layer)
+    route1 = owners[i]
+    route2 = owners[j]
+    order = np.lexsort((distances, layer_ids[i], route2, route1))
+    keys = np.stack([route1, route2, layer_ids[i]], axis=1)[order]
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = np.any(keys[1:] != keys[:-1], axis=1)
+    order = order[first]
+
+    lines = shapely.shortest_line(a[order], b[order])
+    locations = shapely.get_coordinates(lines).reshape(-1, 2, 2).mean(axis=1)
+
+    violations = []
+    for k, location in zip(order, locations):
+        violations.append(
+            RouteViolation(
+                kind="intersection" if distances[k] == 0 else "spacing",
+                route1=int(route1[k]),
+                route2=None if route2[k] < 0 else int(route2[k]),
+                layer=layer_names[layer_ids[i[k]]],
+                distance=float(distances[k]),
+                location=(float(location[0]), float(location[1])),
+            )
+        )
+    return violations
+
+
+def test_check_routes():
+    import pp
+    from pp.routing.connect_bundle import connect_bundle
+    from pp.routing.manhattan import round_corners
+
+    c = pp.Component()
+    c1 = c << pp.c.mmi2x2()
+    c2 = c << pp.c.mmi2x2()
+    c2.move((100, 40))
+    routes = connect_bundle(
+        [c1.ports["E0"], c1.ports["E1"]], [c2.ports["W0"], c2.ports["W1"]]
+    )
+    c.add(routes)
+    assert not check_routes(routes, component=c, min_spacing=0.5)
+
+    # a route crossing the bundle
+    crossing = round_corners(
+        [(50, -20), (50, 60)], pp.c.bend_circular(), pp.c.waveguide
+    )
+    violations = check_routes(routes + [crossing], min_spacing=0.5)
+    assert [(v.kind, v.route1, v.route2) for v in violations] == [
+        ("intersection", 0, 2),
+        ("intersection", 1, 2),
+    ]
+    assert np.isclose(violations[0].location[0], 50, atol=0.5)
+
+    # a device on top of the routes
+    c3 = c << pp.c.mmi2x2()
+    c3.move((40, 18))
+    violations = check_routes(routes, component=c, min_spacing=0.5)
+    assert {v.route2 for v in violations} == {None}
+    assert {v.kind for v in violations} == {"intersection"}
+
+
+def test_check_routes_shapely_version(monkeypatch):
+    import pytest
+    import shapely
+
+    monkeypatch.setattr(shapely, "__version__", "1.8.5")
+    with pytest.raises(ImportError, match="shapely>=2.0"):
+        check_routes([], min_spacing=0.5)
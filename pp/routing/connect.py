@@ -1,19 +1,25 @@
-from typing import Callable, List, Tuple
+import uuid
+from functools import partial
+from typing import Callable, List, Tuple, Union
 
 import numpy as np
 from numpy import ndarray
 
-from pp.component import ComponentReference
+from pp.component import Component, ComponentReference
 from pp.components import taper as taper_factory
 from pp.components import waveguide
 from pp.components.bend_circular import bend_circular
 from pp.components.electrical import corner, wire
 from pp.config import TAPER_LENGTH, WG_EXPANDED_WIDTH
 from pp.layers import LAYER
+from pp.name import clean_name
 from pp.port import Port
 from pp.routing.manhattan import (
     generate_manhattan_waypoints,
+    get_segment,
+    get_wire_polygons,
     round_corners,
+    round_corners_bundle,
     route_manhattan,
 )
 
@@ -39,7 +45,8 @@ def connect_strip(
     bend90 = bend_factory(radius=bend_radius, width=input_port.width)
 
     taper = (
-        taper_factory(
+        get_segment(
+            taper_factory,
             length=TAPER_LENGTH,
             width1=input_port.width,
             width2=WG_EXPANDED_WIDTH,
@@ -70,7 +77,7 @@ def connect_strip_way_points(
     bend_radius: float = 10.0,
     wg_width: float = 0.5,
     layer=LAYER.WG,
-    **kwargs
+    **kwargs,
 ):
     """Returns a deep-etched route formed by the given way_points with
     bends instead of corners and optionally tapers in straight sections.
@@ -81,8 +88,12 @@ def connect_strip_way_points(
     bend90 = bend_factory(radius=bend_radius, width=wg_width)
 
     taper = (
-        taper_factory(
-            length=TAPER_LENGTH, width1=wg_width, width2=WG_EXPANDED_WIDTH, layer=layer,
+        get_segment(
+            taper_factory,
+            length=TAPER_LENGTH,
+            width1=wg_width,
+            width2=WG_EXPANDED_WIDTH,
+            layer=layer,
         )
         if callable(taper_factory)
         else taper_factory
@@ -92,6 +103,37 @@ def connect_strip_way_points(
     return connector
 
 
+def connect_strip_way_points_bundle(
+    routes: List[ndarray],
+    bend_factory: Callable = bend_circular,
+    straight_factory: Callable = waveguide,
+    taper_factory: Callable = taper_factory,
+    bend_radius: float = 10.0,
+    wg_width: float = 0.5,
+    layer=LAYER.WG,
+    **kwargs,
+) -> List[ComponentReference]:
+    """Returns `[connect_strip_way_points(points) for points in routes]`,
+    with all the routes rounded at once by `round_corners_bundle`.
+
+    routes: (N, K, 2) array or list of waypoints
+    """
+    bend90 = bend_factory(radius=bend_radius, width=wg_width)
+
+    taper = (
+        get_segment(
+            taper_factory,
+            length=TAPER_LENGTH,
+            width1=wg_width,
+            width2=WG_EXPANDED_WIDTH,
+            layer=layer,
+        )
+        if callable(taper_factory)
+        else taper_factory
+    )
+    return round_corners_bundle(routes, bend90, straight_factory, taper)
+
+
 def connect_strip_way_points_no_taper(*args, **kwargs):
     return connect_strip_way_points(*args, taper_factory=None, **kwargs)
 
@@ -103,15 +145,12 @@ def connect_elec_waypoints(
     taper_factory=taper_factory,
     wg_width=10.0,
     layer=LAYER.M3,
-    **kwargs
+    **kwargs,
 ):
     """returns a route with electrical traces"""
 
     bend90 = bend_factory(width=wg_width, layer=layer)
-
-    def _straight_factory(length=10.0, width=wg_width):
-        return straight_factory(length=length, width=width, layer=layer)
-
+    _straight_factory = partial(straight_factory, layer=layer)
     connector = round_corners(way_points, bend90, _straight_factory, taper=None)
     return connector
 
@@ -122,7 +161,7 @@ def connect_elec(
     straight_factory=wire,
     bend_factory=corner,
     layer=None,
-    **kwargs
+    **kwargs,
 ):
     width = input_port.width
 
@@ -134,8 +173,7 @@ def connect_elec(
     def _bend_factory(width=width, radius=0):
         return bend_factory(width=width, radius=radius, layer=layer)
 
-    def _straight_factory(length=10.0, width=width):
-        return straight_factory(length=length, width=width, layer=layer)
+    _straight_factory = partial(straight_factory, layer=layer)
 
     if "bend_radius" in kwargs:
         bend_radius = kwargs.pop("bend_radius")
@@ -149,10 +187,40 @@ def connect_elec(
         bend_factory=_bend_factory,
         straight_factory=_straight_factory,
         taper_factory=None,
-        **kwargs
+        **kwargs,
     )
 
 
+def connect_elec_waypoints_bundle(
+    routes: List[ndarray],
+    wg_width: Union[float, List[float]] = 10.0,
+    layer: Union[Tuple[int, int], List[Tuple[int, int]]] = LAYER.M3,
+    **kwargs,
+) -> List[ComponentReference]:
+    """Returns the electrical traces of all the routes, as one wire component
+    per layer with a polygon per route, instead of a component per route
+    (`connect_elec_waypoints`).
+
+    routes: list of waypoints
+    wg_width: wire width, or one per route
+    layer: layer, or one per route
+    """
+    if isinstance(layer[0], (int, np.integer)):
+        layer = [layer] * len(routes)
+    polygons = get_wire_polygons(routes, wg_width)
+
+    layers = {}
+    for route_polygons, route_layer in zip(polygons, layer):
+        layers.setdefault(tuple(route_layer), []).extend(route_polygons)
+
+    refs = []
+    for route_layer, layer_polygons in layers.items():
+        c = Component(f"zz_wires_{clean_name(str(uuid.uuid4()))[:16]}")
+        c.add_polygon(layer_polygons, layer=route_layer)
+        refs.append(c.ref())
+    return refs
+
+
 if __name__ == "__main__":
     import pp
 
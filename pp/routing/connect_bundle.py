@@ -1,7 +1,7 @@
 """ route bundles of port (river routing)
 """
 
-from typing import Callable, List, Optional
+from typing import Callable, List, Optional, Tuple, Union
 
 import numpy as np
 from numpy import float64, ndarray
@@ -15,7 +15,7 @@ from pp.routing.connect import (
     connect_strip,
     connect_strip_way_points,
 )
-from pp.routing.manhattan import generate_manhattan_waypoints
+from pp.routing.manhattan import TOLERANCE, generate_manhattan_waypoints
 from pp.routing.path_length_matching import path_length_matched_points
 from pp.routing.u_groove_bundle import u_bundle_direct, u_bundle_indirect
 
@@ -30,6 +30,7 @@ def connect_bundle(
     separation=5.0,
     bend_radius=BEND_RADIUS,
     extension_length=0,
+    bundle_route_filter=None,
     **kwargs,
 ):
     """Connects bundle of ports using river routing.
@@ -42,6 +43,9 @@ def connect_bundle(
         separation: waveguide separation
         bend_radius: for the routes
         extension_length: adds waveguide extension
+        bundle_route_filter: function to connect all the routes at once
+            (e.g. `connect_strip_way_points_bundle`), used instead of
+            route_filter when the ports face each other or are perpendicular
 
     """
     # Accept dict or list
@@ -114,7 +118,9 @@ def connect_bundle(
             and end_angle == 90
             and y_start > y_end
         ):
-            return link_ports(**params, **kwargs)
+            return link_ports(
+                **params, bundle_route_filter=bundle_route_filter, **kwargs
+            )
 
         elif start_angle == end_angle:
             return u_bundle_direct(**params, **kwargs)
@@ -127,7 +133,7 @@ def connect_bundle(
 
     else:
         # return corner_bundle(**params, **kwargs)
-        return link_ports(**params, **kwargs)
+        return link_ports(**params, bundle_route_filter=bundle_route_filter, **kwargs)
         raise NotImplementedError("Routing along different axis not implemented yet")
 
 
@@ -158,6 +164,7 @@ def link_ports(
     end_ports: List[Port],
     separation: float = 5.0,
     route_filter: Callable = connect_strip_way_points,
+    bundle_route_filter: Optional[Callable] = None,
     **routing_params,
 ) -> List[ComponentReference]:
     r"""Semi auto-routing for two lists of ports.
@@ -172,6 +179,8 @@ def link_ports(
         bend_radius: If unspecified, attempts to get it from the waveguide definition of the first port in ports1
         route_filter: filter to apply to the manhattan waypoints
             e.g `connect_strip_way_points` for deep etch strip waveguide
+        bundle_route_filter: filter to apply to the waypoints of all the routes
+            at once, e.g `connect_strip_way_points_bundle`. Overrides route_filter
         end_straight_offset: offset to add at the end of each waveguide
         sort_ports: * True -> sort the ports according to the axis.
                     * False -> no sort applied
@@ -222,7 +231,12 @@ def link_ports(
         **routing_params,
     )
 
-    route_with_waveguides = [route_filter(route, **routing_params) for route in routes]
+    if bundle_route_filter:
+        route_with_waveguides = bundle_route_filter(routes, **routing_params)
+    else:
+        route_with_waveguides = [
+            route_filter(route, **routing_params) for route in routes
+        ]
 
     for p1, p2, route in zip(start_ports, end_ports, route_with_waveguides):
         # if ports are part of components (have parents) add connections to netlist
@@ -233,6 +247,62 @@ def link_ports(
     return route_with_waveguides
 
 
+def get_end_straights(
+    x1: ndarray,
+    x2: ndarray,
+    widths: ndarray,
+    separation: float,
+    end_offsets: Optional[ndarray] = None,
+    end_straight_offset: float = 15.0,
+) -> ndarray:
+    """Returns the end_straight of each route of a bundle, in one sweep over
+    the ports sorted by x1.
+
+    A route starts a new group (track assignment) when it is decoupled from
+    the previous one. Within a group each route moves its end_straight by the
+    spacing to its neighbours: up if it goes towards +x (x2 >= x1),
+    down otherwise. Each group is then shifted so its shortest end_straight
+    is end_straight_offset.
+
+    Args:
+        x1: start port positions along the bundle width, sorted
+        x2: end port positions along the bundle width
+        widths: route widths
+        separation: route spacing
+        end_offsets: end port positions along the routes, relative to the first
+        end_straight_offset: shortest end straight of each group
+    """
+    x1 = np.asarray(x1, dtype=float)
+    x2 = np.asarray(x2, dtype=float)
+    w = np.asarray(widths, dtype=float)
+    n = len(x1)
+    if end_offsets is None:
+        end_offsets = np.zeros(n)
+
+    # spacing to the widest neighbour
+    if n > 1:
+        w_neighbour = np.maximum(np.r_[w[1:], w[-2]], np.r_[w[1], w[:-1]])
+    else:
+        w_neighbour = w
+    spacing = 0.5 * (w + w_neighbour) + separation
+
+    # are_decoupled from the previous route, as one vectorized test
+    decoupled = np.zeros(n, dtype=bool)
+    decoupled[1:] = (x2[1:] >= x1[:-1] + spacing[1:]) & (
+        x1[1:] >= x2[:-1] + spacing[1:]
+    )
+    steps = np.where(decoupled, 0, np.where(x2 >= x1, spacing, -spacing))
+
+    # cumulative steps within each group
+    group = np.cumsum(decoupled)
+    starts = np.r_[0, np.flatnonzero(decoupled)]
+    steps_sum = np.cumsum(steps)
+    end_straights = steps_sum - (steps_sum - steps)[starts][group] + end_offsets
+
+    group_min = np.minimum.reduceat(end_straights, starts)
+    return np.maximum(end_straights - group_min[group], 0) + end_straight_offset
+
+
 def link_ports_routes(
     start_ports: List[Port],
     end_ports: List[Port],
@@ -283,161 +353,201 @@ def link_ports_routes(
             )
         ]
 
-    elems = []
-
-    # Contains end_straight of tracks which need to be adjusted together
-    end_straights_in_group = []
-
-    # Once a group is finished, all the lengths are appended to end_straights
-    end_straights = []
-
     # Axis along which we sort the ports
     if axis in ["X", "x"]:
         f_key1 = get_port_y
-        # f_key2 = get_port_y
     else:
         f_key1 = get_port_x
-        # f_key2 = get_port_x
-
-    # if sort_ports:
-    #     ports1.sort(key=f_key1)
-    #     ports2.sort(key=f_key2)
 
     ports2_by1 = {p1: p2 for p1, p2 in zip(ports1, ports2)}
     if sort_ports:
         ports1.sort(key=f_key1)
         ports2 = [ports2_by1[p1] for p1 in ports1]
 
-    # Keep track of how many ports should be routed together
-    number_o_connectors_in_group = 0
-
-    if axis in ["X", "x"]:
-        x1_prev = get_port_y(ports1[0])
-        x2_prev = get_port_y(ports2[0])
-        y0 = get_port_x(ports2[0])
-        y1 = get_port_x(ports1[0])
-    else:  # X axis
-        x1_prev = get_port_x(ports1[0])
-        x2_prev = get_port_x(ports2[0])
-        y0 = get_port_y(ports2[0])
-        y1 = get_port_y(ports1[0])
-
-    s = sign(y0 - y1)
-    curr_end_straight = 0
-
-    end_straight_offset = end_straight_offset or 15.0
-
-    Le = end_straight_offset
-
-    has_close_x_ports = False
-    close_ports_thresh = 2 * bend_radius + 1.0
-
-    # First pass - loop on all the ports to find the tentative end_straights
-
-    _w = get_port_width
-
-    for i in range(len(ports1)):
-        if axis in ["X", "x"]:
-            x1 = get_port_y(ports1[i])
-            x2 = get_port_y(ports2[i])
-            y = get_port_x(ports2[i])
-        else:
-            x1 = get_port_x(ports1[i])
-            x2 = get_port_x(ports2[i])
-            y = get_port_y(ports2[i])
-
-        dx = abs(x2 - x1)
-        if dx < close_ports_thresh:
-            has_close_x_ports = True
-
-        # Compute the metal separation to use. This depends on the adjacent metal
-        # track widths
-        if i != len(ports1) - 1 and i != 0:
-            # Deal with any track which is not on the edge
-            max_width = max(_w(ports1[i + 1]), _w(ports1[i - 1]))
-            curr_sep = 0.5 * (_w(ports1[i]) + max_width) + separation
-
-        elif i == 0:
-            # Deal with start edge case
-            curr_sep = separation + 0.5 * (_w(ports1[0]) + _w(ports1[1]))
-
-        elif i == len(ports1) - 1:
-            # Deal with end edge case
-            curr_sep = separation + 0.5 * (_w(ports1[-2]) + _w(ports1[-1]))
-
-        if are_decoupled(x2, x2_prev, x1, x1_prev, sep=curr_sep):
-            # If this metal track does not impact the previous one, then start a new
-            # group.
-            L = min(end_straights_in_group)
-            end_straights += [max(x - L, 0) + Le for x in end_straights_in_group]
-
-            # Start new group
-            end_straights_in_group = []
-            curr_end_straight = 0
-            number_o_connectors_in_group = 0
-
-        else:
-            if x2 >= x1:
-                curr_end_straight += curr_sep
-            else:
-                curr_end_straight -= curr_sep
-
-        end_straights_in_group.append(curr_end_straight + (y - y0) * s)
-        number_o_connectors_in_group += 1
-
-        x1_prev = x1
-        x2_prev = x2
-
-    # Append the last group
-    L = min(end_straights_in_group)
-
-    end_straights += [max(x - L, 0) + Le for x in end_straights_in_group]
+    # x: along the bundle width, y: along the routes
+    ix, iy = (1, 0) if axis in ["X", "x"] else (0, 1)
+    xy1 = np.array([p.midpoint for p in ports1], dtype=float)
+    xy2 = np.array([p.midpoint for p in ports2], dtype=float)
+    x1 = xy1[:, ix]
+    x2 = xy2[:, ix]
+    y = xy2[:, iy]
+
+    s = sign(y[0] - xy1[0, iy])
+    end_straights = get_end_straights(
+        x1,
+        x2,
+        widths=[p.width for p in ports1],
+        separation=separation,
+        end_offsets=(y - y[0]) * s,
+        end_straight_offset=end_straight_offset or 15.0,
+    )
 
     if compute_array_separation_only:
         # If there is no port too close to each other in x, then there are
         # only two bends per route
-        if not has_close_x_ports:
+        close_ports_thresh = 2 * bend_radius + 1.0
+        if np.all(np.abs(x2 - x1) >= close_ports_thresh):
             return max(end_straights) + 2 * bend_radius
         else:
             return max(end_straights) + 4 * bend_radius
 
     # Second pass - route the ports pairwise
     N = len(ports1)
-    for i in range(N):
-        if axis in ["X", "x"]:
-            x1 = get_port_y(ports1[i])
-            x2 = get_port_y(ports2[i])
-        else:
-            x1 = get_port_x(ports1[i])
-            x2 = get_port_x(ports2[i])
+    is_batched = np.zeros(N, dtype=bool)
+    elems = [None] * N
+    if route_filter is generate_manhattan_waypoints and kwargs.get("bend90") is None:
+        # the one and two bend routes all at once, the others one by one
+        points, is_batched = get_bundle_waypoints(
+            ports1,
+            ports2,
+            end_straights,
+            bend_radius=bend_radius,
+            start_straight=start_straight,
+            min_straight=kwargs.get("min_straight", 0.01),
+        )
+        elems = list(points)
+
+    for i in np.flatnonzero(~is_batched):
+        elems[i] = route_filter(
+            ports1[i],
+            ports2[i],
+            start_straight=start_straight,
+            end_straight=end_straights[i],
+            bend_radius=bend_radius,
+            **kwargs,
+        )
+    return elems
 
-        dx = abs(x2 - x1)
 
-        # If both ports are aligned, we just need a straight line
-        if dx < tol:
-            elems += [
-                route_filter(
-                    ports1[i],
-                    ports2[i],
-                    start_straight=start_straight,
-                    end_straight=end_straights[i],
-                    bend_radius=bend_radius,
-                    **kwargs,
-                )
-            ]  #
+def _direction(angle: float) -> ndarray:
+    a = np.deg2rad(angle)
+    return np.round([np.cos(a), np.sin(a)])
 
-        else:
-            elems += [
-                route_filter(
-                    ports1[i],
-                    ports2[i],
-                    start_straight=start_straight,
-                    end_straight=end_straights[i],
-                    bend_radius=bend_radius,
-                    **kwargs,
+
+def get_bundle_waypoints(
+    start_ports: List[Port],
+    end_ports: List[Port],
+    end_straights: List[float],
+    bend_radius: float = BEND_RADIUS,
+    start_straight: float = 0.01,
+    min_straight: float = 0.01,
+    tol: float = TOLERANCE,
+) -> Tuple[ndarray, ndarray]:
+    """Returns the waypoints of all the routes of a bundle as one (N, K, 2)
+    array, and a (N,) mask of the routes that have them.
+
+    Same waypoints as `generate_manhattan_waypoints` for those routes:
+    facing ports with enough lateral offset get two bends (K=4) and
+    perpendicular ports with enough room get one bend (K=3).
+    The other routes (aligned ports, U-turns, ports too close) are masked out.
+
+    Args:
+        start_ports: all facing the same direction
+        end_ports: all facing the same direction
+        end_straights: straight length before each end port
+        bend_radius: bend size
+        start_straight: straight length after each start port
+        min_straight: min straight length between two bends
+        tol: tolerance
+    """
+    p1 = np.array([p.midpoint for p in start_ports], dtype=float)
+    p2 = np.array([p.midpoint for p in end_ports], dtype=float)
+    e = np.asarray(end_straights, dtype=float)
+    r = bend_radius
+    s = start_straight
+
+    # u: start direction, w: arrival direction at the end ports
+    u = _direction(start_ports[0].orientation)
+    w = -_direction(end_ports[0].orientation)
+    dp = p2 - p1
+    along = dp @ u
+
+    if np.allclose(u, w):
+        # S-route: p1 -> c1 -> c2 -> p2, with c2 at e + r before p2
+        lateral = dp @ np.array([-u[1], u[0]])
+        c1 = p1 + np.outer(along - e - r, u)
+        c2 = p2 - np.outer(e + r, u)
+        points = np.stack([p1, c1, c2, p2], axis=1)
+        mask = (along - (2 * r + e + s) > -tol) & (
+            np.abs(lateral) - (2 * r + min_straight) > -tol
+        )
+    elif abs(u @ w) < tol:
+        # L-route: p1 -> c -> p2
+        c = p1 + np.outer(along, u)
+        points = np.stack([p1, c, p2], axis=1)
+        mask = (along - (s + r) > -tol) & (dp @ w - (e + r) > -tol)
+    else:
+        points = np.stack([p1, p2], axis=1)
+        mask = np.zeros(len(p1), dtype=bool)
+    return points, mask
+
+
+def get_fanout_waypoints(
+    start_ports: List[Port],
+    end_ports: List[Port],
+    bend_size: Union[float, List[float]],
+    start_straight: Union[float, List[float]] = 0.01,
+    end_straight: float = 0.01,
+    min_straight: float = 0.01,
+) -> List[ndarray]:
+    """Returns the waypoints of `generate_manhattan_waypoints` for each pair of
+    ports, for bends of size `bend_size` (the radius of a circular bend, half
+    the width of an electrical corner).
+
+    The straight, one and two bend routes between ports with the same
+    orientations are computed at once with `get_bundle_waypoints`,
+    the others one by one.
+
+    Args:
+        start_ports: list of ports
+        end_ports: list of ports
+        bend_size: bend size, or one per route
+        start_straight: straight length after the start port, or one per route
+        end_straight: straight length before the end port
+        min_straight: min straight length between two bends
+    """
+    n = len(start_ports)
+    sizes = np.broadcast_to(np.asarray(bend_size, dtype=float), (n,))
+    start_straights = np.broadcast_to(np.asarray(start_straight, dtype=float), (n,))
+
+    groups = {}
+    for i, (p1, p2) in enumerate(zip(start_ports, end_ports)):
+        key = (round(p1.orientation) % 360, round(p2.orientation) % 360, sizes[i])
+        groups.setdefault(key, []).append(i)
+
+    routes = [None] * n
+    for (angle, _, size), index in groups.items():
+        points, mask = get_bundle_waypoints(
+            [start_ports[i] for i in index],
+            [end_ports[i] for i in index],
+            end_straights=np.full(len(index), end_straight),
+            bend_radius=size,
+            start_straight=start_straights[index],
+            min_straight=min_straight,
+        )
+        # facing ports on the same line go straight
+        u = _direction(angle)
+        dp = points[:, -1] - points[:, 0]
+        straight = (np.abs(dp @ np.array([-u[1], u[0]])) < TOLERANCE) & (
+            dp @ u > TOLERANCE
+        )
+        straight &= points.shape[1] == 4
+
+        for k, i in enumerate(index):
+            if mask[k]:
+                routes[i] = points[k]
+            elif straight[k]:
+                routes[i] = points[k, [0, -1]]
+            else:
+                routes[i] = generate_manhattan_waypoints(
+                    start_ports[i],
+                    end_ports[i],
+                    bend_radius=size,
+                    start_straight=start_straights[i],
+                    end_straight=end_straight,
+                    min_straight=min_straight,
                 )
-            ]
-    return elems
+    return routes
 
 
 def generate_waypoints_connect_bundle(*args, **kwargs):
@@ -468,6 +578,8 @@ def connect_bundle_path_length_match(
     nb_loops=1,
     modify_segment_i=-2,
     route_filter=connect_strip_way_points,
+    tolerance=None,
+    max_loop_length=None,
     **kwargs,
 ):
     """
@@ -481,6 +593,8 @@ def connect_bundle_path_length_match(
         nb_loops: number of extra loops added in the path
         modify_segment_i: index of the segment which accomodates the new turns default is next to last segment
         route_filter: connect_strip_way_points
+        tolerance: length spread below which the routes are not modified
+        max_loop_length: max extra length of each loop arm, adds loops as needed
         **kwargs: extra arguments for inner call to generate_waypoints_connect_bundle
 
     Returns:
@@ -513,6 +627,8 @@ def connect_bundle_path_length_match(
         bend_radius=bend_radius,
         nb_loops=nb_loops,
         modify_segment_i=modify_segment_i,
+        tolerance=tolerance,
+        max_loop_length=max_loop_length,
     )
     return [route_filter(waypoints) for waypoints in list_of_waypoints]
 
@@ -615,9 +731,6 @@ def get_min_spacing(
     else:
         axis = "Y"
 
-    j = 0
-    min_j = 0
-    max_j = 0
     if sort_ports:
         if axis in ["X", "x"]:
             ports1.sort(key=get_port_y)
@@ -626,22 +739,12 @@ def get_min_spacing(
             ports1.sort(key=get_port_x)
             ports2.sort(key=get_port_x)
 
-    for i, _ in enumerate(ports1):
-        if axis in ["X", "x"]:
-            x1 = get_port_y(ports1[i])
-            x2 = get_port_y(ports2[i])
-        else:
-            x1 = get_port_x(ports1[i])
-            x2 = get_port_x(ports2[i])
-        if x2 >= x1:
-            j += 1
-        else:
-            j -= 1
-        if j < min_j:
-            min_j = j
-        if j > max_j:
-            max_j = j
-    j = 0
+    i = 1 if axis in ["X", "x"] else 0
+    x1 = np.array([p.midpoint[i] for p in ports1])
+    x2 = np.array([p.midpoint[i] for p in ports2])
+    j = np.cumsum(np.where(x2 >= x1, 1, -1))
+    min_j = min(int(j.min()), 0)
+    max_j = max(int(j.max()), 0)
 
     return (max_j - min_j) * sep + 2 * radius + 1.0
 
@@ -1047,7 +1150,7 @@ def test_facing_ports():
 
 
 def demo_connect_bundle():
-    """ combines all the connect_bundle tests """
+    """combines all the connect_bundle tests"""
 
     y = 400.0
     x = 500
@@ -1095,6 +1198,64 @@ def test_connect_bundle_small():
     return c
 
 
+def test_link_ports_end_straights():
+    xs_top = [-100, -90, -80, 0, 10, 20, 40, 50, 80, 90, 100, 105, 110, 115, 400, 410]
+    xs_bottom = [-300, -250, -200, -120, 30, 50, 55, 100]
+    xs_bottom += [200, 250, 300, 350, 400, 450, 380, 420]
+    widths = [0.5, 0.5, 1, 0.5, 2, 0.5, 0.5, 0.5, 0.5, 3, 0.5, 0.5, 0.5, 0.5, 0.5, 0.5]
+    N = len(xs_top)
+    top_ports = [Port(f"top_{i}", (xs_top[i], 0), widths[i], 270) for i in range(N)]
+    bottom_ports = [
+        Port(f"bottom_{i}", (xs_bottom[i], -400 - (i % 3) * 5), widths[i], 90)
+        for i in range(N)
+    ]
+
+    # same end straights as the previous loop over the ports
+    end_straights = link_ports_routes(
+        top_ports,
+        bottom_ports,
+        separation=5.0,
+        route_filter=lambda p1, p2, end_straight, **kwargs: end_straight,
+    )
+    expected = [32.75, 32.0, 31.25, 15.0, 15.0, 26.25, 21.75, 32.25, 44.0]
+    expected += [40.75, 52.5, 63.0, 58.5, 69.0, 68.5, 15.0]
+    assert np.allclose(end_straights, expected)
+    assert get_min_spacing(top_ports, bottom_ports) == 81.0
+
+
+def test_connect_bundle_batched():
+    from pp.routing.connect import connect_strip_way_points_bundle
+
+    xs_top = [-100, -90, -80, 0, 10, 20, 40, 50, 80, 90, 100, 105, 110, 115]
+    N = len(xs_top)
+    xs_bottom = [(i - N / 2) * 127.0 for i in range(N)]
+    top_ports = [Port(f"top_{i}", (xs_top[i], 0), 0.5, 270) for i in range(N)]
+    bottom_ports = [
+        Port(f"bottom_{i}", (xs_bottom[i], -400), 0.5, 90) for i in range(N)
+    ]
+
+    points, is_batched = get_bundle_waypoints(
+        top_ports, bottom_ports, end_straights=[15.0] * N, bend_radius=10.0
+    )
+    assert points.shape == (N, 4, 2)
+    for p1, p2, waypoints, batched in zip(top_ports, bottom_ports, points, is_batched):
+        if batched:
+            expected = generate_manhattan_waypoints(
+                p1, p2, bend_radius=10.0, end_straight=15.0
+            )
+            assert np.allclose(waypoints, expected)
+
+    routes = connect_bundle(top_ports, bottom_ports)
+    routes_batched = connect_bundle(
+        top_ports, bottom_ports, bundle_route_filter=connect_strip_way_points_bundle
+    )
+    for route, route_batched in zip(routes, routes_batched):
+        assert np.isclose(route.parent.length, route_batched.parent.length)
+        assert np.allclose(
+            route.ports["output"].midpoint, route_batched.ports["output"].midpoint
+        )
+
+
 if __name__ == "__main__":
     import pp
 
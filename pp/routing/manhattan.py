@@ -1,10 +1,13 @@
 import uuid
-from typing import Callable, Dict, List, Optional, Tuple
+from functools import partial
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
+import gdspy
 import numpy as np
 from numpy import bool_, float64, ndarray
 
 import pp
+from pp.cell import CACHE
 from pp.component import Component, ComponentReference
 from pp.components import waveguide
 from pp.geo_utils import angles_deg
@@ -17,6 +20,61 @@ RAD2DEG = 1 / DEG2RAD
 
 O2D = {0: "East", 180: "West", 90: "North", 270: "South"}
 
+# route segments: factory key -> (component, whether it is in pp.cell.CACHE)
+# least recently used first, at most SEGMENT_CACHE_SIZE segments
+SEGMENT_CACHE: Dict[Tuple[Any, ...], Tuple[Component, bool]] = {}
+SEGMENT_CACHE_SIZE = 1024
+
+
+def clear_segment_cache() -> None:
+    """Clears the cache of route segments (also cleared by pp.clear_cache)."""
+    SEGMENT_CACHE.clear()
+
+
+def _get_factory_key(factory: Callable, kwargs: Dict[str, Any]) -> Optional[Tuple]:
+    """Returns a hashable key for factory(**kwargs), None if it has none.
+
+    Functions defined inside other functions are new objects on every call,
+    so they are not cached.
+    """
+    args = ()
+    if isinstance(factory, partial):
+        args = factory.args
+        kwargs = {**factory.keywords, **kwargs}
+        factory = factory.func
+    if "<locals>" in getattr(factory, "__qualname__", "<locals>"):
+        return None
+    key = (factory, args, tuple(sorted(kwargs.items())))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def get_segment(factory: Callable, **kwargs) -> Component:
+    """Returns factory(**kwargs), reusing the component of a previous call
+    with the same factory and arguments.
+
+    round_corners gets its straights from here, so all the routes share the
+    straights with the same factory, length and width.
+    """
+    key = _get_factory_key(factory, kwargs)
+    if key is None:
+        return factory(**kwargs)
+    if key in SEGMENT_CACHE:
+        component, cached = SEGMENT_CACHE.pop(key)
+        # once released from pp.cell.CACHE the factory builds new components
+        if not cached or CACHE.get(component.name) is component:
+            SEGMENT_CACHE[key] = (component, cached)
+            return component
+
+    component = factory(**kwargs)
+    SEGMENT_CACHE[key] = (component, CACHE.get(component.name) is component)
+    if len(SEGMENT_CACHE) > SEGMENT_CACHE_SIZE:
+        SEGMENT_CACHE.pop(next(iter(SEGMENT_CACHE)))
+    return component
+
 
 def _get_ports_facing(ports: Dict[str, Port], orientation: int = 0) -> List[Port]:
     return [p for p in ports.values() if p.orientation == orientation]
@@ -40,7 +98,7 @@ def _get_unique_port_facing(ports: Dict[str, Port], orientation: int = 0) -> Lis
 
 
 def _get_bend_ports(bend: Component) -> List[Port]:
-    """ Returns West and North facing ports for bend.
+    """Returns West and North facing ports for bend.
 
     Any standard bend/corner has two ports: one facing west and one facing north
     Returns these two ports in this order.
@@ -68,6 +126,35 @@ def _get_straight_ports(straight: Component) -> List[Port]:
     return p_w + p_e
 
 
+def _get_straight(
+    straight_factory: Callable,
+    length: float,
+    width: float,
+    ports: Optional[List[str]] = None,
+) -> Tuple[Component, List[str]]:
+    """Returns a straight, with its length snapped to the 1nm grid, and its
+    west and east port names."""
+    length = round(length * 1e3) / 1e3
+    wg = get_segment(straight_factory, length=length, width=width)
+    ports = ports or [p.name for p in _get_straight_ports(wg)]
+    if np.any(wg.ports[ports[0]].midpoint != 0):
+        wg.move(wg.ports[ports[0]], (0, 0))
+    return wg, ports
+
+
+def _merge_polygons(component: Component) -> None:
+    """Replaces the references and polygons of component by their union,
+    one polygon per layer."""
+    polygons = component.get_polygons(by_spec=True)
+    component.remove(component.references + component.polygons)
+    for (layer, datatype), points in polygons.items():
+        merged = gdspy.boolean(
+            points, None, "or", max_points=0, layer=layer, datatype=datatype
+        )
+        if merged is not None:
+            component.add_polygon(merged)
+
+
 def gen_sref(
     structure: Component,
     rotation_angle: int,
@@ -443,6 +530,7 @@ def round_corners(
     straight_factory_fall_back_no_taper=None,
     mirror_straight=False,
     straight_ports=None,
+    flatten=False,
 ):
     """Return cell with rounded waveguide route from a list of manhattan points.
 
@@ -457,6 +545,7 @@ def round_corners(
         straight_factory_fall_back_no_taper: factory to use for straights in case there is no space to put a pair of tapers
         mirror_straight: mirror_straight waveguide
         straight_ports: port names for straights. If not specified, will use some heuristic to find them
+        flatten: merges the route into one polygon per layer instead of references
     """
     # If there is a taper, make sure its length is known
     if taper:
@@ -526,6 +615,9 @@ def round_corners(
     ]
 
     wg_refs = []
+    if taper is not None:
+        taper_west, taper_east = [p.name for p in _get_straight_ports(taper)]
+
     for straight_origin, angle, length in straight_sections:
         with_taper = False
         wg_width = list(bend90.ports.values())[0].width
@@ -540,30 +632,26 @@ def round_corners(
             # Taper starts where straight would have started
             taper_origin = straight_origin
 
-            pname_west, pname_east = [p.name for p in _get_straight_ports(taper)]
             taper_ref = taper.ref(
-                position=taper_origin, port_id=pname_west, rotation=angle
+                position=taper_origin, port_id=taper_west, rotation=angle
             )
 
-            wg_width = taper.ports[pname_east].width
+            wg_width = taper.ports[taper_east].width
 
             cell.add(taper_ref)
             wg_refs += [taper_ref]
 
             # Update start straight position
-            straight_origin = taper_ref.ports[pname_east].midpoint
+            straight_origin = taper_ref.ports[taper_east].midpoint
 
         # Straight waveguide
         if with_taper or taper is None:
-            wg = straight_factory(length=length, width=wg_width)
+            factory = straight_factory
         else:
-            wg = straight_factory_fall_back_no_taper(length=length, width=wg_width)
-
-        if straight_ports is None:
-            straight_ports = [p.name for p in _get_straight_ports(wg)]
+            factory = straight_factory_fall_back_no_taper
+        wg, straight_ports = _get_straight(factory, length, wg_width, straight_ports)
         pname_west, pname_east = straight_ports
 
-        wg.move(wg.ports[pname_west], (0, 0))
         wg_ref = pp.ComponentReference(wg)
         if mirror_straight:
             wg_ref.reflect_v(list(wg_ref.ports.values())[0].name)
@@ -579,9 +667,8 @@ def round_corners(
             # Origin at end of straight waveguide, starting from east side of taper
 
             taper_origin = wg_ref.ports[pname_east]
-            pname_west, pname_east = [p.name for p in _get_straight_ports(taper)]
             taper_ref = taper.ref(
-                position=taper_origin, port_id=pname_east, rotation=angle + 180
+                position=taper_origin, port_id=taper_east, rotation=angle + 180
             )
 
             cell.add(taper_ref)
@@ -599,9 +686,286 @@ def round_corners(
     cell.settings_changed["length"] = total_length
     cell.length = total_length
     cell.function_name = "waveguide"
+    if flatten:
+        _merge_polygons(cell)
     return cell
 
 
+def _transform_points(points: ndarray, angles: ndarray, mirror: ndarray) -> ndarray:
+    """Returns points (..., 2) mirrored across the x axis where mirror is True,
+    then rotated by angles (..., multiples of 90 degrees)."""
+    y = np.where(mirror, -points[..., 1], points[..., 1])
+    c = np.round(np.cos(DEG2RAD * angles))
+    s = np.round(np.sin(DEG2RAD * angles))
+    return np.stack([c * points[..., 0] - s * y, s * points[..., 0] + c * y], axis=-1)
+
+
+def _round_corners_array(
+    points: ndarray,
+    bend90: Component,
+    straight_factory: Callable,
+    taper: Optional[Component] = None,
+    straight_factory_fall_back_no_taper: Optional[Callable] = None,
+    mirror_straight: bool = False,
+    straight_ports: Optional[List[str]] = None,
+) -> List[Component]:
+    """Returns one route cell for each route of points (N, K, 2), same
+    geometry as round_corners, with all the bends and straights placed at once.
+    """
+    n_routes, n_points = points.shape[:2]
+    d = np.diff(points, axis=1)
+    is_h = np.abs(d[..., 1]) < TOLERANCE
+    is_v = np.abs(d[..., 0]) < TOLERANCE
+    if not np.all(is_h | is_v):
+        i, j = np.argwhere(~(is_h | is_v))[0]
+        raise ValueError(
+            f"Waveguide {points[i, j]} {points[i, j + 1]} is not manhattan"
+        )
+    sign = np.sign(np.where(is_h, d[..., 0], d[..., 1]))
+    angles = np.where(is_h, np.where(sign > 0, 0, 180), np.where(sign > 0, 90, 270))
+
+    # bends: the west port goes on bend_origin, rotated like the incoming segment
+    b_west, b_north = _get_bend_ports(bend90)
+    bsx, bsy = b_north.midpoint - b_west.midpoint
+    s1 = sign[:, :-1]
+    s2 = np.sign(np.where(is_h[:, :-1], d[:, 1:, 1], d[:, 1:, 0]))
+    bend_rotation = angles[:, :-1]
+    bend_mirror = np.where(is_h[:, :-1], s1 * s2 < 0, s1 * s2 > 0)
+    bend_origin = points[:, 1:-1] - np.where(
+        is_h[:, :-1, None],
+        np.stack([s1 * bsx, 0 * s1], axis=-1),
+        np.stack([0 * s1, s1 * bsy], axis=-1),
+    )
+    bend_ref_origin = bend_origin - _transform_points(
+        b_west.midpoint, bend_rotation, bend_mirror
+    )
+    bend_north = bend_origin + _transform_points(
+        b_north.midpoint - b_west.midpoint, bend_rotation, bend_mirror
+    )
+
+    # straight sections go from the start (or a bend north port) to the next
+    # bend origin (or the end)
+    starts = np.concatenate([points[:, :1], bend_north], axis=1)
+    ends = np.concatenate([bend_origin, points[:, -1:]], axis=1)
+    lengths = np.where(
+        is_h,
+        np.abs(ends[..., 0] - starts[..., 0]),
+        np.abs(ends[..., 1] - starts[..., 1]),
+    )
+
+    bend_length = bend90.info.get("length", 0)
+    total_lengths = (n_points - 2) * bend_length + lengths.sum(axis=1)
+
+    wg_width = list(bend90.ports.values())[0].width
+    if taper is not None:
+        taper_west, taper_east = _get_straight_ports(taper)
+        taper_length = taper.info["length"]
+        with_taper = lengths > 2 * taper_length + 1.0
+        straight_lengths = np.where(with_taper, lengths - 2 * taper_length, lengths)
+    else:
+        with_taper = np.zeros_like(lengths, dtype=bool)
+        straight_lengths = lengths
+
+    # one straight component for each (with taper, length)
+    keys = np.stack([with_taper, np.round(straight_lengths * 1e3)], axis=-1)
+    unique_keys, inverse = np.unique(keys.reshape(-1, 2), axis=0, return_inverse=True)
+    inverse = inverse.reshape(lengths.shape)
+    straights = []
+    for has_taper, length in unique_keys:
+        if has_taper:
+            factory = straight_factory
+            width = taper_east.width
+        elif taper is None:
+            factory = straight_factory
+            width = wg_width
+        else:
+            factory = straight_factory_fall_back_no_taper or straight_factory
+            width = wg_width
+        wg, straight_ports = _get_straight(factory, length / 1e3, width, straight_ports)
+        straights.append((wg, wg.ports[straight_ports[1]].midpoint))
+    straight_east = np.array([east for wg, east in straights])[inverse]
+
+    wg_origin = starts
+    if taper is not None:
+        taper_origin = starts - _transform_points(taper_west.midpoint, angles, False)
+        wg_origin = np.where(
+            with_taper[..., None],
+            taper_origin + _transform_points(taper_east.midpoint, angles, False),
+            starts,
+        )
+        wg_east = wg_origin + _transform_points(straight_east, angles, mirror_straight)
+        taper2_origin = wg_east - _transform_points(
+            taper_east.midpoint, angles + 180, False
+        )
+
+    cells = []
+    for i in range(n_routes):
+        cell = pp.Component(f"zz_conn_{clean_name(str(uuid.uuid4()))[:16]}")
+        refs = []
+        for j in range(n_points - 1):
+            if j > 0:
+                cell.add(
+                    pp.ComponentReference(
+                        bend90,
+                        origin=bend_ref_origin[i, j - 1],
+                        rotation=bend_rotation[i, j - 1],
+                        x_reflection=bend_mirror[i, j - 1],
+                    )
+                )
+            angle = angles[i, j]
+            if with_taper[i, j]:
+                refs.append(
+                    pp.ComponentReference(
+                        taper, origin=taper_origin[i, j], rotation=angle
+                    )
+                )
+            refs.append(
+                pp.ComponentReference(
+                    straights[inverse[i, j]][0],
+                    origin=wg_origin[i, j],
+                    rotation=angle,
+                    x_reflection=mirror_straight,
+                )
+            )
+            if with_taper[i, j]:
+                refs.append(
+                    pp.ComponentReference(
+                        taper, origin=taper2_origin[i, j], rotation=angle + 180
+                    )
+                )
+        cell.add(refs)
+
+        port_index_out = 0 if with_taper[i, -1] else 1
+        cell.add_port(name="input", port=list(refs[0].ports.values())[0])
+        cell.add_port(name="output", port=list(refs[-1].ports.values())[port_index_out])
+        total_length = float(total_lengths[i])
+        cell.info["length"] = total_length
+        cell.settings["length"] = total_length
+        cell.settings_changed = (
+            cell.settings_changed if hasattr(cell, "settings_changed") else {}
+        )
+        cell.settings_changed["length"] = total_length
+        cell.length = total_length
+        cell.function_name = "waveguide"
+        cells.append(cell)
+    return cells
+
+
+def round_corners_bundle(
+    routes,
+    bend90: Component,
+    straight_factory: Callable,
+    taper: Optional[Component] = None,
+    straight_factory_fall_back_no_taper: Optional[Callable] = None,
+    mirror_straight: bool = False,
+    straight_ports: Optional[List[str]] = None,
+) -> List[ComponentReference]:
+    """Returns `[round_corners(points, ...) for points in routes]`, placing the
+    bends and straights of all the routes with the same number of waypoints
+    at once.
+
+    Args:
+        routes: (N, K, 2) array or list of waypoint arrays
+        bend90: the bend to use for 90Deg turns
+        straight_factory: the straight factory to use to generate straight portions
+        taper: taper for straight portions. If None, no tapering
+        straight_factory_fall_back_no_taper: factory for straights too short for tapers
+        mirror_straight: mirror_straight waveguide
+        straight_ports: port names for straights
+    """
+    if taper and "length" not in taper.info:
+        _taper_ports = list(taper.ports.values())
+        taper.info["length"] = _taper_ports[-1].x - _taper_ports[0].x
+
+    routes = [remove_flat_angles(np.asarray(points, dtype=float)) for points in routes]
+    groups = {}
+    for i, points in enumerate(routes):
+        groups.setdefault(len(points), []).append(i)
+
+    cells = [None] * len(routes)
+    for indices in groups.values():
+        group_cells = _round_corners_array(
+            np.stack([routes[i] for i in indices]),
+            bend90=bend90,
+            straight_factory=straight_factory,
+            taper=taper,
+            straight_factory_fall_back_no_taper=straight_factory_fall_back_no_taper,
+            mirror_straight=mirror_straight,
+            straight_ports=straight_ports,
+        )
+        for i, cell in zip(indices, group_cells):
+            cells[i] = cell
+    return [cell.ref() for cell in cells]
+
+
+def get_wire_polygons(routes, widths) -> List[List[ndarray]]:
+    """Returns the polygons of each route: a wire of its width along the
+    waypoints, with square corners and flush ends (the shape of round_corners
+    with an electrical corner), for all the routes with the same number of
+    waypoints at once.
+
+    Each route is one polygon, unless its segments are too short for the
+    corners: then it is the union of the segments.
+
+    Args:
+        routes: list of Manhattan waypoint arrays
+        widths: wire width, or one per route
+    """
+    widths = np.broadcast_to(np.asarray(widths, dtype=float), (len(routes),))
+    cleaned = []
+    for points in routes:
+        points = np.asarray(points, dtype=float)
+        keep = np.r_[True, np.any(np.abs(np.diff(points, axis=0)) > TOLERANCE, 1)]
+        cleaned.append(remove_flat_angles(points[keep]))
+
+    groups = {}
+    for i, points in enumerate(cleaned):
+        groups.setdefault(len(points), []).append(i)
+
+    polygons = [None] * len(routes)
+    for indices in groups.values():
+        points = np.stack([cleaned[i] for i in indices])
+        d = np.diff(points, axis=1)
+        t = d / np.linalg.norm(d, axis=-1, keepdims=True)
+        normal = np.stack([-t[..., 1], t[..., 0]], axis=-1)
+        n_in = np.concatenate([normal[:, :1], normal], axis=1)
+        n_out = np.concatenate([normal, normal[:, -1:]], axis=1)
+        # miter: w/2 along each normal, (n_in + n_out) * w/2 at 90 deg corners
+        miter = (n_in + n_out) / (1 + np.sum(n_in * n_out, axis=-1, keepdims=True))
+        offset = miter * widths[indices, None, None] / 2
+        group_polygons = np.concatenate(
+            [points + offset, (points - offset)[:, ::-1]], axis=1
+        )
+
+        # a segment needs w/2 for the corner at each of its ends
+        length = np.linalg.norm(d, axis=-1)
+        corners = np.ones(length.shape)
+        corners[:, 0] -= 0.5
+        corners[:, -1] -= 0.5
+        too_short = np.any(length - corners * widths[indices, None] < -TOLERANCE, 1)
+
+        for i, polygon, short in zip(indices, group_polygons, too_short):
+            if short:
+                polygons[i] = _get_wire_segments_union(cleaned[i], widths[i])
+            else:
+                polygons[i] = [polygon]
+    return polygons
+
+
+def _get_wire_segments_union(points: ndarray, width: float) -> List[ndarray]:
+    """Returns the union of the segments of a wire, each one extended by
+    width/2 into the corners."""
+    rectangles = []
+    n = len(points) - 1
+    for i, (p0, p1) in enumerate(zip(points[:-1], points[1:])):
+        t = (p1 - p0) / np.linalg.norm(p1 - p0)
+        normal = np.array([-t[1], t[0]]) * width / 2
+        p0 = p0 - t * width / 2 * (i > 0)
+        p1 = p1 + t * width / 2 * (i < n - 1)
+        rectangles.append([p0 + normal, p1 + normal, p1 - normal, p0 - normal])
+    return gdspy.boolean(rectangles, None, "or").polygons
+
+
 def generate_manhattan_waypoints(
     input_port: Port,
     output_port: Port,
@@ -706,6 +1070,63 @@ def test_manhattan():
     return top_cell
 
 
+def test_round_corners_segment_cache():
+    from pp.components.bend_circular import bend_circular
+
+    bend = bend_circular(radius=5.0)
+    points = np.array([(0, 0), (20, 0), (20, 30.0000001)])
+    route1 = round_corners(points, bend, waveguide).parent
+    route2 = round_corners(points + (100, 0), bend, waveguide).parent
+    assert route1 is not route2
+    assert [r.parent for r in route1.references] == [
+        r.parent for r in route2.references
+    ]
+
+    route3 = round_corners(points, bend, waveguide, flatten=True).parent
+    assert not route3.references
+    assert len(route3.polygons) == 1
+    assert np.isclose(route3.area(), route1.area(), rtol=1e-3)
+    assert np.allclose(route3.ports["output"].midpoint, (20, 30))
+
+
+def test_segment_cache_size(monkeypatch):
+    monkeypatch.setattr(pp.routing.manhattan, "SEGMENT_CACHE_SIZE", 2)
+    clear_segment_cache()
+    w1 = get_segment(waveguide, length=1)
+    get_segment(waveguide, length=2)
+    assert get_segment(waveguide, length=1) is w1
+    get_segment(waveguide, length=3)
+    assert len(SEGMENT_CACHE) == 2
+    assert get_segment(waveguide, length=1) is w1
+
+    pp.clear_cache()
+    assert not SEGMENT_CACHE
+
+
+def test_round_corners_bundle():
+    from pp.components import taper as taper_factory
+    from pp.components.bend_circular import bend_circular
+
+    bend = bend_circular(radius=5.0)
+    taper = taper_factory(length=10.0, width1=0.5, width2=1.0)
+    routes = [
+        np.array([(0, 0), (40, 0), (40, 60), (-30, 60)]),
+        np.array([(0, 10), (0, -50), (80, -50), (80, -100)]),
+        np.array([(0, 0), (0, 30), (-50, 30)]),
+        np.array([(0, 0), (30, 0), (100, 0)]),
+    ]
+    for taper in [None, taper]:
+        refs = round_corners_bundle(routes, bend, waveguide, taper=taper)
+        for points, ref in zip(routes, refs):
+            expected = round_corners(points, bend, waveguide, taper=taper)
+            assert np.isclose(ref.parent.length, expected.parent.length)
+            assert np.allclose(ref.bbox, expected.bbox)
+            assert np.isclose(ref.parent.area(), expected.parent.area())
+            for name, port in expected.ports.items():
+                assert np.allclose(ref.ports[name].midpoint, port.midpoint)
+                assert ref.ports[name].orientation % 360 == port.orientation % 360
+
+
 if __name__ == "__main__":
     top_cell = test_manhattan()
     pp.show(top_cell)
@@ -1,7 +1,9 @@
+from typing import List, Optional, Tuple
+
 import numpy as np
+from numpy import ndarray
 
-from pp.geo_utils import path_length
-from pp.routing.manhattan import _is_horizontal, _is_vertical, remove_flat_angles
+from pp.routing.manhattan import TOLERANCE, remove_flat_angles
 
 
 def path_length_matched_points(
@@ -10,6 +12,8 @@ def path_length_matched_points(
     bend_radius=10.0,
     extra_length=0.0,
     nb_loops=1,
+    tolerance=None,
+    max_loop_length=None,
 ):
     """
     Several types of paths won't match correctly.
@@ -27,6 +31,8 @@ def path_length_matched_points(
             if nb_loops==0, no extra loop is added, instead, in each route,
             the segment indexed by `modify_segment_i` is elongated to match
             the longuest route in `list_of_waypoints`
+        tolerance: length spread below which the routes are not modified
+        max_loop_length: max extra length of each loop arm, adds loops as needed
 
     returns: another list of waypoints where
         - the path_lenth of each waypoints list are identical
@@ -34,40 +40,45 @@ def path_length_matched_points(
 
     """
 
-    common_params = {
-        "list_of_waypoints": list_of_waypoints,
-        "modify_segment_i": modify_segment_i,
-        "extra_length": extra_length,
-    }
-
-    if nb_loops >= 1:
-        return path_length_matched_points_add_waypoints(
-            **common_params, bend_radius=bend_radius, nb_loops=nb_loops
-        )
-    else:
-        return path_length_matched_points_modify_segment(**common_params)
-
-
-def path_length_matched_points_modify_segment(
-    list_of_waypoints, modify_segment_i, extra_length
-):
+    waypoints, spread = path_length_match_bundle(
+        list_of_waypoints,
+        modify_segment_i=modify_segment_i,
+        bend_radius=bend_radius,
+        extra_length=extra_length,
+        nb_loops=nb_loops,
+        tolerance=tolerance,
+        max_loop_length=max_loop_length,
+    )
+    return list(waypoints)
+
+
+def _stack_waypoints(list_of_waypoints: List[ndarray]) -> ndarray:
+    """Returns the waypoints without flat angles as one (N, K, 2) array."""
+    if isinstance(list_of_waypoints, ndarray) and list_of_waypoints.ndim == 3:
+        list_of_waypoints = list(list_of_waypoints)
     if not isinstance(list_of_waypoints, list):
         raise ValueError(
             "list_of_waypoints should be a list, got {}".format(type(list_of_waypoints))
         )
+
+    # skip remove_flat_angles when no route has consecutive parallel segments
+    if len({len(waypoints) for waypoints in list_of_waypoints}) == 1:
+        waypoints = np.array(list_of_waypoints, dtype=float)
+        d = np.diff(waypoints, axis=1)
+        cross = d[:, :-1, 0] * d[:, 1:, 1] - d[:, :-1, 1] * d[:, 1:, 0]
+        if np.all(np.abs(cross) > TOLERANCE):
+            return waypoints
+
     list_of_waypoints = [
-        remove_flat_angles(waypoints) for waypoints in list_of_waypoints
+        remove_flat_angles(np.asarray(waypoints, dtype=float))
+        for waypoints in list_of_waypoints
     ]
-    lengths = [path_length(waypoints) for waypoints in list_of_waypoints]
-    L0 = max(lengths)
-
-    N = len(list_of_waypoints[0])
 
     # Find how many turns there are per path
     nb_turns = [len(waypoints) - 2 for waypoints in list_of_waypoints]
 
-    # The paths have to have the same number of turns, otherwise this algo
-    # cannot path length match
+    # The paths have to have the same number of turns, otherwise cannot path-length
+    # match with this algorithm
     if min(nb_turns) != max(nb_turns):
         raise ValueError(
             "Number of turns in paths have to be identical got \
@@ -75,47 +86,136 @@ def path_length_matched_points_modify_segment(
                 nb_turns
             )
         )
+    return np.stack(list_of_waypoints)
+
+
+def get_path_lengths(waypoints: ndarray) -> ndarray:
+    """Returns the path length of each route of waypoints (N, K, 2)."""
+    return np.sqrt((np.diff(waypoints, axis=1) ** 2).sum(axis=-1)).sum(axis=-1)
+
+
+def _get_directions(
+    p0: ndarray, p1: ndarray, p_next: ndarray
+) -> Tuple[ndarray, ndarray]:
+    """Returns the unit vectors along each segment p0 -> p1 and towards p_next
+    (perpendicular to the segment)."""
+    is_vertical = (np.abs(p0[:, 0] - p1[:, 0]) < TOLERANCE)[:, None]
+    d = p1 - p0
+    d_next = p_next - p1
+    along = np.where(is_vertical, d * (0, 1), d * (1, 0))
+    across = np.where(is_vertical, d_next * (1, 0), d_next * (0, 1))
+    return np.sign(along), np.sign(across)
+
+
+def path_length_match_bundle(
+    list_of_waypoints: List[ndarray],
+    modify_segment_i: int = -2,
+    bend_radius: float = 10.0,
+    margin: float = 0.5,
+    extra_length: float = 0.0,
+    nb_loops: int = 1,
+    tolerance: Optional[float] = None,
+    max_loop_length: Optional[float] = None,
+) -> Tuple[ndarray, float]:
+    """Returns the path length matched waypoints of all the routes of a bundle
+    as one (N, K, 2) array, and the length spread (max - min) they achieve.
+
+    All the routes are matched at once: every route gets the same number of
+    loops on segment `modify_segment_i`, and each loop arm is extended by
+    `(L0 - L) / (2 * nb_loops) + extra_length`, L0 being the longest route.
+
+    .. code::
 
-    if modify_segment_i < 0:
-        modify_segment_i = modify_segment_i + N + 1
-
-    list_new_waypoints = []
-
-    # For each list of waypoints, modify one segment in-place
-    for i, waypoints in enumerate(list_of_waypoints):
-        p_s0, p_s1, p_next = waypoints[modify_segment_i - 1 : modify_segment_i + 2]
+                      ----
+                      |  |
+                      |  |  This length is adjusted to make all path with the same length
+                      |  |
+    --------  ===> ---|  |---
 
-        p_s0 = np.array(p_s0)
-        p_s1 = np.array(p_s1)
+    Args:
+        list_of_waypoints: (N, K, 2) array or list of waypoints,
+            with the same number of turns
+        modify_segment_i: index of the segment which accomodates the new turns
+            default is next to last segment
+        bend_radius: used to estimate the position of new waypoints to accommodate
+            bends with a given radius
+        margin: some extra space to budget for in addition to the bend radius
+        extra_length: distance added to all path length compensation
+        nb_loops: number of extra loops added in the path
+            if nb_loops==0, no extra loop is added, instead, in each route,
+            the segment indexed by `modify_segment_i` is elongated
+        tolerance: if the length spread is below tolerance, the routes are
+            returned unchanged
+        max_loop_length: max length added to each loop arm,
+            nb_loops is increased until no arm is longer
+
+    The spread is only zero if the loops fit in the modified segment
+    (at least `4 * (bend_radius + margin) * nb_loops` long).
+    """
+    waypoints = _stack_waypoints(list_of_waypoints)
+    lengths = get_path_lengths(waypoints)
+    dL = lengths.max() - lengths
 
-        L = lengths[i]
+    if tolerance is not None and dL.max() <= tolerance:
+        return waypoints, float(lengths.max() - lengths.min())
 
-        # Path length compensation length
-        dL = (L0 - L) / 2
+    N = waypoints.shape[1]
+    if modify_segment_i < 0:
+        modify_segment_i = modify_segment_i + N + 1
+    i = modify_segment_i
 
-        # Additional fixed length
-        dL = dL + extra_length
+    if max_loop_length is not None and nb_loops >= 1:
+        if max_loop_length <= extra_length:
+            raise ValueError(
+                f"max_loop_length={max_loop_length} should be larger than "
+                f"extra_length={extra_length}"
+            )
+        nb_loops = max(
+            nb_loops, int(np.ceil(dL.max() / (2 * (max_loop_length - extra_length))))
+        )
 
+    if nb_loops < 1:
         # Modify the segment to accomodate for path length matching
-        # Two cases: vertical or horizontal segment
-        if _is_vertical(p_s0, p_s1):
-            sx = np.sign(p_next[0] - p_s1[0])
+        p_s0, p_s1, p_next = waypoints[:, i - 1], waypoints[:, i], waypoints[:, i + 1]
+        along, across = _get_directions(p_s0, p_s1, p_next)
+        dp = -(dL / 2 + extra_length)[:, None] * across
+        waypoints = waypoints.copy()
+        waypoints[:, i - 1 : i + 1] += dp[:, None]
 
-            dx = -sx * dL
-            dp = (dx, 0)
-            # Sequence of displacements to apply
-
-        elif _is_horizontal(p_s0, p_s1):
-            sy = np.sign(p_next[1] - p_s1[1])
+    else:
+        # Insert nb_loops loops of 4 turns before the end of the segment
+        p_s0, p_s1, p_next = waypoints[:, i - 2], waypoints[:, i - 1], waypoints[:, i]
+        along, across = _get_directions(p_s0, p_s1, p_next)
+        a = margin + bend_radius
+        arm = 2 * a + dL / (2 * nb_loops) + extra_length
+
+        # displacements (along, across) of each loop: up, forward, down, forward
+        steps = np.array([(0, 1), (1, 0), (0, -1), (1, 0)] * nb_loops)[:-1]
+        offsets = np.cumsum(np.vstack([(0, 0), steps]), axis=0)
+        q0 = p_s1 - 2 * nb_loops * 2 * a * along
+        inserted_points = (
+            q0[:, None]
+            + offsets[None, :, :1] * 2 * a * along[:, None]
+            + offsets[None, :, 1:] * arm[:, None, None] * across[:, None]
+        )
+        waypoints = np.concatenate(
+            [waypoints[:, : i - 1], inserted_points, waypoints[:, i - 1 :]], axis=1
+        )
 
-            dy = -sy * dL
-            dp = (0, dy)
+    lengths = get_path_lengths(waypoints)
+    return waypoints, float(lengths.max() - lengths.min())
 
-        waypoints[modify_segment_i - 1] = p_s0 + dp
-        waypoints[modify_segment_i] = p_s1 + dp
 
-        list_new_waypoints += [waypoints]
-    return list_new_waypoints
+def path_length_matched_points_modify_segment(
+    list_of_waypoints, modify_segment_i, extra_length
+):
+    waypoints, spread = path_length_match_bundle(
+        list_of_waypoints,
+        modify_segment_i=modify_segment_i,
+        extra_length=extra_length,
+        nb_loops=0,
+    )
+    return list(waypoints)
 
 
 def path_length_matched_points_add_waypoints(
@@ -158,111 +258,12 @@ def path_length_matched_points_add_waypoints(
     the input list_of_waypoints needs to be modified.
 
     """
-
-    if not isinstance(list_of_waypoints, list):
-        raise ValueError(
-            "list_of_waypoints should be a list, got {}".format(type(list_of_waypoints))
-        )
-    list_of_waypoints = [
-        remove_flat_angles(waypoints) for waypoints in list_of_waypoints
-    ]
-    lengths = [path_length(waypoints) for waypoints in list_of_waypoints]
-    L0 = max(lengths)
-
-    N = len(list_of_waypoints[0])
-
-    # Find how many turns there are per path
-    nb_turns = [len(waypoints) - 2 for waypoints in list_of_waypoints]
-
-    # The paths have to have the same number of turns, otherwise cannot path-length
-    # match with this algorithm
-    if min(nb_turns) != max(nb_turns):
-        raise ValueError(
-            "Number of turns in paths have to be identical got \
-        {}".format(
-                nb_turns
-            )
-        )
-
-    # To have flexibility in the path length, we need to add 4 bends
-    """
-    One path has to be converted in this way:
-
-                      ----
-                      |  |
-                      |  |  This length is adjusted to make all path with the same length
-                      |  |
-    --------  ===> ---|  |---
-    """
-
-    # Get the points for the segment we need to modify
-    a = margin + bend_radius
-    if modify_segment_i < 0:
-        modify_segment_i = modify_segment_i + N + 1
-    list_new_waypoints = []
-
-    for i, waypoints in enumerate(list_of_waypoints):
-        p_s0, p_s1, p_next = waypoints[modify_segment_i - 2 : modify_segment_i + 1]
-
-        p_s1 = np.array(p_s1)
-
-        L = lengths[i]
-
-        # Path length compensation length
-        dL = (L0 - L) / (2 * nb_loops)
-
-        # Additional fixed length
-        dL = dL + extra_length
-
-        # Generate a new sequence of points which will replace this segment
-        # Two cases: vertical or horizontal segment
-        if _is_vertical(p_s0, p_s1):
-            sx = np.sign(p_next[0] - p_s1[0])
-            sy = np.sign(p_s1[1] - p_s0[1])
-
-            dx = sx * (2 * a + dL)
-            dy = sy * 2 * a
-
-            # First new point to insert
-            q0 = p_s1 + (0, -2 * nb_loops * dy)
-
-            # Sequence of displacements to apply
-            seq = [(dx, 0), (0, dy), (-dx, 0), (0, dy)] * nb_loops
-            seq.pop()  # Remove last point to avoid flat angle with next point
-
-        elif _is_horizontal(p_s0, p_s1):
-            sy = np.sign(p_next[1] - p_s1[1])
-            sx = np.sign(p_s1[0] - p_s0[0])
-
-            dx = sx * 2 * a
-            dy = sy * (2 * a + dL)
-
-            q0 = p_s1 + (-2 * dx * nb_loops, 0)
-            # Sequence of displacements to apply
-            seq = [(0, dy), (dx, 0), (0, -dy), (dx, 0)] * nb_loops
-            seq.pop()  # Remove last point to avoid flat angle with next point
-
-        # Generate points to insert
-        qs = [q0]
-        for dp in seq:
-            qs += [qs[-1] + dp]
-
-        # print()
-        # print(nb_loops)
-        # for q in qs:
-        # print(q)
-        # print()
-        inserted_points = np.stack(qs, axis=0)
-        waypoints = np.array(waypoints)
-
-        # Insert the points
-        new_points = np.vstack(
-            [
-                waypoints[: modify_segment_i - 1],
-                inserted_points,
-                waypoints[modify_segment_i - 1 :],
-            ]
-        )
-        list_new_waypoints += [new_points]
-
-    return list_new_waypoints
+    waypoints, spread = path_length_match_bundle(
+        list_of_waypoints,
+        modify_segment_i=modify_segment_i,
+        bend_radius=bend_radius,
+        margin=margin,
+        extra_length=extra_length,
+        nb_loops=nb_loops,
+    )
+    return list(waypoints)
@@ -1,15 +1,18 @@
-from typing import Any, Callable, List, Optional, Tuple, Union
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
-from numpy import float64
+import numpy as np
+from numpy import float64, ndarray
 from phidl.device_layout import Label
 
 import pp
+from pp.cell import CACHE
 from pp.component import Component, ComponentReference
 from pp.components.bend_circular import bend_circular
 from pp.components.grating_coupler.elliptical_trenches import grating_coupler_te
 from pp.components.waveguide import waveguide
 from pp.layers import LAYER
-from pp.port import select_optical_ports
+from pp.port import Port, select_optical_ports
 from pp.routing.connect import connect_strip_way_points, get_waypoints_connect_strip
 from pp.routing.connect_bundle import get_min_spacing, link_optical_ports
 from pp.routing.get_input_labels import get_input_labels
@@ -20,6 +23,167 @@ from pp.routing.utils import direction_ports_from_list_ports
 SPACING_GC = 127.0
 BEND_RADIUS = pp.conf.tech.bend_radius
 
+# (parent, origin, rotation, magnification, x_reflection)
+Placement = Tuple[Component, ndarray, float, Optional[float], bool]
+
+
+@dataclass
+class RoutePlan:
+    """Routes and gratings of a route_fiber_array call, to move to other components."""
+
+    # (xmin, ymin) of the component the plan was computed for
+    origin: Tuple[float, float]
+    elements: List[Placement]
+    io_gratings_lines: List[List[Placement]]
+    y0_optical: float
+    ordered_port_names: List[str]
+    # components of pp.cell.CACHE used by the plan, stale after pp.clear_cache()
+    dependencies: List[Component]
+
+
+# footprint and settings key -> plan
+# least recently used first, at most ROUTE_PLAN_CACHE_SIZE plans
+ROUTE_PLAN_CACHE: Dict[Tuple[Any, ...], RoutePlan] = {}
+ROUTE_PLAN_CACHE_SIZE = 256
+
+
+def clear_route_plan_cache() -> None:
+    """Clears the cache of route plans (also cleared by pp.clear_cache)."""
+    ROUTE_PLAN_CACHE.clear()
+
+
+def _to_key(value: Any) -> Any:
+    if isinstance(value, (list, tuple)):
+        return tuple(_to_key(v) for v in value)
+    if "<locals>" in getattr(value, "__qualname__", ""):
+        # a new function on every call, would never hit the cache
+        raise TypeError(f"{value} is a local function")
+    return value
+
+
+def get_route_plan_key(
+    component: Component, settings: Dict[str, Any]
+) -> Optional[Tuple[Any, ...]]:
+    """Returns the key of the routing plan of a component, None if it has none.
+
+    The key holds what the routing reads from the component: the ports
+    relative to the (xmin, ymin) corner of the bounding box and the x size,
+    plus the routing settings. Components with the same key (rings that only
+    differ in gap, devices that only grow north ...) get the same routes and
+    gratings, moved with the bounding box.
+    """
+    xmin, ymin = component.xmin, component.ymin
+    ports = tuple(
+        (
+            name,
+            round(port.x - xmin, 3),
+            round(port.y - ymin, 3),
+            port.orientation,
+            port.width,
+            port.port_type,
+            tuple(port.layer),
+        )
+        for name, port in component.ports.items()
+    )
+    # the gratings snap to a 0.1um grid, so plans only move by multiples of it
+    offgrid = tuple(round(10 * v % 1, 2) % 1 for v in (xmin, ymin))
+    try:
+        key = (
+            ports,
+            offgrid,
+            round(component.xsize, 3),
+            _to_key(sorted(settings.items())),
+        )
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _get_placement(ref: ComponentReference) -> Placement:
+    return (
+        ref.parent,
+        np.array(ref.origin, dtype=float),
+        ref.rotation,
+        ref.magnification,
+        ref.x_reflection,
+    )
+
+
+def _place(placement: Placement, dx: float, dy: float) -> ComponentReference:
+    parent, origin, rotation, magnification, x_reflection = placement
+    return ComponentReference(
+        parent,
+        origin=origin + (dx, dy),
+        rotation=rotation,
+        magnification=magnification,
+        x_reflection=x_reflection,
+    )
+
+
+def get_route_plan(key: Optional[Tuple[Any, ...]]) -> Optional[RoutePlan]:
+    """Returns the cached plan, None if there is none or it is stale."""
+    plan = ROUTE_PLAN_CACHE.pop(key, None)
+    if plan is None:
+        return None
+    # once released from pp.cell.CACHE the factories build new components
+    if any(CACHE.get(c.name) is not c for c in plan.dependencies):
+        return None
+    ROUTE_PLAN_CACHE[key] = plan
+    return plan
+
+
+def save_route_plan(
+    key: Optional[Tuple[Any, ...]],
+    component: Component,
+    elements: List[ComponentReference],
+    io_gratings_lines: List[List[ComponentReference]],
+    y0_optical: float,
+    ordered_ports: List[Port],
+) -> None:
+    """Caches the routes and gratings of component, before the labels."""
+    if key is None or not all(isinstance(e, ComponentReference) for e in elements):
+        return
+    parents = {id(e.parent): e.parent for e in elements}
+    for io_gratings in io_gratings_lines:
+        parents.update({id(gc.parent): gc.parent for gc in io_gratings})
+    # pp.cell rebuilds the components with shortened long names on every call
+    dependencies = {}
+    for parent in parents.values():
+        for c in [parent] + list(parent.get_dependencies(recursive=True)):
+            if CACHE.get(c.name) is c and not hasattr(c, "name_long"):
+                dependencies[id(c)] = c
+
+    ROUTE_PLAN_CACHE[key] = RoutePlan(
+        origin=(component.xmin, component.ymin),
+        elements=[_get_placement(e) for e in elements],
+        io_gratings_lines=[
+            [_get_placement(gc) for gc in io_gratings]
+            for io_gratings in io_gratings_lines
+        ],
+        y0_optical=y0_optical,
+        ordered_port_names=[p.name for p in ordered_ports],
+        dependencies=list(dependencies.values()),
+    )
+    if len(ROUTE_PLAN_CACHE) > ROUTE_PLAN_CACHE_SIZE:
+        ROUTE_PLAN_CACHE.pop(next(iter(ROUTE_PLAN_CACHE)))
+
+
+def place_route_plan(
+    plan: RoutePlan, component: Component
+) -> Tuple[List[ComponentReference], List[List[ComponentReference]], float, List[Port]]:
+    """Returns new references of the routes and gratings of a plan, moved
+    with the bounding box of component, y0_optical and the ordered ports."""
+    dx = component.xmin - plan.origin[0]
+    dy = component.ymin - plan.origin[1]
+    elements = [_place(e, dx, dy) for e in plan.elements]
+    io_gratings_lines = [
+        [_place(gc, dx, dy) for gc in io_gratings]
+        for io_gratings in plan.io_gratings_lines
+    ]
+    ordered_ports = [component.ports[name] for name in plan.ordered_port_names]
+    return elements, io_gratings_lines, plan.y0_optical + dy, ordered_ports
+
 
 def route_fiber_array(
     component: Component,
@@ -48,6 +212,7 @@ def route_fiber_array(
     route_factory: Callable = route_south,
     get_input_labels_function: Callable = get_input_labels,
     select_ports: Callable = select_optical_ports,
+    cache: bool = True,
 ) -> Tuple[
     List[Union[ComponentReference, Label]], List[List[ComponentReference]], float64
 ]:
@@ -89,6 +254,10 @@ def route_fiber_array(
         route_factory: factories for route
         get_input_labels_function: functions to add labels
         select_ports: function to select ports
+        cache: reuse the routes and gratings computed for a component with the
+            same ports relative to its bounding box and the same settings.
+            Not used with max_y0_optical, an absolute y that does not move
+            with the component
 
     Returns:
         elements, io_grating_lines, y0_optical
@@ -111,6 +280,47 @@ def route_fiber_array(
 
     elements = []
 
+    settings = dict(
+        optical_io_spacing=optical_io_spacing,
+        grating_coupler=grating_coupler,
+        bend_factory=bend_factory,
+        straight_factory=straight_factory,
+        fanout_length=fanout_length,
+        max_y0_optical=max_y0_optical,
+        with_align_ports=with_align_ports,
+        waveguide_separation=waveguide_separation,
+        optical_routing_type=optical_routing_type,
+        bend_radius=bend_radius,
+        connected_port_list_ids=connected_port_list_ids,
+        nb_optical_ports_lines=nb_optical_ports_lines,
+        force_manhattan=force_manhattan,
+        excluded_ports=excluded_ports,
+        grating_indices=grating_indices,
+        route_filter=route_filter,
+        gc_port_name=gc_port_name,
+        gc_rotation=gc_rotation,
+        x_grating_offset=x_grating_offset,
+        optical_port_labels=optical_port_labels,
+        route_factory=route_factory,
+        select_ports=select_ports,
+    )
+    # the max_y0_optical clamp does not move with the plan
+    use_cache = cache and max_y0_optical is None
+    key = get_route_plan_key(component, settings) if use_cache else None
+    plan = get_route_plan(key)
+    if plan is not None:
+        elements, io_gratings_lines, y0_optical, ordered_ports = place_route_plan(
+            plan, component
+        )
+        elements += get_input_labels_function(
+            io_gratings_lines[-1],
+            ordered_ports,
+            component_name,
+            layer_label,
+            gc_port_name,
+        )
+        return elements, io_gratings_lines, y0_optical
+
     # grating_coupler can either be a component/function
     # or a list of components/functions
 
@@ -399,6 +609,10 @@ def route_fiber_array(
         loop_back = round_corners(route, bend90, straight_factory)
         elements += [loop_back]
 
+    save_route_plan(
+        key, component, elements, io_gratings_lines, y0_optical, ordered_ports
+    )
+
     """ input_label for automated testing opt_TE_1550_componentName_0_portLabel"""
     elements += get_input_labels_function(
         io_gratings, ordered_ports, component_name, layer_label, gc_port_name
@@ -407,6 +621,75 @@ def route_fiber_array(
     return elements, io_gratings_lines, y0_optical
 
 
+def test_route_fiber_array_cache():
+    clear_route_plan_cache()
+    c1 = pp.c.ring_single(gap=0.2)
+    c2 = pp.c.ring_single(gap=0.25)
+    elements1, gratings1, y1 = route_fiber_array(c1)
+    elements2, gratings2, y2 = route_fiber_array(c2)
+    assert len(ROUTE_PLAN_CACHE) == 1
+    elements3, gratings3, y3 = route_fiber_array(c2, cache=False)
+
+    assert y2 == y3
+    for e2, e3 in zip(elements2, elements3):
+        assert type(e2) is type(e3)
+        if isinstance(e2, Label):
+            assert e2.text == e3.text
+            assert np.allclose(e2.position, e3.position)
+        else:
+            assert np.allclose(e2.bbox, e3.bbox)
+    for g1, g2 in zip(gratings1[0], gratings3[0]):
+        assert np.allclose(g1.origin, g2.origin)
+
+    # the references are new, moving them does not change the plan
+    elements2[0].movex(100)
+    elements4, _, _ = route_fiber_array(c2)
+    assert np.allclose(elements4[0].bbox, elements3[0].bbox)
+
+    # the plan moves with the component
+    c = pp.Component("ring_moved")
+    ref = c << c2
+    ref.move((100, 50))
+    for name, port in ref.ports.items():
+        c.add_port(name, port=port)
+    elements5, _, y5 = route_fiber_array(c)
+    elements6, _, y6 = route_fiber_array(c, cache=False)
+    assert len(ROUTE_PLAN_CACHE) == 1
+    assert y5 == y6
+    for e5, e6 in zip(elements5, elements6):
+        if isinstance(e5, ComponentReference):
+            assert np.allclose(e5.bbox, e6.bbox)
+
+    # max_y0_optical is absolute, the gratings stay below it
+    clear_route_plan_cache()
+    c = pp.Component("ring_moved_north")
+    ref = c << c2
+    ref.movey(50)
+    for name, port in ref.ports.items():
+        c.add_port(name, port=port)
+    _, gratings7, y7 = route_fiber_array(c2, max_y0_optical=-60)
+    _, gratings8, y8 = route_fiber_array(c, max_y0_optical=-60)
+    assert not ROUTE_PLAN_CACHE
+    assert y7 == y8 == -60
+    for g7, g8 in zip(gratings7[0], gratings8[0]):
+        assert np.allclose(g7.origin, g8.origin)
+
+
+def test_route_plan_cache_size(monkeypatch):
+    monkeypatch.setattr(pp.routing.route_fiber_array, "ROUTE_PLAN_CACHE_SIZE", 2)
+    clear_route_plan_cache()
+    route_fiber_array(pp.c.waveguide(length=10))
+    route_fiber_array(pp.c.waveguide(length=20))
+    route_fiber_array(pp.c.waveguide(length=10))
+    route_fiber_array(pp.c.waveguide(length=30))
+    assert len(ROUTE_PLAN_CACHE) == 2
+    xsizes = [key[2] for key in ROUTE_PLAN_CACHE]
+    assert xsizes == [10, 30]
+
+    pp.clear_cache()
+    assert not ROUTE_PLAN_CACHE
+
+
 if __name__ == "__main__":
     gcte = pp.c.grating_coupler_te
     gctm = pp.c.grating_coupler_tm
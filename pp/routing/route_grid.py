@@ -0,0 +1,481 @@
+""" Obstacle-aware Manhattan router
+
+Rasterizes the polygons of a component on some layers into an occupancy grid,
+and searches the route with the fewest bends, and the shortest among those,
+that keeps clear of the obstacles. The search goes one bend at a time, and
+slides all the routes with the same number of bends along the grid at once
+with numpy. The straight run between two bends is at least two bend radii, so
+the waypoints can go straight into `round_corners`.
+
+Routes of a bundle are added to the obstacles as they are found, so the next
+routes go around them instead of crossing them.
+
+.. code::
+
+    import pp
+    from pp.routing.route_grid import route_grid
+
+    c = pp.Component()
+    ...
+    route = route_grid(c, port1, port2, bend_radius=10)
+    c.add(route)
+
+"""
+
+import math
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy import ndarray
+
+import pp
+from pp.component import Component, ComponentReference
+from pp.components import waveguide
+from pp.components.bend_circular import bend_circular
+from pp.layers import LAYER
+from pp.port import Port
+from pp.routing.manhattan import round_corners
+
+# index is the orientation // 90
+DIRECTIONS = ((1, 0), (0, 1), (-1, 0), (0, -1))
+
+
+class ObstacleGrid:
+    """Occupancy grid of the obstacles in a bounding box
+
+    Args:
+        bbox: ((xmin, ymin), (xmax, ymax))
+        grid: cell size (um)
+
+    A cell is occupied when any obstacle box overlaps it.
+    """
+
+    def __init__(self, bbox: Tuple[Tuple[float, float], ...], grid: float = 5.0):
+        (xmin, ymin), (xmax, ymax) = bbox
+        self.grid = grid
+        self.origin = np.array([xmin, ymin], dtype=np.float64)
+        nx = max(1, int(math.ceil((xmax - xmin) / grid)))
+        ny = max(1, int(math.ceil((ymax - ymin) / grid)))
+        self.occupied = np.zeros((nx, ny), dtype=bool)
+
+    @classmethod
+    def from_component(
+        cls,
+        component: Component,
+        layers: Iterable[Tuple[int, int]] = (LAYER.WG,),
+        grid: float = 5.0,
+        margin: float = 2.0,
+        padding: float = 100.0,
+        bbox: Optional[ndarray] = None,
+    ) -> "ObstacleGrid":
+        """Returns the grid of the component polygons on layers
+
+        Args:
+            component: obstacles
+            layers: layers of the obstacles
+            grid: cell size (um)
+            margin: clearance around each polygon
+            padding: free space around the bbox available for routing
+            bbox: area to route in, defaults to the component bbox
+        """
+        bbox = component.bbox if bbox is None else bbox
+        (xmin, ymin), (xmax, ymax) = bbox
+        bbox = ((xmin - padding, ymin - padding), (xmax + padding, ymax + padding))
+        obstacles = cls(bbox, grid=grid)
+        polygons = component.get_polygons(by_spec=True)
+        for layer in layers:
+            for points in polygons.get(tuple(layer), []):
+                obstacles.add_box(
+                    points.min(axis=0) - margin, points.max(axis=0) + margin
+                )
+        return obstacles
+
+    def _index_range(self, p0: ndarray, p1: ndarray) -> Tuple[ndarray, ndarray]:
+        shape = self.occupied.shape
+        i0 = np.floor((np.asarray(p0) - self.origin) / self.grid).astype(int)
+        i1 = np.ceil((np.asarray(p1) - self.origin) / self.grid).astype(int)
+        return np.clip(i0, 0, shape), np.clip(i1, 0, shape)
+
+    def add_box(self, p0: ndarray, p1: ndarray) -> None:
+        """Marks the cells overlapping the box p0 (lower left), p1 (upper right)"""
+        (i0, j0), (i1, j1) = self._index_range(p0, p1)
+        self.occupied[i0:i1, j0:j1] = True
+
+    def add_route(self, points: ndarray, width: float = 0.5, spacing: float = 2.0):
+        """Marks the cells under a Manhattan route, with spacing on each side"""
+        points = np.asarray(points)
+        d = width / 2 + spacing
+        for a, b in zip(points[:-1], points[1:]):
+            self.add_box(np.minimum(a, b) - d, np.maximum(a, b) + d)
+
+    def cell(self, xy: ndarray) -> Tuple[int, int]:
+        """Returns the (i, j) cell containing xy"""
+        i, j = np.floor((np.asarray(xy) - self.origin) / self.grid).astype(int)
+        return int(i), int(j)
+
+    def center(self, ij: Tuple[int, int]) -> ndarray:
+        """Returns the center of cell (i, j)"""
+        return self.origin + (np.asarray(ij) + 0.5) * self.grid
+
+
+# cost of the cells that no route reaches
+NONE = 2 ** 40
+
+
+def _forward(a: ndarray, d: int) -> ndarray:
+    """Returns a view of a where direction d runs along axis 0"""
+    return (a, a.T, a[::-1], a.T[::-1])[d]
+
+
+def _backward(a: ndarray, d: int) -> ndarray:
+    """Inverse of _forward"""
+    return (a, a.T, a[::-1], a[::-1].T)[d]
+
+
+def _sweep(free: ndarray, cost: ndarray, d: int, min_run: int) -> ndarray:
+    """Returns the cost of reaching each cell going straight along direction d
+
+    Each cell takes the cheapest source (cost + distance) at least min_run
+    cells behind it with no obstacle in between. Cells that no source reaches
+    cost NONE.
+    """
+    free = _forward(free, d)
+    cost = _forward(cost, d)
+    n = free.shape[0]
+    index = np.arange(n, dtype=np.int64)[:, None]
+
+    # each obstacle starts a new section; the key of a later section is always
+    # lower, so the running min only sees the sources of the current section
+    section = np.cumsum(~free, axis=0, dtype=np.int64)
+    big = 4 * NONE
+    key = np.where(cost < NONE, cost - index, NONE) - section * big
+    best = np.minimum.accumulate(key, axis=0) + section * big
+
+    reached = np.full(free.shape, NONE, dtype=np.int64)
+    m = min_run
+    if m < n:
+        valid = (best[: n - m] < NONE) & (section[: n - m] == section[m:]) & free[m:]
+        reached[m:] = np.where(valid, best[: n - m] + index[m:], NONE)
+    return _backward(reached, d)
+
+
+def _trace(
+    free: ndarray, cost: ndarray, cell: Tuple[int, int], d: int, min_run: int
+) -> Tuple[int, Optional[Tuple[int, int]]]:
+    """Returns the cost of reaching cell along direction d and its source
+
+    Walks back from cell until an obstacle; on ties the closest source wins.
+    """
+    nx, ny = free.shape
+    dx, dy = DIRECTIONS[d]
+    i, j = cell
+    best, source = NONE, None
+    length = 0
+    while 0 <= i < nx and 0 <= j < ny and free[i, j]:
+        if length >= min_run and cost[i, j] + length < best:
+            best, source = cost[i, j] + length, (i, j)
+        i, j = i - dx, j - dy
+        length += 1
+    return best, source
+
+
+def _search(
+    free: ndarray,
+    start: Tuple[int, int],
+    start_direction: int,
+    end: Tuple[int, int],
+    end_direction: int,
+    min_run: int,
+    min_end_run: int,
+    max_bends: int = 12,
+    aligned: bool = True,
+) -> Optional[List[Tuple[int, int]]]:
+    """Returns the corner cells of the shortest route with fewest bends, or None
+
+    Level k of the search holds the cost (length) of the cheapest route with
+    k bends into each (cell, direction). Each level slides all the routes
+    along their direction at once, and turns them where they have run min_run
+    cells since the previous bend (min_end_run after the start and before
+    the end).
+    """
+    cost = np.full((4,) + free.shape, NONE, dtype=np.int64)
+    cost[start_direction][start] = 0
+    levels = []
+
+    for bends in range(max_bends + 1):
+        levels.append(cost)
+        end_run = min_end_run if bends else 0
+        end_cost, _ = _trace(free, cost[end_direction], end, end_direction, end_run)
+        if end_cost < NONE and (bends or aligned):
+            break
+
+        run = min_end_run if bends == 0 else min_run
+        turns = [_sweep(free, cost[d], d, run) for d in range(4)]
+        cost = np.empty_like(cost)
+        for d in range(4):
+            cost[d] = np.minimum(turns[(d + 1) % 4], turns[(d + 3) % 4])
+        if (cost >= NONE).all():
+            return None
+    else:
+        return None
+
+    # walk back from the end, one straight run per level
+    corners = []
+    cell, d, run = end, end_direction, min_end_run
+    for bends in range(len(levels) - 1, 0, -1):
+        _, corner = _trace(free, levels[bends][d], cell, d, run)
+        corners.append(corner)
+        run = min_end_run if bends == 1 else min_run
+        d = min(
+            [(d + 1) % 4, (d + 3) % 4],
+            key=lambda p: _trace(free, levels[bends - 1][p], corner, p, run)[0],
+        )
+        cell = corner
+    return corners[::-1]
+
+
+def _get_direction(port: Port) -> int:
+    orientation = int(round(port.orientation)) % 360
+    if orientation % 90:
+        raise ValueError(f"Port {port.name} is not Manhattan ({port.orientation})")
+    return orientation // 90
+
+
+def generate_grid_waypoints(
+    input_port: Port,
+    output_port: Port,
+    obstacles: ObstacleGrid,
+    bend_radius: float = 10.0,
+    max_bends: int = 12,
+    window: Optional[float] = None,
+) -> ndarray:
+    """Returns the waypoints of the route with fewest bends avoiding obstacles
+
+    Args:
+        input_port: start
+        output_port: end
+        obstacles: occupancy grid
+        bend_radius: bends are at least 2 * bend_radius apart
+        max_bends: gives up after max_bends bends
+        window: searches first within window (um) around the ports bbox,
+            then in the whole grid. Defaults to 20 * bend_radius
+
+    The first grid steps out of each port are always free, as the ports usually
+    sit on the edge of an obstacle.
+    """
+    grid = obstacles.grid
+    occupied = obstacles.occupied
+    start_direction = _get_direction(input_port)
+    output_direction = _get_direction(output_port)
+    end_direction = (output_direction + 2) % 4
+
+    # straight cells out of each port and between bends; the first and last
+    # corners move by up to half a cell when snapped to the port lines
+    min_end_run = int(math.ceil(bend_radius / grid + 0.5))
+    min_run = int(math.ceil(2 * bend_radius / grid + 0.5))
+
+    p1 = np.asarray(input_port.midpoint, dtype=np.float64)
+    p2 = np.asarray(output_port.midpoint, dtype=np.float64)
+    start = obstacles.cell(p1 + np.array(DIRECTIONS[start_direction]) * grid / 2)
+    end = obstacles.cell(p2 + np.array(DIRECTIONS[output_direction]) * grid / 2)
+
+    nx, ny = occupied.shape
+    for i, j in [start, end]:
+        if not (0 <= i < nx and 0 <= j < ny):
+            raise ValueError(f"Port at cell {(i, j)} outside the obstacle grid")
+
+    # the exit of each port is free
+    free = ~occupied
+    for (i, j), d in [(start, start_direction), (end, output_direction)]:
+        dx, dy = DIRECTIONS[d]
+        for k in range(min_end_run):
+            if 0 <= i + k * dx < nx and 0 <= j + k * dy < ny:
+                free[i + k * dx, j + k * dy] = True
+
+    axis = 1 if start_direction % 2 == 0 else 0
+    aligned = start_direction == end_direction and abs(p1[axis] - p2[axis]) < 1e-3
+
+    pad = int(math.ceil((window or 20 * bend_radius) / grid))
+    i0, j0 = np.maximum(np.minimum(start, end) - pad, 0)
+    i1, j1 = np.minimum(np.maximum(start, end) + pad + 1, (nx, ny))
+    for i0, j0, i1, j1 in [(i0, j0, i1, j1), (0, 0, nx, ny)]:
+        corners = _search(
+            free[i0:i1, j0:j1],
+            (start[0] - i0, start[1] - j0),
+            start_direction,
+            (end[0] - i0, end[1] - j0),
+            end_direction,
+            min_run=min_run,
+            min_end_run=min_end_run,
+            max_bends=max_bends,
+            aligned=aligned,
+        )
+        if corners is not None:
+            break
+    else:
+        raise ValueError(
+            f"No route found between {input_port.name} at {tuple(p1.tolist())} and "
+            f"{output_port.name} at {tuple(p2.tolist())}"
+        )
+
+    corners = [obstacles.center((i + i0, j + j0)) for i, j in corners]
+
+    # snap the first and last segments onto the port lines
+    if corners:
+        last_axis = 1 if end_direction % 2 == 0 else 0
+        corners[0][axis] = p1[axis]
+        corners[-1][last_axis] = p2[last_axis]
+    return np.array([p1] + corners + [p2])
+
+
+def generate_grid_waypoints_bundle(
+    component: Component,
+    ports1: List[Port],
+    ports2: List[Port],
+    layers: Iterable[Tuple[int, int]] = (LAYER.WG,),
+    bend_radius: float = 10.0,
+    grid: Optional[float] = None,
+    margin: float = 2.0,
+    spacing: float = 2.0,
+    max_bends: int = 12,
+    obstacles: Optional[ObstacleGrid] = None,
+    max_retries: Optional[int] = None,
+) -> List[ndarray]:
+    """Returns the waypoints for each pair of ports, in the order of the ports
+
+    Shorter routes go first, and each route becomes an obstacle for the next ones.
+    When a route fails, all the routes are ripped up and routed again starting
+    with the one that failed.
+
+    Args:
+        component: its polygons on layers are the obstacles
+        ports1: start ports
+        ports2: end ports
+        layers: layers of the obstacles
+        bend_radius: bends are at least 2 * bend_radius apart
+        grid: cell size, defaults to bend_radius / 2
+        margin: clearance around the component polygons
+        spacing: clearance around each route
+        max_bends: gives up on a route after max_bends bends
+        obstacles: reuses an occupancy grid instead of rasterizing the component
+        max_retries: rip-up and reroute passes, defaults to the number of routes
+    """
+    if len(ports1) != len(ports2):
+        raise ValueError(f"Got {len(ports1)} ports1 and {len(ports2)} ports2")
+    grid = grid or bend_radius / 2
+    if obstacles is None:
+        xy = np.array([p.midpoint for p in ports1 + ports2] + list(component.bbox))
+        bbox = np.array([xy.min(axis=0), xy.max(axis=0)])
+        obstacles = ObstacleGrid.from_component(
+            component, layers=layers, grid=grid, margin=margin, bbox=bbox
+        )
+
+    def _distance(k):
+        return np.abs(np.subtract(ports1[k].midpoint, ports2[k].midpoint)).sum()
+
+    order = sorted(range(len(ports1)), key=_distance)
+    occupied = obstacles.occupied.copy()
+    max_retries = len(ports1) if max_retries is None else max_retries
+
+    for retry in range(max_retries + 1):
+        obstacles.occupied[:] = occupied
+        waypoints: Dict[int, ndarray] = {}
+        for k in order:
+            try:
+                points = generate_grid_waypoints(
+                    ports1[k],
+                    ports2[k],
+                    obstacles=obstacles,
+                    bend_radius=bend_radius,
+                    max_bends=max_bends,
+                )
+            except ValueError:
+                if retry == max_retries:
+                    raise
+                # rip up all the routes and start with the one that failed
+                order.remove(k)
+                order.insert(0, k)
+                break
+            obstacles.add_route(points, width=ports1[k].width, spacing=spacing)
+            waypoints[k] = points
+        else:
+            return [waypoints[k] for k in range(len(ports1))]
+
+
+def route_grid(
+    component: Component,
+    input_port: Port,
+    output_port: Port,
+    bend_factory: Callable = bend_circular,
+    straight_factory: Callable = waveguide,
+    bend_radius: float = 10.0,
+    **kwargs,
+) -> ComponentReference:
+    """Returns a route Reference from input_port to output_port that avoids
+    the component polygons.
+
+    Args:
+        component: its polygons are the obstacles
+        input_port: start
+        output_port: end
+        bend_factory: for the bends
+        straight_factory: for the straight sections
+        bend_radius: bend radius
+        kwargs: for generate_grid_waypoints_bundle
+    """
+    bend90 = pp.call_if_func(bend_factory, radius=bend_radius, width=input_port.width)
+    (points,) = generate_grid_waypoints_bundle(
+        component, [input_port], [output_port], bend_radius=bend_radius, **kwargs
+    )
+    return round_corners(points, bend90, straight_factory)
+
+
+def _sample_obstacles() -> Tuple[Component, Port, Port]:
+    c = pp.Component("sample_route_grid")
+    c.add_polygon([(40, -50), (60, -50), (60, 50), (40, 50)], layer=LAYER.WG)
+    port1 = Port("in", (0, 0), 0.5, 0)
+    port2 = Port("out", (100, 0), 0.5, 180)
+    return c, port1, port2
+
+
+def test_route_grid():
+    c, port1, port2 = _sample_obstacles()
+    obstacles = ObstacleGrid.from_component(c, grid=5.0, margin=2.0)
+    points = generate_grid_waypoints(port1, port2, obstacles, bend_radius=10)
+
+    # the wall blocks the straight route, so it goes around with 4 bends
+    assert len(points) == 6
+    assert np.allclose(points[0], (0, 0)) and np.allclose(points[-1], (100, 0))
+    assert all((a == b).any() for a, b in zip(points[:-1], points[1:]))
+    assert np.abs(points[:, 1]).max() > 50
+
+    route = route_grid(c, port1, port2, bend_radius=10)
+    assert route.ports["input"].midpoint[0] == 0
+    assert np.isclose(route.ports["output"].midpoint[0], 100)
+
+
+def test_route_grid_bundle():
+    c = pp.Component()
+    c.add_polygon([(-1, -1), (1, -1), (1, 1), (-1, 1)], layer=LAYER.WG)
+    ports1 = [Port(f"in{i}", (0, 20 * i), 0.5, 0) for i in range(3)]
+
+    # going down, the first routes block the others until they are rerouted
+    for dy in [50, -50]:
+        ports2 = [Port(f"out{i}", (200, 20 * i + dy), 0.5, 180) for i in range(3)]
+        routes = generate_grid_waypoints_bundle(c, ports1, ports2, bend_radius=5)
+        assert len(routes) == 3
+
+        segments = []
+        for points in routes:
+            assert len(points) == 4
+            segments += list(zip(points[:-1], points[1:]))
+
+        # no two routes share a vertical section
+        xs = [a[0] for a, b in segments if a[0] == b[0]]
+        assert len(set(xs)) == len(xs)
+
+
+if __name__ == "__main__":
+    c, port1, port2 = _sample_obstacles()
+    c.add(route_grid(c, port1, port2))
+    pp.show(c)
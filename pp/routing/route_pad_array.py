@@ -5,9 +5,12 @@ from phidl.device_layout import Label
 
 import pp
 from pp.component import Component, ComponentReference
+from pp.components.bend_circular import bend_circular
 from pp.components.electrical.pad import pad
 from pp.port import select_electrical_ports
 from pp.routing.connect import connect_elec_waypoints, get_waypoints_connect_strip
+from pp.routing.connect_bundle import get_fanout_waypoints
+from pp.routing.manhattan import _get_bend_ports
 from pp.routing.utils import direction_ports_from_list_ports
 
 
@@ -29,6 +32,7 @@ def route_pad_array(
     x_pad_offset: int = 0,
     port_labels: None = None,
     select_ports: Callable = select_electrical_ports,
+    bundle_route_filter: Optional[Callable] = None,
 ) -> Tuple[
     List[Union[ComponentReference, Label]], List[List[ComponentReference]], float64
 ]:
@@ -54,6 +58,7 @@ def route_pad_array(
             - n_ports divides the total number of ports
             - the components have an equal number of inputs and outputs
         pad_indices: allows to fine skip some grating slots e.g [0,1,4,5] will put two gratings separated by the pitch. Then there will be two empty pads slots, and after that an additional two gratings.
+        bundle_route_filter: routes all the pads at once, e.g. `connect_elec_waypoints_bundle` merges the wires into one component per layer
 
     Returns:
         elements, pads, y0_optical
@@ -201,6 +206,16 @@ def route_pad_array(
         ordered_ports = [component.ports[i] for i in connected_port_list_ids]
 
     for pads in io_pad_lines:
+        if bundle_route_filter:
+            pad_ports = [pads[i].ports[port_name] for i in range(N)]
+            bend90 = bend_circular(radius=bend_radius, width=pad_ports[0].width)
+            b_west, b_north = _get_bend_ports(bend90)
+            routes = get_fanout_waypoints(
+                pad_ports, ordered_ports[:N], bend_size=b_north.x - b_west.x
+            )
+            elements += bundle_route_filter(routes, **route_filter_params)
+            continue
+
         for i in range(N):
             p0 = pads[i].ports[port_name]
             p1 = ordered_ports[i]
@@ -7,9 +7,17 @@ from pp.routing.connect import connect_elec, connect_strip
 BEND_RADIUS = pp.config.BEND_RADIUS
 
 
-def route_elec_ports_to_side(ports, side="north", wire_sep=20.0, x=None, y=None):
+def route_elec_ports_to_side(
+    ports, side="north", wire_sep=20.0, x=None, y=None, bundle_route_filter=None
+):
     return route_ports_to_side(
-        ports, side=side, bend_radius=0, separation=wire_sep, x=x, y=y
+        ports,
+        side=side,
+        bend_radius=0,
+        separation=wire_sep,
+        x=x,
+        y=y,
+        bundle_route_filter=bundle_route_filter,
     )
 
 
@@ -53,6 +61,8 @@ def route_ports_to_side(
             `bend_radius`
             `extend_bottom`, `extend_top` for east/west routing
             `extend_left`, `extend_right` for south/north routing
+            `bundle_route_filter`: routes all the ports at once as electrical
+            wires, e.g. `connect_elec_waypoints_bundle`
     """
 
     if not ports:
@@ -107,6 +117,27 @@ def route_ports_to_east(list_ports, **kwargs):
     return route_ports_to_side(list_ports, side="east", **kwargs)
 
 
+def route_wires(wires, bundle_route_filter, **kwargs):
+    """Returns the electrical wires for (port, new_port, start_straight) tuples,
+    with the waypoints of `connect_elec` computed at once."""
+    # connect_bundle imports this module through u_groove_bundle
+    from pp.routing.connect_bundle import get_fanout_waypoints
+
+    start_ports, end_ports, start_straights = zip(*wires)
+    routes = get_fanout_waypoints(
+        start_ports,
+        end_ports,
+        bend_size=[p.width / 2 for p in start_ports],
+        start_straight=start_straights,
+    )
+    params = dict(
+        wg_width=[p.width for p in start_ports],
+        layer=[p.layer for p in start_ports],
+    )
+    params.update(kwargs)
+    return bundle_route_filter(routes, **params)
+
+
 def connect_ports_to_x(
     list_ports,
     x="east",
@@ -119,6 +150,7 @@ def connect_ports_to_x(
     y0_top=None,
     routing_func=connect_strip,
     backward_port_side_split_index=0,
+    bundle_route_filter=None,
     **routing_func_args,
 ):
     """
@@ -140,6 +172,11 @@ def connect_ports_to_x(
             all ports with an index strictly lower or equal are routed bottom
             all ports with an index larger or equal are routed top
 
+     * ``bundle_route_filter``: if set, the ports are routed as electrical
+            wires (square corners of the port width), all at once:
+            ``bundle_route_filter(list_of_waypoints, wg_width, layer)``
+            e.g. ``connect_elec_waypoints_bundle``, instead of ``routing_func``
+
     Returns:
         - a list of connectors which can be added to an element list
         - a list of the new optical ports
@@ -214,19 +251,24 @@ def connect_ports_to_x(
     elements = []
     ports = []
 
+    wires = []
+
     def add_port(p, y, l_elements, l_ports, start_straight=0.01):
         new_port = p._copy()
         new_port.angle = angle
         new_port.position = (x + extension_length, y)
-        l_elements += [
-            routing_func(
-                p,
-                new_port,
-                start_straight=start_straight,
-                bend_radius=bend_radius,
-                **routing_func_args,
-            )
-        ]
+        if bundle_route_filter:
+            wires.append((p, new_port, start_straight))
+        else:
+            l_elements += [
+                routing_func(
+                    p,
+                    new_port,
+                    start_straight=start_straight,
+                    bend_radius=bend_radius,
+                    **routing_func_args,
+                )
+            ]
         l_ports += [flipped(new_port)]
 
     y_optical_bot = y0_bottom
@@ -287,6 +329,8 @@ def connect_ports_to_x(
         y_optical_bot -= separation
         start_straight += separation
 
+    if wires:
+        elements += route_wires(wires, bundle_route_filter, **routing_func_args)
     return elements, ports
 
 
@@ -302,6 +346,7 @@ def connect_ports_to_y(
     extend_right=0,
     routing_func=connect_strip,
     backward_port_side_split_index=0,
+    bundle_route_filter=None,
     **routing_func_args,
 ):
     """
@@ -323,6 +368,11 @@ def connect_ports_to_y(
             all ports with an index strictly larger are routed right
             all ports with an index lower or equal are routed left
 
+     * ``bundle_route_filter``: if set, the ports are routed as electrical
+            wires (square corners of the port width), all at once:
+            ``bundle_route_filter(list_of_waypoints, wg_width, layer)``
+            e.g. ``connect_elec_waypoints_bundle``, instead of ``routing_func``
+
     Returns:
         - a list of connectors which can be added to an element list
         - a list of the new optical ports
@@ -402,6 +452,8 @@ def connect_ports_to_y(
     elements = []
     ports = []
 
+    wires = []
+
     def add_port(p, x, l_elements, l_ports, start_straight=0.01):
         new_port = p._copy()
         new_port.angle = angle
@@ -411,6 +463,11 @@ def connect_ports_to_y(
             l_ports += [flipped(new_port)]
             return
 
+        if bundle_route_filter:
+            wires.append((p, new_port, start_straight))
+            l_ports += [flipped(new_port)]
+            return
+
         try:
             l_elements += [
                 routing_func(
@@ -456,9 +513,42 @@ def connect_ports_to_y(
         x_optical_left -= separation
         start_straight += separation
 
+    if wires:
+        elements += route_wires(wires, bundle_route_filter, **routing_func_args)
     return elements, ports
 
 
+def test_route_elec_ports_to_side_bundle():
+    import gdspy
+
+    from pp.layers import LAYER
+    from pp.routing.connect import connect_elec_waypoints_bundle
+
+    c = pp.Component()
+    for i in range(10):
+        c.add_port(f"S{i}", midpoint=(20 * i, 0), width=10, orientation=270)
+        c.add_port(f"W{i}", midpoint=(-10, 10 + 4 * i), width=2, orientation=180)
+        c.add_port(f"N{i}", midpoint=(30 * i, 100), width=4, orientation=90)
+    for port in c.ports.values():
+        port.port_type = "dc"
+        port.layer = LAYER.M3
+
+    for side in ["north", "south", "east", "west"]:
+        elements, ports = route_elec_ports_to_side(c, side=side)
+        wires, wire_ports = route_elec_ports_to_side(
+            c, side=side, bundle_route_filter=connect_elec_waypoints_bundle
+        )
+        assert len(wires) == 1
+        assert len(wires[0].parent.polygons) == len(elements)
+        for p1, p2 in zip(ports, wire_ports):
+            assert np.allclose(p1.midpoint, p2.midpoint)
+
+        polygons = [e.get_polygons(by_spec=True)[LAYER.M3] for e in elements]
+        polygons = [p for route_polygons in polygons for p in route_polygons]
+        xor = gdspy.boolean(polygons, wires[0].get_polygons(), "xor")
+        assert xor is None or xor.area() < 1e-6
+
+
 def demo():
     from pp.component import Component
     from pp.layers import LAYER
@@ -80,6 +80,38 @@ def test_path_length_matching_nb_loops():
     return c
 
 
+def test_path_length_match_bundle():
+    from pp.routing.connect_bundle import generate_waypoints_connect_bundle
+    from pp.routing.path_length_matching import (
+        get_path_lengths,
+        path_length_match_bundle,
+    )
+
+    xs1 = [-500, -300, -100, -90, -80, -55, -35, 200, 210, 240, 500, 650]
+    N = len(xs1)
+    ports1 = [pp.Port(f"top_{i}", (xs1[i], 0), 0.5, 90) for i in range(N)]
+    ports2 = [
+        pp.Port(f"bottom_{i}", (-20 + i * 100.0, 2000.0), 0.5, 270) for i in range(N)
+    ]
+    routes = generate_waypoints_connect_bundle(ports1, ports2)
+    lengths = get_path_lengths(np.stack(routes))
+
+    waypoints, spread = path_length_match_bundle(routes)
+    assert waypoints.shape == (N, 8, 2)
+    assert spread < 1e-9
+
+    # each loop has two arms of at most 50um extra length
+    nb_loops = int(np.ceil((lengths.max() - lengths.min()) / 100))
+    assert nb_loops > 1
+    waypoints, spread = path_length_match_bundle(routes, max_loop_length=50.0)
+    assert waypoints.shape == (N, 4 + 4 * nb_loops, 2)
+    assert spread < 1e-9
+
+    waypoints, spread = path_length_match_bundle(routes, tolerance=1e3)
+    assert np.allclose(waypoints, np.stack(routes))
+    assert np.isclose(spread, lengths.max() - lengths.min())
+
+
 if __name__ == "__main__":
     # c = test_path_length_matching()
     # c = test_path_length_matching_extra_length()
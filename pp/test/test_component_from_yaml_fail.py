@@ -64,5 +64,18 @@ def test_circular_import_pass():
     pp.component_from_yaml(yaml_pass)
 
 
+def test_placement_chain():
+    """placements referring to the next instance, deeper than the recursion limit"""
+    n = 1200
+    yaml_chain = "instances:\n"
+    for i in range(n):
+        yaml_chain += f"    wg{i}:\n      component: waveguide\n"
+    yaml_chain += "placements:\n"
+    for i in range(n - 1):
+        yaml_chain += f"    wg{i}:\n        x: wg{i + 1},E0\n"
+    c = pp.component_from_yaml(yaml_chain)
+    assert c.instances["wg0"].x > c.instances[f"wg{n - 1}"].x
+
+
 if __name__ == "__main__":
     c = test_circular_import_pass()
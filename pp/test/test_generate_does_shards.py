@@ -0,0 +1,40 @@
+from pp.generate_does import generate_does
+from pp.placer import load_doe_component_names
+
+does_yaml = """
+mask:
+    name: mask_shards
+
+waveguide_length:
+    component: waveguide
+    settings:
+        length: [1, 2, 3, 4, 5]
+        width: [0.5, 0.6]
+"""
+
+
+def test_generate_does_shards(tmp_path):
+    does_path = tmp_path / "does.yml"
+    does_path.write_text(does_yaml)
+
+    doe_root_path = tmp_path / "cache_doe"
+    doe_metadata_path = tmp_path / "doe"
+    generate_does(
+        does_path, doe_root_path=doe_root_path, doe_metadata_path=doe_metadata_path
+    )
+    names = load_doe_component_names("waveguide_length", doe_root_path=doe_root_path)
+    assert len(names) == 10
+
+    doe_root_path_sharded = tmp_path / "cache_doe_sharded"
+    for shard_index in range(3):
+        generate_does(
+            does_path,
+            doe_root_path=doe_root_path_sharded,
+            doe_metadata_path=doe_metadata_path,
+            shard_index=shard_index,
+            n_shards=3,
+        )
+    names_sharded = load_doe_component_names(
+        "waveguide_length", doe_root_path=doe_root_path_sharded
+    )
+    assert names_sharded == names